@@ -5,10 +5,10 @@ __author__ = "Mason Smith <masonrs@umich.edu>"
 __version__ = "0.1.25"
 
 from experiment import formatMoney, Experiment, getExperiment, runSession, calibrateTracker, getLog,checkForResponse
-from trials import Trial,driftCorrect,startRecording,stopRecording,gcFixation,gcFlashFixation,PupilCalibrationTrial
-from displays import TextDisplay, ImageDisplay, ContinueDisplay, SlideDisplay, AudioPresentation
+from trials import Trial,driftCorrect,startRecording,stopRecording,gcFixation,gcFlashFixation,PupilCalibrationTrial,DriftMonitor,checkDrift
+from displays import TextDisplay, ImageDisplay, ContinueDisplay, SlideDisplay, AudioPresentation, BoundaryDisplay, MovingWindowDisplay
 from lists import StimList, LatinSquareList, LingerList, parseRegions
-from response_collectors import Keyboard,ContinuousGaze,GazeSample,EyeLinkButtons,MouseDownUp,Speech,CedrusButtons,MouseWidgetClick
-from shapes import Rectangle,Ellipse
-from interest_area import InterestArea
+from response_collectors import Keyboard,ContinuousGaze,GazeSample,EyeLinkButtons,MouseDownUp,Speech,CedrusButtons,MouseWidgetClick,FixationTrigger,ReadingMonitor
+from shapes import Rectangle,Ellipse,Polygon
+from interest_area import InterestArea,InterestAreaSet,readInterestAreaFile
 
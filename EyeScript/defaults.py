@@ -8,6 +8,8 @@ Experiment object is first instantiated.
     screen_size=(1024,768),
     bits_per_pixel=16,
     refresh_rate=120, #Hz
+    frame_timing=True, # Log the number and times of late frames, and the longest buffer swap, for every display that is run
+    frame_tolerance=0.5, # Fraction of a refresh period by which a swap may overrun before the frame is counted as late
 
 
     # DISPLAY OBJECT DEFAULTS
@@ -58,6 +60,12 @@ Experiment object is first instantiated.
     eye_used = 1,   # If recording both eyes, which eye to use for gaze-contingent displays. 1=right, 0=left
     ia_fill = True,  # If spaces between words are larger than 2*gaze_error, whether to extend interest areas to fill in the gaps between words.
     min_fixation = 800,  # Minimum fixation duration (ms) on a gaze-contingent trigger before it's triggered
+    gc_timeout = 'infinite', # Time (ms) gcFixation waits for the subject to fixate the target before falling back on drift correction
+    drift_monitor = False, # Whether gcFixation measures the tracker's drift from its targets, so that checkDrift can correct it (see DriftMonitor in trials.py)
+    drift_threshold = 20, # Drift (pixels) above which checkDrift does a drift correction
+    recalibration_threshold = 40, # Drift (pixels) above which checkDrift recalibrates the tracker instead (gcFixation only accepts fixations within gcbuffer_size of the target)
+    drift_window = 3, # Number of gcFixation fixations the drift is estimated from, and of timeouts after which checkDrift recalibrates
+    reading_measures = False, # Whether displays accumulate and log reading measures for their interest areas (see reading_measures.py)
     gaze_error = 35,
     # gaze_error = the distance, in pixels, between the left and right of the stimuli and the edge of the enclosing interest area, in pixels.
     # To calculate appropriate buffer values, estimate
@@ -66,6 +74,34 @@ Experiment object is first instantiated.
     # shown after validation during tracker setup).
     # error_in_pixels = tan(visual_angle_error) * subject_distance_inches * screen_width_pixels / screen_width_inches
     
+    #ONLINE EVENT DETECTION
+    fixation_source='tracker', # Where ContinuousGaze gets fixations from: 'tracker' (EyeLink link events), or 'ivt' or 'idt' to detect them
+                               # from the raw samples without the parser's delay (see detection.py)
+    pixels_per_degree=35, # Screen pixels per degree of visual angle, for the thresholds below and for saccade amplitudes
+    velocity_window=4, # For 'ivt': interval (ms) over which gaze velocity is measured. The threshold is tracker_setSaccadeVelocityThreshold.
+    idt_dispersion=1.0, # For 'idt': maximum dispersion (horizontal plus vertical extent, in degrees) of a fixation
+    idt_duration=80, # For 'idt': minimum fixation duration (ms)
+    saccade_trigger=None, # For BoundaryDisplay and GazeSample: None to trigger on the first sample past the boundary or in the area;
+                          # 'onset' to also trigger as soon as a saccade is detected whose predicted landing position is past the boundary or in the area,
+                          # or 'peak' to wait for the saccade's velocity peak, for a later but more accurate prediction (see SaccadePredictor in detection.py).
+                          # The onset thresholds are tracker_setSaccadeVelocityThreshold and tracker_setAccelerationThreshold.
+    onset_samples=2, # Number of consecutive samples over the velocity threshold before a saccade onset is reported for saccade_trigger
+    main_sequence=(600,7.5), # (V,C) of the main sequence, peak velocity = V*(1-exp(-amplitude/C)), in degrees per second and degrees,
+                             # used to predict saccade amplitude before the velocity peak
+    bridge_gap=100, # Gaps in the gaze data (blinks, track loss) up to this many ms are bridged by gaze collectors: missing samples don't count as leaving an area.
+                    # Longer gaps count as losing track of the gaze (see TrackLossMonitor in detection.py).
+    blink_margin=20, # Samples within this many ms after a gap are treated as missing (they tend to be distorted as the eyelid opens)
+    max_blink=500, # Longest gap (ms) counted as a blink rather than a loss of track in the per-trial data-loss statistics
+    gaze_filter=None, # Smoothing applied by gaze collectors to the samples before testing them against their areas:
+                      # None, 'median', 'kalman' or 'oneeuro' (see filters.py).  Unlike heuristic_filter, this runs in EyeScript.
+    gaze_filter_options={}, # Keyword arguments for the gaze filter, e.g. {'window':5} for 'median' or {'min_cutoff':5.0,'beta':0.05} for 'oneeuro'
+
+    #EYETRACKER SELECTION
+    eyetracker='eyelink', # 'eyelink' (if no EyeLink is connected, a stub is used and gaze responses are faked after 2000 ms),
+                          # 'simulator' (simulated gaze data, see simulator.py), 'replay' (recorded gaze data, see replay.py) or 'stub'
+    simulator_options={}, # Keyword arguments for the SimulatedTracker when eyetracker='simulator', e.g. {'rate':2000,'latency':3,'seed':1}
+    replay_options={}, # Keyword arguments for the ReplayTracker when eyetracker='replay', e.g. {'filename':'s1.asc','speed':None}
+
     #TRACKER PARAMETERS
     #All parameters preceded with 'tracker_' will be sent to the tracker
     #at the time of tracker setup
@@ -94,7 +130,30 @@ Experiment object is first instantiated.
 
     #CEDRUS BUTTON BOX
     buttonbox_com=3,
-    buttonbox_baud=115200
+    buttonbox_baud=115200,
+
+    #INPUT EVENTS
+    event_buffer_size=256, # Number of reusable event objects per input device. An event stays valid until this many more events have come in from the same device.
+                           # Also the number of fixation, saccade and blink events from the eyetracker link that are kept for the gaze collectors.
+    sample_buffer_size=8192, # Number of gaze samples from the eyetracker link that are kept for the gaze collectors (at least a few seconds' worth)
+    threaded_devices=[], # Class names of devices to read in a background thread, e.g. ['CedrusButtonsDevice'].
+                         # Events are then timestamped when the thread reads them rather than when the main loop gets around to polling.
+                         # The keyboard and mouse (which go through pygame's event queue) can't be threaded (see devices.py).
+    device_thread_interval=0.001, # Seconds between reads of a threaded device
+
+    #UNATTENDED RUNS
+    headless=False, # Run without a monitor or subject, e.g. for benchmarks or automated tests (also set by the environment variable EYESCRIPT_HEADLESS=1).
+                    # Uses software OpenGL in a window (on a virtual Xvfb display if DISPLAY isn't set) and doesn't ask for the session info.
+    headless_display=':99', # X display number for the Xvfb server started when running headless without a DISPLAY
+    headless_response_delay=500, # When running headless, response collectors (except gaze collectors) make up a response this many ms after they start
+    session_values=None, # Dictionary of values for 'subject' and the session_info attributes, e.g. {'subject':1,'session':2}.
+                         # If set, the experimenter isn't asked for the session info. Defaults to subject 0 (no data logging) when running headless.
+
+    #INSTRUMENTATION
+    gaze_monitor=False, # If True, keep a live heatmap and scanpath of each trial's gaze data for an experimenter's monitor (see gaze_monitor.py)
+    gaze_monitor_options={}, # Keyword arguments for the GazeMonitor, e.g. {'cell_size':16,'scanpath_length':256,'shared':True}
+    loop_timing=False # If True, record histograms of the response-loop period and of each device's poll duration for every trial.
+                      # A per-trial summary is logged with the trial data and the histograms are written to <data file>_timing.txt
 """
 import response_collectors
 defaultParams = dict(
@@ -103,6 +162,8 @@ defaultParams = dict(
     screen_size=(1600,1200),
     bits_per_pixel=16,
     refresh_rate=120, #Hz
+    frame_timing=True, # Log the number and times of late frames, and the longest buffer swap, for every display that is run
+    frame_tolerance=0.5, # Fraction of a refresh period by which a swap may overrun before the frame is counted as late
 
 
     # DISPLAY OBJECT DEFAULTS
@@ -156,6 +217,12 @@ defaultParams = dict(
     eye_used = 1,   # If recording both eyes, which eye to use for gaze-contingent displays. 1=right, 0=left
     ia_fill = False,  # If spaces between words are larger than 2*gaze_error, whether to extend interest areas to fill in the gaps between words.
     min_fixation = 800,  # Minimum fixation duration (ms) on a gaze-contingent trigger before it's triggered
+    gc_timeout = 'infinite', # Time (ms) gcFixation waits for the subject to fixate the target before falling back on drift correction
+    drift_monitor = False, # Whether gcFixation measures the tracker's drift from its targets, so that checkDrift can correct it (see DriftMonitor in trials.py)
+    drift_threshold = 20, # Drift (pixels) above which checkDrift does a drift correction
+    recalibration_threshold = 40, # Drift (pixels) above which checkDrift recalibrates the tracker instead (gcFixation only accepts fixations within gcbuffer_size of the target)
+    drift_window = 3, # Number of gcFixation fixations the drift is estimated from, and of timeouts after which checkDrift recalibrates
+    reading_measures = False, # Whether displays accumulate and log reading measures for their interest areas (see reading_measures.py)
     buffer_size = 0,
     gcbuffer_size = 35,
 	gcTargetCoords = (20,768/2),
@@ -166,6 +233,34 @@ defaultParams = dict(
     # shown after validation during tracker setup).
     # error_in_pixels = tan(visual_angle_error) * subject_distance_inches * screen_width_pixels / screen_width_inches
     
+    #ONLINE EVENT DETECTION
+    fixation_source='tracker', # Where ContinuousGaze gets fixations from: 'tracker' (EyeLink link events), or 'ivt' or 'idt' to detect them
+                               # from the raw samples without the parser's delay (see detection.py)
+    pixels_per_degree=35, # Screen pixels per degree of visual angle, for the thresholds below and for saccade amplitudes
+    velocity_window=4, # For 'ivt': interval (ms) over which gaze velocity is measured. The threshold is tracker_setSaccadeVelocityThreshold.
+    idt_dispersion=1.0, # For 'idt': maximum dispersion (horizontal plus vertical extent, in degrees) of a fixation
+    idt_duration=80, # For 'idt': minimum fixation duration (ms)
+    saccade_trigger=None, # For BoundaryDisplay and GazeSample: None to trigger on the first sample past the boundary or in the area;
+                          # 'onset' to also trigger as soon as a saccade is detected whose predicted landing position is past the boundary or in the area,
+                          # or 'peak' to wait for the saccade's velocity peak, for a later but more accurate prediction (see SaccadePredictor in detection.py).
+                          # The onset thresholds are tracker_setSaccadeVelocityThreshold and tracker_setAccelerationThreshold.
+    onset_samples=2, # Number of consecutive samples over the velocity threshold before a saccade onset is reported for saccade_trigger
+    main_sequence=(600,7.5), # (V,C) of the main sequence, peak velocity = V*(1-exp(-amplitude/C)), in degrees per second and degrees,
+                             # used to predict saccade amplitude before the velocity peak
+    bridge_gap=100, # Gaps in the gaze data (blinks, track loss) up to this many ms are bridged by gaze collectors: missing samples don't count as leaving an area.
+                    # Longer gaps count as losing track of the gaze (see TrackLossMonitor in detection.py).
+    blink_margin=20, # Samples within this many ms after a gap are treated as missing (they tend to be distorted as the eyelid opens)
+    max_blink=500, # Longest gap (ms) counted as a blink rather than a loss of track in the per-trial data-loss statistics
+    gaze_filter=None, # Smoothing applied by gaze collectors to the samples before testing them against their areas:
+                      # None, 'median', 'kalman' or 'oneeuro' (see filters.py).  Unlike heuristic_filter, this runs in EyeScript.
+    gaze_filter_options={}, # Keyword arguments for the gaze filter, e.g. {'window':5} for 'median' or {'min_cutoff':5.0,'beta':0.05} for 'oneeuro'
+
+    #EYETRACKER SELECTION
+    eyetracker='eyelink', # 'eyelink' (if no EyeLink is connected, a stub is used and gaze responses are faked after 2000 ms),
+                          # 'simulator' (simulated gaze data, see simulator.py), 'replay' (recorded gaze data, see replay.py) or 'stub'
+    simulator_options={}, # Keyword arguments for the SimulatedTracker when eyetracker='simulator', e.g. {'rate':2000,'latency':3,'seed':1}
+    replay_options={}, # Keyword arguments for the ReplayTracker when eyetracker='replay', e.g. {'filename':'s1.asc','speed':None}
+
     #TRACKER PARAMETERS
     #All parameters preceded with 'tracker_' will be sent to the tracker
     #at the time of tracker setup
@@ -194,5 +289,28 @@ defaultParams = dict(
 
     #CEDRUS BUTTON BOX
     buttonbox_com=3,
-    buttonbox_baud=115200
+    buttonbox_baud=115200,
+
+    #INPUT EVENTS
+    event_buffer_size=256, # Number of reusable event objects per input device. An event stays valid until this many more events have come in from the same device.
+                           # Also the number of fixation, saccade and blink events from the eyetracker link that are kept for the gaze collectors.
+    sample_buffer_size=8192, # Number of gaze samples from the eyetracker link that are kept for the gaze collectors (at least a few seconds' worth)
+    threaded_devices=[], # Class names of devices to read in a background thread, e.g. ['CedrusButtonsDevice'].
+                         # Events are then timestamped when the thread reads them rather than when the main loop gets around to polling.
+                         # The keyboard and mouse (which go through pygame's event queue) can't be threaded (see devices.py).
+    device_thread_interval=0.001, # Seconds between reads of a threaded device
+
+    #UNATTENDED RUNS
+    headless=False, # Run without a monitor or subject, e.g. for benchmarks or automated tests (also set by the environment variable EYESCRIPT_HEADLESS=1).
+                    # Uses software OpenGL in a window (on a virtual Xvfb display if DISPLAY isn't set) and doesn't ask for the session info.
+    headless_display=':99', # X display number for the Xvfb server started when running headless without a DISPLAY
+    headless_response_delay=500, # When running headless, response collectors (except gaze collectors) make up a response this many ms after they start
+    session_values=None, # Dictionary of values for 'subject' and the session_info attributes, e.g. {'subject':1,'session':2}.
+                         # If set, the experimenter isn't asked for the session info. Defaults to subject 0 (no data logging) when running headless.
+
+    #INSTRUMENTATION
+    gaze_monitor=False, # If True, keep a live heatmap and scanpath of each trial's gaze data for an experimenter's monitor (see gaze_monitor.py)
+    gaze_monitor_options={}, # Keyword arguments for the GazeMonitor, e.g. {'cell_size':16,'scanpath_length':256,'shared':True}
+    loop_timing=False # If True, record histograms of the response-loop period and of each device's poll duration for every trial.
+                      # A per-trial summary is logged with the trial data and the histograms are written to <data file>_timing.txt
     )
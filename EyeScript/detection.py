@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+"""Online detection of fixations, saccades and blinks from the raw gaze samples, as an alternative to the EyeLink's parser.
+
+The EyeLink's fixation events reach the experiment only after the parser has seen enough samples to be sure of them
+(typically 20 ms or more after the fact), and depend on the parser settings (tracker_setSaccadeVelocityThreshold,
+tracker_setMotionThreshold etc.).  The detectors here run in EyeScript itself, on the samples collected by the EyeLinkDevice,
+each time the device is polled, and produce STARTFIX/ENDFIX, STARTSACC/ENDSACC and STARTBLINK/ENDBLINK events as soon as
+the samples show them.
+
+Set the experiment parameter fixation_source to choose where ContinuousGaze gets its fixations from:
+'tracker': the EyeLink's link events (the default)
+'ivt': velocity-threshold identification.  A sample belongs to a saccade if the gaze velocity, measured over velocity_window ms,
+       exceeds tracker_setSaccadeVelocityThreshold degrees per second.  Fixation starts are reported on the first slow sample.
+'idt': dispersion-threshold identification.  A fixation starts once idt_duration ms of samples lie within idt_dispersion degrees
+       (horizontal plus vertical extent), and lasts until a sample would take the dispersion over the threshold.
+       Fixation starts are reported idt_duration ms late, but I-DT is less sensitive to noise than I-VT.
+
+The SaccadePredictor detects saccade onsets within a few samples and predicts where the saccade will land, so that BoundaryDisplay
+and GazeSample can trigger during the saccade (see the saccade_trigger experiment parameter).
+
+The TrackLossMonitor follows blinks and losses of track in each eye's samples, so that the gaze collectors can bridge short gaps
+instead of taking them for the gaze leaving an area, and keeps per-trial data-loss statistics (see the bridge_gap parameter).
+
+Screen distances are converted to degrees using the pixels_per_degree experiment parameter.
+
+Detectors produce the same event objects as the tracker (see linkdata.py), so collectors can treat both sources alike.
+"""
+from __future__ import with_statement
+import numpy
+from linkdata import *
+from samples import sampleTime,GazeReader
+
+class Detector:
+    """Abstract class for online event detectors.
+
+    A detector reads the samples of one eye from a SampleBuffer through its own GazeReader, and appends the events it detects to an EventStream.
+    Child classes define process, which classifies a batch of new samples and calls the transition methods below.
+    """
+    def __init__(self,samples,eye,events,pixels_per_degree=35):
+        """Arguments:
+        samples: the SampleBuffer to read
+        eye: the eye whose samples to read (0=left, 1=right)
+        events: the EventStream to which the detected events are appended
+        pixels_per_degree: for converting thresholds in degrees to screen pixels
+        """
+        self.reader = GazeReader(samples,eye)
+        self.eye = eye
+        self.events = events
+        self.pixels_per_degree = pixels_per_degree
+        self.state = None # 'fixation', 'saccade', 'blink', or None before the first sample
+        self.startTime = self.startGaze = self.lastTime = self.lastGaze = None
+        self.sumX = self.sumY = 0.0
+        self.n = 0
+
+    def update(self):
+        """Process the samples that have arrived since the last update
+        """
+        times,x,y = self.reader.samples()
+        if len(times): self.process(times,x,y)
+
+    def process(self,times,x,y):
+        """Defined by child classes: classify the samples in the numpy arrays times, x and y, calling transition, accumulate and extend
+        """
+        pass
+
+    def transition(self,state,time,gaze):
+        """End the current event and start a new one of the given kind ('fixation', 'saccade' or 'blink') at the given sample
+        """
+        eye = self.eye
+        if self.state == 'fixation':
+            average = (self.sumX/self.n,self.sumY/self.n)
+            self.events.append(ENDFIX,GazeEvent(ENDFIX,eye,self.startTime,self.lastTime,self.startGaze,self.lastGaze,average))
+        elif self.state == 'saccade':
+            self.events.append(ENDSACC,GazeEvent(ENDSACC,eye,self.startTime,self.lastTime,self.startGaze,self.lastGaze))
+        elif self.state == 'blink':
+            self.events.append(ENDBLINK,GazeEvent(ENDBLINK,eye,self.startTime,self.lastTime))
+        self.state = state
+        self.startTime = self.lastTime = time
+        self.startGaze = self.lastGaze = gaze
+        self.sumX = self.sumY = 0.0
+        self.n = 0
+        if state == 'fixation': self.events.append(STARTFIX,GazeEvent(STARTFIX,eye,time,startGaze=gaze))
+        elif state == 'saccade': self.events.append(STARTSACC,GazeEvent(STARTSACC,eye,time,startGaze=gaze))
+        else: self.events.append(STARTBLINK,GazeEvent(STARTBLINK,eye,time))
+
+    def accumulate(self,times,x,y):
+        """Add a run of samples (numpy arrays) to the current event
+        """
+        self.sumX += x.sum()
+        self.sumY += y.sum()
+        self.n += len(times)
+        self.extend(times[-1],(float(x[-1]),float(y[-1])))
+
+    def extend(self,time,gaze):
+        """Record the last sample of the current event
+        """
+        self.lastTime = sampleTime(time)
+        self.lastGaze = gaze
+
+class VelocityDetector(Detector):
+    """I-VT detector: samples faster than the velocity threshold are saccade samples, the others fixation samples.
+
+    Velocities are computed for the whole batch of new samples at once, and events are only generated where the classification changes.
+    """
+    def __init__(self,samples,eye,events,pixels_per_degree=35,threshold=30,velocity_window=4):
+        """Arguments (besides those for Detector):
+        threshold: saccade velocity threshold in degrees per second
+        velocity_window: interval, in ms, over which velocity is measured (longer is less noisy but smears saccade onsets)
+        """
+        Detector.__init__(self,samples,eye,events,pixels_per_degree)
+        self.threshold = threshold*pixels_per_degree/1000.0 # in pixels per ms
+        self.velocity_window = velocity_window
+        self.lag = None # Number of samples spanning velocity_window, set from the sampling interval of the first batch
+        self.previous = (numpy.zeros(0),numpy.zeros(0),numpy.zeros(0))
+
+    def velocity(self,times,x,y):
+        """Return numpy arrays (velocity, lagX, lagY) for a batch of new samples: the gaze velocity in pixels per ms over velocity_window,
+        and the gaze position velocity_window earlier.  These are NaN where they can't be computed (the first samples, and around missing data).
+        """
+        # Prepend the last samples of the previous batch, so that every new sample has a velocity
+        previousTimes,previousX,previousY = self.previous
+        allTimes = numpy.concatenate((previousTimes,times))
+        allX = numpy.concatenate((previousX,x))
+        allY = numpy.concatenate((previousY,y))
+        velocity = numpy.empty(len(times))
+        velocity.fill(numpy.nan)
+        lagX = velocity.copy()
+        lagY = velocity.copy()
+        if self.lag == None:
+            if len(allTimes) < 2:
+                self.previous = (allTimes,allX,allY)
+                return velocity,lagX,lagY
+            self.lag = max(1,int(round(self.velocity_window/float(numpy.median(numpy.diff(allTimes))))))
+        lag = self.lag
+        old = len(previousTimes)
+        self.previous = (allTimes[-lag:],allX[-lag:],allY[-lag:])
+        first = max(lag,old)
+        if first < len(allTimes):
+            lagX[first-old:] = allX[first-lag:-lag]
+            lagY[first-old:] = allY[first-lag:-lag]
+            velocity[first-old:] = numpy.hypot(allX[first:]-lagX[first-old:],allY[first:]-lagY[first-old:]) / (allTimes[first:]-allTimes[first-lag:-lag])
+        return velocity,lagX,lagY
+
+    def process(self,times,x,y):
+        velocity = self.velocity(times,x,y)[0]
+        missing = numpy.isnan(x) | numpy.isnan(y)
+        with numpy.errstate(invalid='ignore'): # NaN velocities (after missing data) count as slow
+            labels = numpy.where(missing,2,numpy.where(velocity > self.threshold,1,0))
+        states = ('fixation','saccade','blink')
+        boundaries = numpy.flatnonzero(labels[1:] != labels[:-1])+1
+        for start,end in zip(numpy.concatenate(([0],boundaries)),numpy.concatenate((boundaries,[len(labels)]))):
+            state = states[labels[start]]
+            if state != self.state:
+                if state == 'blink': gaze = None
+                else: gaze = (float(x[start]),float(y[start]))
+                self.transition(state,sampleTime(times[start]),gaze)
+            if state == 'fixation': self.accumulate(times[start:end],x[start:end],y[start:end])
+            elif state == 'saccade': self.extend(times[end-1],(float(x[end-1]),float(y[end-1])))
+            else: self.extend(times[end-1],None)
+
+class DispersionDetector(Detector):
+    """I-DT detector: a fixation is a run of samples, lasting at least 'duration' ms, whose dispersion (horizontal plus vertical extent)
+    is within the threshold.  Samples between fixations are reported as saccades, and missing samples as blinks.
+    """
+    def __init__(self,samples,eye,events,pixels_per_degree=35,dispersion=1.0,duration=80):
+        """Arguments (besides those for Detector):
+        dispersion: dispersion threshold in degrees
+        duration: minimum fixation duration in ms
+        """
+        Detector.__init__(self,samples,eye,events,pixels_per_degree)
+        self.dispersion = dispersion*pixels_per_degree
+        self.duration = duration
+        self.window = [] # (time,x,y) of the samples since the last fixation or blink, not yet part of a fixation
+
+    def process(self,times,x,y):
+        window = self.window
+        for time,sx,sy in zip(times.tolist(),x.tolist(),y.tolist()):
+            if sx != sx or sy != sy: # NaN: missing data
+                if self.state != 'blink': self.transition('blink',sampleTime(time),None)
+                else: self.extend(time,None)
+                del window[:]
+                continue
+            if self.state == 'fixation':
+                left,right,top,bottom = self.bounds
+                left,right,top,bottom = min(left,sx),max(right,sx),min(top,sy),max(bottom,sy)
+                if right-left+bottom-top <= self.dispersion:
+                    self.bounds = (left,right,top,bottom)
+                    self.sumX += sx
+                    self.sumY += sy
+                    self.n += 1
+                    self.extend(time,(sx,sy))
+                    continue
+            if self.state != 'saccade': self.transition('saccade',sampleTime(time),(sx,sy))
+            window.append((time,sx,sy))
+            # Keep just enough samples to span the minimum duration; the samples dropped from the window belong to the saccade
+            while len(window) > 1 and time-window[1][0] >= self.duration:
+                dropped = window.pop(0)
+                self.extend(dropped[0],(dropped[1],dropped[2]))
+            if time-window[0][0] >= self.duration:
+                windowX = [sample[1] for sample in window]
+                windowY = [sample[2] for sample in window]
+                bounds = (min(windowX),max(windowX),min(windowY),max(windowY))
+                if bounds[1]-bounds[0]+bounds[3]-bounds[2] <= self.dispersion:
+                    # The fixation started at the beginning of the window
+                    self.transition('fixation',sampleTime(window[0][0]),(window[0][1],window[0][2]))
+                    self.bounds = bounds
+                    self.sumX = sum(windowX)
+                    self.sumY = sum(windowY)
+                    self.n = len(window)
+                    self.extend(time,(sx,sy))
+                    del window[:]
+
+MAIN_SEQUENCE = (600.0,7.5)
+"""Main sequence used to predict saccade amplitude from peak velocity, peak = V*(1-exp(-amplitude/C)), as (V in degrees per second, C in degrees)"""
+
+class Saccade:
+    """A saccade detected by a SaccadePredictor, with the prediction of its landing position.
+
+    Attributes:
+    onsetTime, onsetGaze: time and gaze position at saccade onset
+    peakVelocity: highest velocity so far, in degrees per second
+    peaked: True once the velocity peak has passed, after which the prediction assumes a symmetric velocity profile
+    predicted: predicted landing position (x,y), updated with every sample until the saccade ends
+    predictionTime: time of the sample on which the current prediction is based
+    endTime, landing: time and gaze position at the end of the saccade (None until it ends; landing is None if the saccade ended in missing data)
+    """
+    def __init__(self,onsetTime,onsetGaze):
+        self.onsetTime = onsetTime
+        self.onsetGaze = onsetGaze
+        self.peakVelocity = 0.0
+        self.peaked = False
+        self.predicted = self.predictionTime = None
+        self.endTime = self.landing = None
+
+class SaccadePredictor(VelocityDetector):
+    """Detects saccade onsets in the live sample stream and predicts where each saccade will land, so that gaze-contingent changes
+    can be triggered during the saccade rather than when the eye arrives.
+
+    A saccade starts when the velocity exceeds the onset threshold, with the acceleration exceeding its threshold, for onset_samples
+    consecutive samples; it ends on the first sample below the onset threshold.  Its landing position is predicted along the line from
+    the onset position to the current position:
+    before the velocity peak, at the amplitude the main sequence (MAIN_SEQUENCE) gives for the highest velocity so far (which underestimates
+    the amplitude while the eye is still accelerating);
+    after the peak, at twice the distance from the onset position to the position at the peak (assuming a symmetric velocity profile).
+
+    STARTSACC and ENDSACC events are appended to the EventStream, with the landing position as the end event's end gaze.
+
+    Attributes:
+    saccade: the Saccade in progress, or None
+    saccades: the most recent Saccades, in order of onset
+    """
+    def __init__(self,samples,eye,events,pixels_per_degree=35,threshold=30,acceleration=8000,onset_samples=2,velocity_window=4,
+                 main_sequence=MAIN_SEQUENCE):
+        """Arguments (besides those for Detector):
+        threshold: onset velocity threshold in degrees per second
+        acceleration: onset acceleration threshold in degrees per second squared
+        onset_samples: number of consecutive samples over the velocity threshold before a saccade onset is reported
+        velocity_window: interval, in ms, over which velocity is measured
+        main_sequence: (V,C) as for MAIN_SEQUENCE
+        """
+        VelocityDetector.__init__(self,samples,eye,events,pixels_per_degree,threshold,velocity_window)
+        self.acceleration = acceleration*pixels_per_degree/1000000.0 # in pixels per ms per ms
+        self.onset_samples = onset_samples
+        self.main_sequence = main_sequence
+        self.saccade = None
+        self.saccades = []
+        self.fast = 0 # Number of consecutive samples over the velocity threshold, before onset
+        self.onset = None # (time,gaze) of the first of them
+        self.lastVelocity = self.lastVelocityTime = None
+        self.slowGaze = None # Gaze position of the last sample under the velocity threshold
+        self.midpoint = None # Gaze position halfway through the velocity window at the velocity peak
+
+    def process(self,times,x,y):
+        velocity,lagX,lagY = self.velocity(times,x,y)
+        with numpy.errstate(invalid='ignore'):
+            fast = velocity > self.threshold
+        if not self.saccade and not self.fast and not fast.any():
+            # The usual case: no saccade, nothing fast in this batch
+            self.lastVelocity,self.lastVelocityTime = velocity[-1],times[-1]
+            if not numpy.isnan(x[-1]): self.slowGaze = (float(x[-1]),float(y[-1]))
+            return
+        for i in xrange(len(times)):
+            time,v = times[i],velocity[i]
+            gaze = (float(x[i]),float(y[i]))
+            if v != v: # NaN: missing data or no velocity yet
+                if self.saccade: self.end(time,None)
+                self.fast = 0
+            elif self.saccade:
+                if not fast[i]:
+                    self.end(time,gaze)
+                else:
+                    self.predict(time,v,gaze,((x[i]+lagX[i])/2.0,(y[i]+lagY[i])/2.0))
+            elif fast[i]:
+                if self.fast:
+                    self.fast += 1
+                elif (self.lastVelocity != None and self.lastVelocity == self.lastVelocity and
+                      (v-self.lastVelocity)/(time-self.lastVelocityTime) > self.acceleration):
+                    self.onset = (sampleTime(time),self.slowGaze or gaze)
+                    self.fast = 1
+                if self.fast >= self.onset_samples: self.start(time,v,gaze)
+            else:
+                self.fast = 0
+                self.slowGaze = gaze
+            self.lastVelocity,self.lastVelocityTime = v,time
+
+    def start(self,time,velocity,gaze):
+        """Report the onset of a saccade, with its first prediction
+        """
+        onsetTime,onsetGaze = self.onset
+        self.saccade = Saccade(onsetTime,onsetGaze)
+        self.saccades.append(self.saccade)
+        del self.saccades[:-16]
+        self.fast = 0
+        self.midpoint = None
+        self.events.append(STARTSACC,GazeEvent(STARTSACC,self.eye,onsetTime,startGaze=onsetGaze))
+        self.predict(time,velocity,gaze,None)
+
+    def predict(self,time,velocity,gaze,midpoint):
+        """Update the landing prediction for the saccade in progress, given a sample's velocity (in pixels per ms) and gaze position,
+        and the position halfway through the velocity window (where the velocity was measured)
+        """
+        saccade = self.saccade
+        ox,oy = saccade.onsetGaze
+        dx,dy = gaze[0]-ox,gaze[1]-oy
+        degreesPerSecond = velocity*1000.0/self.pixels_per_degree
+        if degreesPerSecond > saccade.peakVelocity:
+            saccade.peakVelocity = degreesPerSecond
+            self.midpoint = midpoint
+        elif not saccade.peaked and degreesPerSecond < 0.8*saccade.peakVelocity and self.midpoint:
+            saccade.peaked = True
+        if saccade.peaked:
+            mx,my = self.midpoint
+            saccade.predicted = (ox+2*(mx-ox),oy+2*(my-oy))
+        else:
+            V,C = self.main_sequence
+            amplitude = -C*numpy.log(1-min(saccade.peakVelocity/V,0.95))*self.pixels_per_degree
+            distance = numpy.hypot(dx,dy)
+            if distance > 0: saccade.predicted = (ox+dx*amplitude/distance,oy+dy*amplitude/distance)
+            else: saccade.predicted = (ox,oy)
+        saccade.predictionTime = sampleTime(time)
+
+    def end(self,time,gaze):
+        """Report the end of the saccade in progress, at the given sample; gaze is None if the saccade ended in missing data
+        """
+        saccade = self.saccade
+        saccade.endTime = sampleTime(time)
+        saccade.landing = gaze
+        self.events.append(ENDSACC,GazeEvent(ENDSACC,self.eye,saccade.onsetTime,saccade.endTime,saccade.onsetGaze,gaze))
+        self.saccade = None
+
+    def prediction(self,trigger):
+        """Return the saccade in progress if its landing prediction meets the trigger criterion, otherwise None.
+
+        trigger: 'onset' to accept the prediction from saccade onset on, 'peak' to only accept it after the velocity peak
+        """
+        saccade = self.saccade
+        if saccade and saccade.predicted and (trigger == 'onset' or saccade.peaked): return saccade
+        return None
+
+# Sample classifications returned by TrackLossMonitor.classify
+VALID = 0
+BRIDGED = 1
+LOST = 2
+
+class TrackLossMonitor:
+    """Blink and track-loss state of one eye's samples, shared by all the gaze collectors.
+
+    A gap is a run of missing samples (blinks, or the tracker losing the pupil or the corneal reflection).
+    Gaps up to bridge_gap ms long are bridged: the gaze collectors treat the missing samples as saying nothing about where
+    the subject is looking, rather than as the gaze leaving their areas.  Once a gap has lasted longer than bridge_gap ms, the track
+    is lost, and collectors give up on the fixation they were tracking.  The samples in the blink_margin ms after each gap
+    are treated as missing, since they tend to be distorted as the eyelid opens.
+
+    Per trial statistics (see stats):  the numbers of samples and missing samples, the number of blinks (gaps up to max_blink ms),
+    the number of longer losses of track, and the longest gap.
+
+    Attributes:
+    starts, resumes: timestamps of the first missing sample and of the first sample after each of the most recent gaps
+                     (resume is None while the gap is under way)
+    """
+    def __init__(self,samples,eye,bridge_gap=100,blink_margin=20,max_blink=500):
+        """Arguments:
+        samples: the SampleBuffer to read
+        eye: the eye whose samples to read (0=left, 1=right)
+        bridge_gap: longest gap, in ms, that is bridged
+        blink_margin: ms of samples after each gap to treat as missing
+        max_blink: longest gap, in ms, counted as a blink rather than a loss of track in the statistics
+        """
+        self.reader = GazeReader(samples,eye)
+        self.eye = eye
+        self.bridge_gap = bridge_gap
+        self.blink_margin = blink_margin
+        self.max_blink = max_blink
+        self.starts = []
+        self.resumes = []
+        self.lastTime = None
+        self.reset()
+
+    def reset(self):
+        """Start the statistics afresh, e.g. at the beginning of a trial
+        """
+        self.samples = self.missing = self.blinks = self.losses = 0
+        self.longestGap = 0
+
+    def update(self):
+        """Process the samples that have arrived since the last update
+        """
+        times,x,y = self.reader.samples()
+        if not len(times): return
+        missing = numpy.isnan(x) | numpy.isnan(y)
+        self.samples += len(times)
+        self.missing += int(missing.sum())
+        # Samples where a gap starts or ends, including the first sample of the batch if that changes the state
+        inGap = bool(self.resumes) and self.resumes[-1] == None
+        changes = numpy.flatnonzero(missing[1:] != missing[:-1]) + 1
+        if missing[0] != inGap: changes = numpy.concatenate(([0],changes))
+        for i in changes:
+            if missing[i]:
+                self.starts.append(sampleTime(times[i]))
+                self.resumes.append(None)
+            else:
+                self.resumes[-1] = sampleTime(times[i])
+                self.endGap(self.resumes[-1]-self.starts[-1])
+        if len(self.starts) > 128:
+            del self.starts[:-64]
+            del self.resumes[:-64]
+        self.lastTime = sampleTime(times[-1])
+
+    def endGap(self,duration):
+        """Count a gap of the given duration in the statistics
+        """
+        if duration <= self.max_blink: self.blinks += 1
+        else: self.losses += 1
+        if duration > self.longestGap: self.longestGap = duration
+
+    def lost(self):
+        """Return True if the track is currently lost, i.e. a gap longer than bridge_gap is under way
+        """
+        return bool(self.resumes) and self.resumes[-1] == None and self.lastTime-self.starts[-1] > self.bridge_gap
+
+    def classify(self,times):
+        """Given a numpy array of sample times (already processed by update), return a numpy array classifying each sample as
+        VALID, BRIDGED (missing in a gap no longer than bridge_gap so far, or within blink_margin after a gap) or LOST
+        (missing in a gap that has lasted longer than bridge_gap)
+        """
+        status = numpy.zeros(len(times),dtype=int)
+        if not self.starts or not len(times) or times[-1] < self.starts[0]: return status
+        starts = numpy.array(self.starts,dtype=float)
+        resumes = numpy.array([resume == None and numpy.inf or resume for resume in self.resumes],dtype=float)
+        gap = starts.searchsorted(times,'right')-1 # The last gap starting at or before each sample
+        known = gap >= 0
+        gap[~known] = 0
+        inGap = known & (times < resumes[gap])
+        status[inGap] = BRIDGED
+        status[inGap & (times-starts[gap] > self.bridge_gap)] = LOST
+        status[known & ~inGap & (times < resumes[gap]+self.blink_margin)] = BRIDGED
+        return status
+
+    def stats(self):
+        """Return (samples, missing samples, blinks, losses, longest gap) for the samples since the last reset,
+        counting a gap that's still under way
+        """
+        blinks,losses,longestGap = self.blinks,self.losses,self.longestGap
+        if self.resumes and self.resumes[-1] == None:
+            duration = self.lastTime-self.starts[-1]
+            if duration <= self.max_blink: blinks += 1
+            else: losses += 1
+            longestGap = max(longestGap,duration)
+        return self.samples,self.missing,blinks,losses,longestGap
+
+DETECTORS = {'ivt':VelocityDetector,'idt':DispersionDetector}
@@ -5,10 +5,24 @@ EyeScript scripts normally will use ResponseCollector objects and the checkForRe
 
 When checkForResponse is called (either directly from the EyeScript script, or indirectly when a display is run), the poll method of each device is called, returning all
 user events generated by that device since the last getEvents call.  The active ResponseCollectors are then notified of the events, if any.
+
+So that the response loop doesn't allocate in the steady state, each device takes its ESevent objects from its own EventRing
+and returns the same list object (self.events, emptied and refilled) from every call to poll.
+The list returned by poll is therefore only valid until the next poll of the same device.
+
+Devices listed (by class name) in the threaded_devices experiment parameter are read by a background InputThread instead.
+The thread reads the device every device_thread_interval seconds, timestamping events as they arrive, and poll then just
+drains the thread's queue.  This keeps RT timestamps precise while the main thread is busy drawing.
+Only devices that don't go through pygame's event queue can be threaded, e.g. CedrusButtonsDevice: SDL has to pump its events
+in the thread that set the video mode, and isn't safe to call from another thread while the main thread draws.
 """
-from experiment import getExperiment,getTracker,getLog,getDevice
+from experiment import getExperiment,getTracker,getLog,getDevice,Error
 import pygame, pylink
-from event import ESevent
+import threading, Queue, time, sys
+from event import ESevent,EventRing
+from samples import GazeBus,EventStream
+from detection import VelocityDetector,DispersionDetector,SaccadePredictor,TrackLossMonitor
+from linkdata import SAMPLE_TYPE,LEFT_EYE,RIGHT_EYE
 from constants import *
 try:
     import win32com
@@ -24,14 +38,101 @@ try:
 except ImportError:
     serial = None
 
+class Device:
+    """Abstract class for input devices, from which the device-specific classes inherit.
+
+    Child classes define read, which returns the events that have come in since the last read, timestamped as precisely as the device allows.
+    poll returns the result of read directly, or if the device has been given an InputThread, the events the thread has read in the meantime.
+    """
+    threadable = True
+    thread = None
+
+    def __init__(self):
+        self.ring = EventRing(getExperiment()['event_buffer_size'])
+        self.events = []
+        self.drained = []
+
+    def read(self):
+        """Defined by child classes: read the device and return a list of ESevents.
+        """
+        return ()
+
+    def poll(self):
+        """Return the events received from this device since the last poll.
+        """
+        if not self.thread: return self.read()
+        if self.thread.error:
+            error = self.thread.error
+            self.stopThread()
+            raise error[0],error[1],error[2]
+        events = self.drained
+        del events[:]
+        queue = self.thread.queue
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        return events
+
+    def wrap(self,pygameEvent,time=None):
+        """Return an ESevent holding the given pygame event.
+
+        Uses the device's EventRing, unless the device is read by an InputThread, in which case events may sit in the
+        thread's queue for an unbounded time and so each one gets its own ESevent object.
+        """
+        if self.thread: return ESevent(pygameEvent,time)
+        return self.ring.wrap(pygameEvent,time)
+
+    def startThread(self,interval):
+        """Start reading this device in a background thread every 'interval' seconds.
+        """
+        if not self.threadable: raise DeviceError("%s can't be read in a background thread"%self.__class__.__name__)
+        if not self.thread:
+            self.thread = InputThread(self,interval)
+            self.thread.start()
+
+    def stopThread(self):
+        """Stop the background thread, if any; the device will be read directly by poll from then on.
+        """
+        if self.thread:
+            thread = self.thread
+            thread.running = False
+            if thread is not threading.currentThread(): thread.join(1.0)
+            self.thread = None
+
+class InputThread(threading.Thread):
+    """Background thread which repeatedly reads a device and queues the events for the device's poll method.
+
+    Exceptions raised while reading (e.g. the Ctrl-Alt-Shift abort key combination) are stored and re-raised in the main thread by poll.
+    """
+    def __init__(self,device,interval):
+        threading.Thread.__init__(self,name="%s input"%device.__class__.__name__)
+        self.setDaemon(True)
+        self.device = device
+        self.interval = interval
+        self.queue = Queue.Queue()
+        self.running = True
+        self.error = None
+
+    def run(self):
+        try:
+            while self.running:
+                for event in self.device.read(): self.queue.put(event)
+                time.sleep(self.interval)
+        except:
+            self.error = sys.exc_info()
+
+class DeviceError(Error):
+    pass
+
 EYELINKBUTTONMAP = {1:"Y",2:"X",3:"B",4:"A",5:"left thumb",6:"left trigger",7:"right trigger"}
-class EyeLinkButtonsDevice:
+class EyeLinkButtonsDevice(Device):
     """Handle communication with the EyeLink II gamepad controller.
     """
     def __init__(self):
+        Device.__init__(self)
         getTracker().flushKeybuttons(1)
-    def poll(self):
-        buttonBuffer = []
+    def read(self):
+        buttonBuffer = self.events
+        del buttonBuffer[:]
         while 1:
             event_type, button, button_change, key_code, time = getTracker().readKeyButton()
             if event_type == pylink.KB_BUTTON and button_change in [pylink.KB_PRESS,pylink.KB_RELEASE]:
@@ -40,9 +141,9 @@ class EyeLinkButtonsDevice:
                                           
                                           {'key':EYELINKBUTTONMAP[button]}
                                           )
-                buttonBuffer.append(ESevent(pgev,
-                                            time=time
-                                            ))
+                buttonBuffer.append(self.wrap(pgev,
+                                              time=time
+                                              ))
             elif not event_type:
                 break
         return buttonBuffer
@@ -50,10 +151,11 @@ class EyeLinkButtonsDevice:
 BBOXMAPPING = {0:4,6:3,5:2,2:1,1:5,4:6,3:7,7:8}
 def byteToKey(byte):
     return (BBOXMAPPING[ord(byte)/32],(ord(byte)/16)%2)
-class CedrusButtonsDevice:
+class CedrusButtonsDevice(Device):
     """Collect input from a Cedrus button box.
     """
     def __init__(self):
+        Device.__init__(self)
         if not serial:
             raise "serial module must be installed to use button box."
         try:
@@ -79,43 +181,50 @@ class CedrusButtonsDevice:
 ##            self.buffer += self.port.read(1)
 ##        self.port.timeout = 0
 
-    def poll(self):
-        events = []
+    def read(self):
+        events = self.events
+        del events[:]
         self.buffer += self.port.read(12)
         while True:
             try: packet_start = self.buffer[:-5].index("k")
             except ValueError: break
             s = self.buffer[packet_start:packet_start+6]
             key,down = byteToKey(s[1])
-            events.append(ESevent(pygame.event.Event(down and CEDRUS_BUTTON_DOWN or CEDRUS_BUTTON_UP,key = key),
-                                  time = self.resetTime + (256**3)*ord(s[5])+(256**2)*ord(s[4])+256*ord(s[3])+ord(s[2])
-                                  ))
+            events.append(self.wrap(pygame.event.Event(down and CEDRUS_BUTTON_DOWN or CEDRUS_BUTTON_UP,key = key),
+                                    time = self.resetTime + (256**3)*ord(s[5])+(256**2)*ord(s[4])+256*ord(s[3])+ord(s[2])
+                                    ))
             del self.buffer[packet_start:packet_start+6]
         return events
         
         
-class MouseDevice:
+class MouseDevice(Device):
     """
     Define the mouse device, for holding a buffer of mouse input for Mouse response collectors to read from.
     """
+    threadable = False # SDL events have to be pumped from the thread that set the video mode
     def __init__(self):
+        Device.__init__(self)
         pygame.event.set_allowed([MOUSEBUTTONUP,MOUSEBUTTONDOWN,MOUSEMOTION])
         pygame.mouse.set_visible(True)
-    def poll(self):
+    def read(self):
+        del self.events[:]
         polltime = pylink.currentTime()
-        events = pygame.event.get([MOUSEBUTTONUP,MOUSEBUTTONDOWN,MOUSEMOTION])
-        return [ESevent(event,polltime) for event in events]
+        for event in pygame.event.get([MOUSEBUTTONUP,MOUSEBUTTONDOWN,MOUSEMOTION]):
+            self.events.append(self.wrap(event,polltime))
+        return self.events
 
-class KeyboardDevice:
+class KeyboardDevice(Device):
     """
     Define the keyboard device, for holding a buffer of keyboard input for Keyboard response collectors to read from.
     """
+    threadable = False # SDL events have to be pumped from the thread that set the video mode
     def __init__(self):
+        Device.__init__(self)
         pygame.event.set_allowed([KEYUP,KEYDOWN])
-    def poll(self):
+    def read(self):
+        del self.events[:]
         polltime = pylink.currentTime()
-        events = pygame.event.get([KEYUP,KEYDOWN])
-        for event in events:
+        for event in pygame.event.get([KEYUP,KEYDOWN]):
             if (event.type == KEYDOWN and
                 ((event.key in [pygame.K_LSHIFT,pygame.K_RSHIFT] and event.mod & pygame.KMOD_CTRL and event.mod & pygame.KMOD_ALT) or
                  (event.key in [pygame.K_RCTRL,pygame.K_LCTRL] and event.mod & pygame.KMOD_SHIFT and event.mod & pygame.KMOD_ALT) or
@@ -123,7 +232,8 @@ class KeyboardDevice:
                  )
                 ): # Ctrl-Alt-Shift pressed
                 raise "Experiment aborted."
-        return [ESevent(event,polltime) for event in events]
+            self.events.append(self.wrap(event,polltime))
+        return self.events
 
 
 class ButtonBoxDevice:
@@ -192,29 +302,147 @@ if win32com and win32api:
 else:
     ContextEvents = None
 
-class EyeLinkDevice:
+class EyeLinkDevice(Device):
     """Collects sample, fixation and saccade events from the eyetracker.
 
     Does not actually add any events to the Experiment's event queue (to keep the queue from being too long).
-    ResponseCollector objects which collect eyetracker data should use the getFloatData or getNewestSample methods
-    of the eyetracker object to retrieve EyeLink data.  The poll method of the EyeLinkDevice class
-    ensures that the datum returned by getFloatData or getNewestSample is up to date.
+    The device is the only reader of the link: each poll drains the link queue into the device's GazeBus (see samples.py),
+    samples into its SampleBuffer and other link data (fixation, saccade and blink events) into its EventStream.
+    ResponseCollector objects, detectors and displays which use eyetracker data read them from there, each through its own GazeReader,
+    so every consumer sees every sample and event however slowly the response loop runs and whatever the other consumers read.  The newest sample can still be read with getTracker().getNewestSample().
+
+    Attributes:
+    bus: GazeBus holding the most recent samples and link events (the numbers are set by the sample_buffer_size and event_buffer_size
+         experiment parameters).  Get a reader with bus.reader(eye).
+    detectors: dictionary mapping (eye,method) to the online event detectors run on each poll (see detection.py)
+    trackLoss: the TrackLossMonitor of each eye (indexed by eye), run on each poll (see detection.py)
+    landingReports: list of (saccade, name, predicted) for saccade-triggered responses whose landing position is to be logged (see reportLanding)
+    gazeMonitor: the experiment's GazeMonitor, updated on each poll, or None if the gaze_monitor parameter isn't set (see gaze_monitor.py)
     """
+    threadable = False
     def __init__(self):
+        Device.__init__(self)
         getTracker().resetData()
+        self.bus = GazeBus(getExperiment()['sample_buffer_size'],getExperiment()['event_buffer_size'])
+        self.detectors = {}
+        experiment = getExperiment()
+        self.trackLoss = [TrackLossMonitor(self.bus.samples,eye,experiment['bridge_gap'],experiment['blink_margin'],experiment['max_blink'])
+                          for eye in (LEFT_EYE,RIGHT_EYE)]
+        self.landingReports = []
+        self.newSamples = []
+        self.gazeMonitor = getExperiment().gazeMonitor
+        if self.gazeMonitor: self.gazeMonitor.attach(self.bus)
     def poll(self):
-        """Updates the most recent datum from the link, which can then be accessed by ResponseCollector objects using getTracker().getFloatData().
+        """Reads all the data waiting on the link into the GazeBus.
+        """
+        tracker = getTracker()
+        bus = self.bus
+        newSamples = self.newSamples
+        while 1:
+            type = tracker.getNextData()
+            if not type: break
+            data = tracker.getFloatData()
+            if type == SAMPLE_TYPE:
+                newSamples.append(data)
+            elif data:
+                bus.events.append(type,data)
+        if newSamples:
+            bus.samples.extend(newSamples)
+            del newSamples[:]
+            for monitor in self.trackLoss: monitor.update()
+            for detector in self.detectors.itervalues(): detector.update()
+            if self.landingReports: self.logLandings()
+            if self.gazeMonitor: self.gazeMonitor.update()
+        return ()
+    def detect(self,eye,method):
+        """Start detecting events in the given eye's samples with the given method ('ivt' or 'idt', see detection.py), if that isn't already being done.
+
+        Returns the EventStream to which the detected events are appended.
+        """
+        if not self.detectors.has_key((eye,method)):
+            experiment = getExperiment()
+            events = EventStream(experiment['event_buffer_size'])
+            if method == 'ivt':
+                detector = VelocityDetector(self.bus.samples,eye,events,experiment['pixels_per_degree'],
+                                            experiment['tracker_setSaccadeVelocityThreshold'],experiment['velocity_window'])
+            elif method == 'idt':
+                detector = DispersionDetector(self.bus.samples,eye,events,experiment['pixels_per_degree'],
+                                              experiment['idt_dispersion'],experiment['idt_duration'])
+            else:
+                raise DeviceError("Unknown event detection method: %s (must be 'ivt' or 'idt')"%method)
+            self.detectors[(eye,method)] = detector
+        return self.detectors[(eye,method)].events
+    def predictSaccades(self,eye):
+        """Start predicting the given eye's saccades (see SaccadePredictor in detection.py), if that isn't already being done.
+
+        Returns the SaccadePredictor.
+        """
+        if not self.detectors.has_key((eye,'predict')):
+            experiment = getExperiment()
+            self.detectors[(eye,'predict')] = SaccadePredictor(self.bus.samples,eye,EventStream(experiment['event_buffer_size']),
+                                                               experiment['pixels_per_degree'],experiment['tracker_setSaccadeVelocityThreshold'],
+                                                               experiment['tracker_setAccelerationThreshold'],experiment['onset_samples'],
+                                                               experiment['velocity_window'],experiment['main_sequence'])
+        return self.detectors[(eye,'predict')]
+    def logTrackLoss(self):
+        """Log the data-loss statistics since the last call (normally, for the trial), and start them afresh.
+
+        For each recorded eye ('left' or 'right'), they're logged as track_loss.<eye>.samples, track_loss.<eye>.missing
+        (the proportion of missing samples), track_loss.<eye>.blinks, track_loss.<eye>.losses and track_loss.<eye>.longest_gap (in ms).
+        An eye is taken to have been recorded if it had any valid samples; if neither eye had any, the statistics are logged
+        for the eye set by eye_used.
+        """
+        monitors = [monitor for monitor in self.trackLoss if monitor.samples > monitor.missing]
+        if not monitors: monitors = [self.trackLoss[getExperiment()['eye_used']]]
+        attributes = {}
+        for monitor in monitors:
+            samples,missing,blinks,losses,longestGap = monitor.stats()
+            name = "track_loss.%s"%('left','right')[monitor.eye]
+            attributes.update({'%s.samples'%name:samples,'%s.missing'%name:"%.3f"%(samples and float(missing)/samples or 0.0),
+                               '%s.blinks'%name:blinks,'%s.losses'%name:losses,'%s.longest_gap'%name:longestGap})
+        getLog().logAttributes(attributes)
+        self.resetTrackLoss()
+    def resetTrackLoss(self):
+        """Start the data-loss statistics afresh, e.g. at the beginning of a trial
         """
-        getTracker().getNextData()
-        return []
+        for monitor in self.trackLoss: monitor.reset()
+    def reportLanding(self,saccade,name,predicted):
+        """Log the predicted and actual landing positions of a saccade that triggered a response, once the saccade has ended.
 
-class SpeechDevice:
+        They're logged as <name>.predicted_x, <name>.predicted_y, <name>.landing_x, <name>.landing_y and <name>.landing_error
+        (the distance between the two, in pixels), along with <name>.landing_time, the time at which the saccade ended.
+        """
+        self.landingReports.append((saccade,name,predicted))
+        self.logLandings()
+    def logLandings(self,final=False):
+        """Log the landing reports for the saccades that have ended
+
+        If final is set (at the end of a trial, so that no report is left to be logged in the next trial's data),
+        the saccades that are still going on are logged too, with NA for their landing time and position.
+        """
+        NA = getExperiment()['NA_string']
+        for report in self.landingReports[:]:
+            saccade,name,predicted = report
+            if saccade.endTime == None and not final: continue
+            self.landingReports.remove(report)
+            attributes = {'%s.predicted_x'%name:int(round(predicted[0])),'%s.predicted_y'%name:int(round(predicted[1])),
+                          '%s.landing_time'%name:saccade.endTime != None and saccade.endTime or NA}
+            if saccade.endTime != None and saccade.landing:
+                attributes.update({'%s.landing_x'%name:int(round(saccade.landing[0])),'%s.landing_y'%name:int(round(saccade.landing[1])),
+                                   '%s.landing_error'%name:"%.1f"%((predicted[0]-saccade.landing[0])**2+(predicted[1]-saccade.landing[1])**2)**0.5})
+            else: # The saccade ended in missing data, or hadn't ended by the end of the trial
+                attributes.update({'%s.landing_x'%name:NA,'%s.landing_y'%name:NA,'%s.landing_error'%name:NA})
+            getLog().logAttributes(attributes)
+
+class SpeechDevice(Device):
     """Collect spoken responses using Microsoft's automatic speech recognition.
         
     Code adapted from http://surguy.net/articles/speechrecognition.xml
     """
+    threadable = False # The COM objects have to be pumped from the thread that created them
             
     def __init__(self):
+        Device.__init__(self)
         if not pythoncom or not win32com or not ContextEvents:
             raise "win32com and pythoncom must be installed for speech recognition to work"
         self.knownWords = []
@@ -243,9 +471,12 @@ class SpeechDevice:
         # And add an event handler that's called back when recognition occurs
         self.eventHandler = ContextEvents(self.context)
         
-    def poll(self):
+    def read(self):
         pythoncom.PumpWaitingMessages()
-        return [ESevent(event,event.time) for event in pygame.event.get(SPEECH_RECOGNITION)]
+        del self.events[:]
+        for event in pygame.event.get(SPEECH_RECOGNITION):
+            self.events.append(self.wrap(event,event.time))
+        return self.events
         
     def addWords(self,words):
         """
@@ -7,19 +7,26 @@ The data for a Display object may be accessed through dictionary notation. For i
 d['onset_time'] is the timestamp of the instant the display was shown (corresponding to the timestamps in the EyeLink data file)
 d['swap_time'] is the time, in milliseconds, it took to show the display and start the response collectors. swap_time represents the uncertainty in onset_time and
                in rt. The correct onset time may be between onset_time and onset_time+swap_time, and the correct rt may be between reported rt and reported rt - swap_time.
+d['late_frames'] is the number of buffer swaps for the display that missed their refresh (see FrameMonitor in timing.py), d['late_frame_times'] the times at which they occurred,
+               and d['max_swap'] the longest time, in milliseconds, spent in a single swap.  If the frame_timing parameter is set (the default), these are logged
+               for every display that is run, as <name>.late_frames, <name>.late_frame_times and <name>.max_swap.
 If the response_collectors parameter was not explictly set when the display was created, then a response collector object would automatically be created and the data from
 that response collector could be accessed from the display (e.g. d['acc'], d['rt'], etc.).  For details see the response_collectors.py docs and the description of the
 response_device keyword in the Display.__init__ docs, below.
 """
+from __future__ import with_statement
 import pygame, VisionEgg.Core, os, pylink, pygame.surfarray, pygame.image
 from VisionEgg.Textures import Texture,TextureStimulus,TextureTooLargeError
 from VisionEgg.Text import PangoText
-from experiment import getExperiment,getLog,checkForResponse,getTracker,Error
+from experiment import getExperiment,getLog,checkForResponse,getTracker,getDevice,setUpDevice,Error
 import VisionEgg.GL as gl
 from UserDict import DictMixin
-from interest_area import InterestArea
+from interest_area import InterestArea,InterestAreaSet,getAreaIndex
 from shapes import Rectangle
-import codecs
+from devices import EyeLinkDevice
+from samples import sampleTime
+from timing import Histogram
+import numpy
 try:
     import winsound
 except:
@@ -61,6 +68,10 @@ class Display(DictMixin):
                         Set to 'True' to calculate interest areas automatically (usually for text displays)
         background_for: Trial object for which this display defines the background image and interest areas.
                         This display's image and interest areas will be loaded for that trial in the EyeLink Data Viewer
+        reading_measures: if True, accumulate reading measures for the interest areas while the display runs, and log them as
+                          <name>.IA_<n>.<measure> when it ends (see reading_measures.py).  The measures are also available
+                          from the display's readingMonitor attribute, e.g. display.readingMonitor.measures.measure('gaze_duration',2)
+                          Displays run while the eyetracker isn't recording measure and log nothing.
         interest_area_file: filename for saving the interest areas. The file will be in data_directory (experiment parameter).
                             Default: a unique ID number prefixed with 'image_' if background_for is set; otherwise no interest area file will be written
         screen_image_file: filename for saving the screenshot of the display. The file will be in data_directory (experiment parameter).
@@ -121,6 +132,14 @@ class Display(DictMixin):
         
 
         self.prepareStimulus(stimulus) # prepareStimulus is defined differently for each child class
+        if isinstance(self.get('interest_areas',None),list):
+            # Index the interest areas now, so that gaze and mouse collectors monitoring them don't have to at the display's onset
+            getAreaIndex(self['interest_areas'])
+            if self['reading_measures']:
+                from response_collectors import ReadingMonitor
+                self.readingMonitor = ReadingMonitor(possible_resp=self['interest_areas'],name=self['name'],duration='stimulus',logging=[])
+                # Copy the list, so that a list shared between several displays doesn't collect one monitor per display
+                self['response_collectors'] = list(self['response_collectors']) + [self.readingMonitor]
 
         if self.get('background_for',None):
             # If this display is going to be the background image for a trial in the Data Viewer, then create unique names for the screenshot and interest area files
@@ -160,11 +179,26 @@ class Display(DictMixin):
         """
         self.drawToBuffer()
         while pylink.currentTime() < onset: checkForResponse()
+        frameMonitor = getExperiment().frameMonitor
+        frameMonitor.reset()
         self['onset_time']=pylink.currentTime()
-        VisionEgg.Core.swap_buffers()
+        frameMonitor.flip()
         for rc in self['response_collectors']: rc.start()
         self['swap_time']=pylink.currentTime()-self['onset_time']
         getTracker().sendMessage("%s.SYNCTIME %d"%(self['name'],pylink.currentTime()-self['onset_time']))
+        self.recordFrameTiming(frameMonitor)
+
+    def recordFrameTiming(self,frameMonitor):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Copy the late-frame count and times, and the longest swap, from the frame monitor into the display's parameters,
+        and inform the eyetracker of any late frames.
+        """
+        self['late_frames'] = frameMonitor.lateFrames
+        self['late_frame_times'] = frameMonitor.lateTimes[:]
+        self['max_swap'] = frameMonitor.maxSwap
+        for lateTime in frameMonitor.lateTimes:
+            getTracker().sendMessage("%d %s.LATE_FRAME"%(pylink.currentTime()-lateTime,self['name']))
 
     def run(self,onset=None):
         """Draws the screen and collects the response.
@@ -193,8 +227,16 @@ class Display(DictMixin):
         """helper method, not directly called in EyeScript scripts in general.
         
         Record the parameters specified in the 'logging' attribute in the txt behavioral data and edf eyetracker data files
+
+        If the frame_timing parameter is set, the late-frame count and times and the longest swap are logged as well.
         """
-        getLog().logAttributes(**dict([("%s.%s"%(self['name'],param),self[param]) for param in self.logging]))
+        attributes = dict([("%s.%s"%(self['name'],param),self[param]) for param in self.logging])
+        if self['frame_timing'] and self.params.has_key('late_frames'):
+            attributes["%s.late_frames"%self['name']] = self['late_frames']
+            attributes["%s.late_frame_times"%self['name']] = (",".join([str(lateTime) for lateTime in self['late_frame_times']])
+                                                              or getExperiment()['NA_string'])
+            attributes["%s.max_swap"%self['name']] = "%.2f"%self['max_swap']
+        getLog().logAttributes(**attributes)
 
     def drawToBuffer(self):
         """helper method, not directly called in EyeScript scripts in general.
@@ -246,10 +288,7 @@ class Display(DictMixin):
         """
         directory = os.path.dirname(filename)
         if not os.path.isdir(directory): os.makedirs(directory)
-        iaFile = codecs.open(filename,'w','utf8')
-        for i,ia in enumerate(self['interest_areas']):
-            iaFile.write("%s\t%s\t%s\t%s\n"%(ia.shapeName(),i+1,ia.coordinateString(),ia.label))
-        iaFile.close()
+        InterestAreaSet(self['interest_areas']).write(filename)
 
     
     def __getitem__(self,name):
@@ -650,6 +689,354 @@ class ContinueDisplay(SlideDisplay):
         SlideDisplay.draw(self,onset=self.display1['onset_time']+self['continue_delay'])
         self['onset_time'] = self.display1['onset_time']
         self['swap_time'] = self.display1['swap_time']
+        self['late_frames'] += self.display1['late_frames']
+        self['late_frame_times'] = self.display1['late_frame_times'] + self['late_frame_times']
+        self['max_swap'] = max(self['max_swap'],self.display1['max_swap'])
+
+class BoundaryDisplay(Display):
+    """Gaze-contingent boundary-change display: shows one display until the subject's gaze crosses an invisible boundary, then changes to another.
+
+    When creating a BoundaryDisplay object, the 'stimulus' argument should be a pair of Display objects (e.g. TextDisplays):
+    the display to show at onset, and the display to change to once the boundary is crossed.  Only the appearance of the two displays is used
+    (as in SlideDisplay); the interest areas are those of the first display.
+
+    The display change is made without going through the response loop: as soon as the first display is shown, the second is drawn
+    to the back buffer, and while the BoundaryDisplay runs, each new batch of gaze samples is read from the EyeLinkDevice and tested against
+    the boundary before any other response checking, and the buffers are swapped on the first sample past the boundary.
+    The change then only takes the time it takes to swap the buffers (at most one refresh, with vertical sync), so it can be completed
+    during the saccade that crosses the boundary.
+
+    Parameters (besides those for Display):
+    boundary: the x coordinate, in pixels, of a vertical boundary (the display changes on the first sample at or to the right of it),
+              or a Shape or InterestArea object (the display changes on the first sample inside it)
+    saccade_trigger: None to change on the first sample past the boundary; 'onset' or 'peak' to also change as soon as a saccade is under way
+                     whose predicted landing position is past the boundary, as predicted from saccade onset or from the velocity peak on
+                     (see SaccadePredictor in detection.py).  Predicted and actual landing positions are then logged when the saccade ends,
+                     as <name>.predicted_x, <name>.landing_x etc. (see EyeLinkDevice.reportLanding in devices.py).
+
+    Data (logged for every BoundaryDisplay that is run, as <name>.boundary_time etc., and NA if the boundary wasn't crossed):
+    boundary_time: timestamp of the first sample past the boundary (or of the sample on which the triggering landing prediction was made)
+    detect_time: time at which the crossing was detected (so detect_time - boundary_time is the link latency plus the time the sample
+                 waited to be read)
+    draw_time: time at which the second display was ready to be swapped in and the swap was started
+               (it's drawn in advance, so this normally follows detect_time immediately)
+    change_time: time at which the swap to the second display completed
+    flip_duration: time, in ms (with a fractional part), spent in the swap, e.g. waiting for the vertical retrace
+    change_latency: change_time - boundary_time, i.e. the time from the eye crossing the boundary to the display change, in ms
+                    (this includes the link latency of the sample)
+    benchmarks/gaze_latency.py runs BoundaryDisplays with the simulator or with the eyetracker and reports the distribution of these.
+    The eyetracker is sent a message BOUNDARY at the time of the crossing sample and a message DISPLAY_CHANGE at change_time.
+    """
+    def __init__(self,stimulus=[],logging = None,**params):
+        Display.__init__(self,stimulus,logging,**params)
+        if self.get('boundary',None) == None: raise Error("BoundaryDisplay %s: the boundary parameter must be set"%self['name'])
+        setUpDevice(EyeLinkDevice)
+
+    def prepareStimulus(self,displays):
+        """helper method, not directly called in EyeScript scripts in general."""
+        self.before,self.after = displays
+        self.viewport = self.before.viewport
+        if self.before.has_key('interest_areas'):
+            self['interest_areas'] = self.before['interest_areas']
+            self.setdefault('interest_area_labels',self.before.get('interest_area_labels',[]))
+
+    def draw(self,onset=None):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Show the first display, then draw the second to the back buffer so that it's ready to be swapped in.
+        """
+        if not getExperiment().recording: raise Error("BoundaryDisplay %s: must be recording to monitor gaze position"%self['name'])
+        self.eyeUsed = getTracker().eyeAvailable()
+        if self.eyeUsed == 2: self.eyeUsed = self['eye_used']
+        self.device = getDevice(EyeLinkDevice)
+        self.reader = self.device.bus.reader(self.eyeUsed)
+        self['boundary_time'] = self['detect_time'] = self['draw_time'] = self['change_time'] = self['flip_duration'] = self['change_latency'] = None
+        if self['saccade_trigger'] not in [None,'onset','peak']:
+            raise Error("BoundaryDisplay %s: saccade_trigger must be None, 'onset' or 'peak', not %r"%(self['name'],self['saccade_trigger']))
+        if self['saccade_trigger']: self.predictor = self.device.predictSaccades(self.eyeUsed)
+        Display.draw(self,onset)
+        self.after.drawToBuffer()
+
+    def checkBoundary(self):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Read the samples that have arrived since the last check and, if one of them is past the boundary, show the second display.
+        Returns True if the display was changed.
+        """
+        self.device.poll()
+        times,x,y = self.reader.samples()
+        boundary = self['boundary']
+        if not hasattr(boundary,'containsArray'):
+            with numpy.errstate(invalid='ignore'): # Missing samples (NaN) are never past the boundary
+                past = numpy.flatnonzero((x >= boundary) & (times >= self['onset_time']))
+        else:
+            past = numpy.flatnonzero(boundary.containsArray(x,y) & (times >= self['onset_time']))
+        if len(past): boundaryTime = sampleTime(times[past[0]])
+        else: boundaryTime = None
+        if self['saccade_trigger']:
+            # Change during the saccade if it's predicted to land past the boundary (and the samples don't show an earlier crossing)
+            saccade = self.predictor.prediction(self['saccade_trigger'])
+            if (saccade and saccade.predictionTime >= self['onset_time'] and (boundaryTime == None or saccade.predictionTime < boundaryTime)
+                and self.pastBoundary(saccade.predicted)):
+                boundaryTime = saccade.predictionTime
+                self.device.reportLanding(saccade,self['name'],saccade.predicted)
+        if boundaryTime == None: return False
+        self.change(boundaryTime,pylink.currentTime())
+        return True
+
+    def pastBoundary(self,point):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Return True if the point (x,y) is past the boundary.
+        """
+        boundary = self['boundary']
+        if not hasattr(boundary,'contains'): return point[0] >= boundary
+        return boundary.contains(point)
+
+    def change(self,boundaryTime,detectTime):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Swap in the second display, which is already in the back buffer, and record the time from the boundary crossing to the change.
+        """
+        frameMonitor = getExperiment().frameMonitor
+        self['draw_time'] = pylink.currentTime()
+        late = frameMonitor.flip()
+        self['change_time'] = pylink.currentTime()
+        self['flip_duration'] = frameMonitor.lastSwap
+        self['boundary_time'] = boundaryTime
+        self['detect_time'] = detectTime
+        self['change_latency'] = self['change_time'] - boundaryTime
+        getTracker().sendMessage("%s.DISPLAY_CHANGE"%self['name'])
+        getTracker().sendMessage("%d %s.BOUNDARY"%(pylink.currentTime()-boundaryTime,self['name']))
+        self['max_swap'] = frameMonitor.maxSwap
+        if late:
+            self['late_frames'] += 1
+            self['late_frame_times'].append(self['change_time'])
+            getTracker().sendMessage("%d %s.LATE_FRAME"%(pylink.currentTime()-self['change_time'],self['name']))
+
+    def run(self,onset=None):
+        """Show the first display, change to the second when the gaze crosses the boundary, and collect the response.
+
+        See Display.run for the onset argument.
+        """
+        checkForResponse() # Clears the pygame event buffer
+        self.draw(onset=onset)
+        changed = False
+        while self['duration'] == 'infinite' or pylink.currentTime() < self['onset_time'] + self['duration']:
+            if not changed:
+                if getTracker(): changed = self.checkBoundary()
+                elif pylink.currentTime() > self['onset_time'] + 2000:
+                    # So that the experiment can be tested without the eyetracker, just fake a crossing after 2000 milliseconds
+                    self.change(pylink.currentTime(),pylink.currentTime())
+                    changed = True
+            responses = checkForResponse()
+            if [rc for rc in self['response_collectors'] if rc in responses]: break
+        for rc in self['response_collectors']:
+            if rc['duration'] == 'stimulus': rc.stop()
+        checkForResponse() # This will stop any response collectors whose duration equals this display's duration
+        self.log()
+
+    def log(self):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Log the boundary crossing and display change times along with the parameters in the 'logging' attribute.
+        """
+        NA = getExperiment()['NA_string']
+        attributes = {}
+        for param in ['boundary_time','detect_time','draw_time','change_time','change_latency']:
+            value = self[param]
+            attributes["%s.%s"%(self['name'],param)] = value == None and NA or value
+        attributes["%s.flip_duration"%self['name']] = self['flip_duration'] == None and NA or "%.2f"%self['flip_duration']
+        getLog().logAttributes(**attributes)
+        Display.log(self)
+
+class MovingWindowDisplay(Display):
+    """Gaze-contingent moving-window or foveal-mask display: shows one version of a text (or other stimulus) in a window around the
+    current gaze position, and another version everywhere else.
+
+    When creating a MovingWindowDisplay object, the 'stimulus' argument can be either
+    a string, in which case a TextDisplay of the text and a TextDisplay of the text with every non-space character replaced by
+    mask_character are created, and the 'mask' parameter says which one goes inside the window; or
+    a pair of Display objects (e.g. TextDisplays or ImageDisplays): the display to show inside the window, and the display to show outside it.
+    The interest areas are those of the first display.
+
+    Both versions are rendered once, when the MovingWindowDisplay is created, and kept as full-screen textures.
+    While the display runs, each frame draws only the parts of the screen that change: the window at the newest gaze position
+    is drawn from the inside version, and the window positions of the previous two frames (still in the back buffer) are restored
+    from the outside version, with the drawing clipped to those rectangles (OpenGL scissor test).  The buffers are swapped every frame,
+    so the window is updated at the monitor's refresh rate.
+
+    Parameters (besides those for Display):
+    mask: for a string stimulus, 'window' (the text is only visible inside the window, the default) or 'foveal' (the text is masked inside the window)
+    mask_character: for a string stimulus, the character replacing the letters of the masked text (default 'x')
+    window_size: (width, height) of the window in pixels, centered on the gaze position; a height of None (the default) makes the
+                 window span the whole height of the screen.  Default (300,None).
+
+    Data (logged for every MovingWindowDisplay that is run, as <name>.window_frames etc.):
+    window_frames: the number of frames shown
+    gaze_latency_mean, gaze_latency_p99, gaze_latency_max: time, in ms, from the timestamp of the gaze sample that positioned the window
+                                                           to the completion of the buffer swap showing it
+                                                           (this includes the link latency of the sample)
+
+    So that the experiment can be tested without the eyetracker, the window follows the mouse when there is no eyetracker.
+    """
+    def __init__(self,stimulus=[],logging = None,**params):
+        params.setdefault('window_size',(300,None))
+        params.setdefault('mask','window')
+        params.setdefault('mask_character','x')
+        Display.__init__(self,stimulus,logging,**params)
+        setUpDevice(EyeLinkDevice)
+
+    def prepareStimulus(self,stimulus):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Render the two versions of the stimulus to textures.
+        """
+        if isinstance(stimulus,basestring):
+            displayParams = self.params.copy()
+            displayParams['response_collectors'] = []
+            for param in ['background_for','screen_image_file','interest_area_file']: displayParams.pop(param,None)
+            masked = "".join([(character.isspace() and character) or self['mask_character'] for character in stimulus])
+            text = TextDisplay(stimulus,logging = [],**displayParams)
+            maskedText = TextDisplay(masked,logging = [],**displayParams)
+            if self['mask'] == 'window': stimulus = (text,maskedText)
+            elif self['mask'] == 'foveal': stimulus = (maskedText,text)
+            else: raise Error("MovingWindowDisplay %s: mask must be 'window' or 'foveal', not %r"%(self['name'],self['mask']))
+        self.inside,self.outside = stimulus
+        self.viewport = self.inside.viewport # Screenshots show the inside version everywhere
+        if self.inside.has_key('interest_areas'):
+            self['interest_areas'] = self.inside['interest_areas']
+            self.setdefault('interest_area_labels',self.inside.get('interest_area_labels',[]))
+        self.insideViewport = self.renderToTexture(self.inside)
+        self.outsideViewport = self.renderToTexture(self.outside)
+
+    def renderToTexture(self,display):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Draw a display and return a viewport showing a full-screen texture of the result.
+        """
+        display.drawToBuffer()
+        texture = Texture(getExperiment().screen.get_framebuffer_as_image())
+        return fullViewport([TextureStimulus(texture=texture,mipmaps_enabled=False,position=(0,0),size=getExperiment().screen.size)])
+
+    def windowRect(self,gaze):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Return the window around the gaze position (x,y), in screen coordinates, as the (x,y,width,height) OpenGL scissor rectangle
+        (whose y is measured from the bottom of the screen).
+        """
+        screenWidth,screenHeight = getExperiment().screen.size
+        width,height = self['window_size']
+        if height == None: height = screenHeight
+        left = int(round(gaze[0]-width/2.0))
+        bottom = screenHeight-int(round(gaze[1]+height/2.0))
+        return (left,bottom,width,height)
+
+    def gaze(self):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Return (time, (x,y)) for the newest gaze sample, or for the mouse position if there's no eyetracker.
+        Missing samples (e.g. during blinks) leave the window where it was.
+        """
+        if not getTracker(): return pylink.currentTime(),pygame.mouse.get_pos()
+        self.device.poll()
+        newest = self.device.bus.samples.last(self.eyeUsed)
+        if newest == None or numpy.isnan(newest[1]) or numpy.isnan(newest[2]): return None,self.position
+        return sampleTime(newest[0]),(float(newest[1]),float(newest[2]))
+
+    def drawFrame(self,full=False):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Draw the next frame to the back buffer, with the window at the newest gaze position.
+        If full is False, only the window and the window positions of the previous two frames are drawn.
+        """
+        self.sampleTime,self.position = self.gaze()
+        window = self.windowRect(self.position)
+        if full:
+            getExperiment().screen.parameters.bgcolor = self.outside['bgcolor']
+            getExperiment().screen.clear()
+            self.outsideViewport.draw()
+        gl.glEnable(gl.GL_SCISSOR_TEST)
+        try:
+            if not full:
+                for rect in self.previousWindows:
+                    if rect != window:
+                        gl.glScissor(*rect)
+                        self.outsideViewport.draw()
+            gl.glScissor(*window)
+            self.insideViewport.draw()
+        finally:
+            gl.glDisable(gl.GL_SCISSOR_TEST)
+        # With double buffering, the back buffer holds the frame before last
+        self.previousWindows = [window] + self.previousWindows[:1]
+
+    def draw(self,onset=None):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Show the first frame, with the window at the current gaze position.  See Display.draw.
+        """
+        if getTracker():
+            if not getExperiment().recording: raise Error("MovingWindowDisplay %s: must be recording to monitor gaze position"%self['name'])
+            self.eyeUsed = getTracker().eyeAvailable()
+            if self.eyeUsed == 2: self.eyeUsed = self['eye_used']
+        self.device = getDevice(EyeLinkDevice)
+        screenWidth,screenHeight = getExperiment().screen.size
+        self.position = (screenWidth/2,screenHeight/2)
+        self.previousWindows = []
+        self.latency = Histogram()
+        while pylink.currentTime() < onset: checkForResponse()
+        self.drawFrame(full=True)
+        frameMonitor = getExperiment().frameMonitor
+        frameMonitor.reset()
+        self['onset_time']=pylink.currentTime()
+        frameMonitor.flip()
+        self.recordLatency()
+        # The back buffer doesn't hold a complete frame yet
+        self.drawFrame(full=True)
+        frameMonitor.flip(consecutive=True)
+        self.recordLatency()
+        for rc in self['response_collectors']: rc.start()
+        self['swap_time']=pylink.currentTime()-self['onset_time']
+        getTracker().sendMessage("%s.SYNCTIME %d"%(self['name'],pylink.currentTime()-self['onset_time']))
+
+    def recordLatency(self):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Record the time from the sample that positioned the window to the completion of the swap that showed it.
+        """
+        if self.sampleTime != None: self.latency.add((pylink.currentTime()-self.sampleTime)*1000.0)
+
+    def run(self,onset=None):
+        """Show the display, moving the window with the gaze every frame, and collect the response.
+
+        See Display.run for the onset argument.
+        """
+        checkForResponse() # Clears the pygame event buffer
+        self.draw(onset=onset)
+        frameMonitor = getExperiment().frameMonitor
+        while self['duration'] == 'infinite' or pylink.currentTime() < self['onset_time'] + self['duration']:
+            self.drawFrame()
+            frameMonitor.flip(consecutive=True)
+            self.recordLatency()
+            responses = checkForResponse()
+            if [rc for rc in self['response_collectors'] if rc in responses]: break
+        self['window_frames'] = frameMonitor.frames
+        self.recordFrameTiming(frameMonitor)
+        for rc in self['response_collectors']:
+            if rc['duration'] == 'stimulus': rc.stop()
+        checkForResponse() # This will stop any response collectors whose duration equals this display's duration
+        self.log()
+
+    def log(self):
+        """helper method, not directly called in EyeScript scripts in general.
+
+        Log the number of frames and the gaze-to-screen latency along with the parameters in the 'logging' attribute.
+        """
+        getLog().logAttributes(**{"%s.window_frames"%self['name']:self['window_frames'],
+                                  "%s.gaze_latency_mean"%self['name']:"%.2f"%(self.latency.mean()/1000.0),
+                                  "%s.gaze_latency_p99"%self['name']:"%.2f"%(self.latency.percentile(99)/1000.0),
+                                  "%s.gaze_latency_max"%self['name']:"%.2f"%(self.latency.max/1000.0)})
+        Display.log(self)
 
 class InterestAreaLabelError(Error):
     """Utility class not directly used in EyeScript scripts
@@ -1,26 +1,80 @@
 # -*- coding: utf-8 -*-
 """EyeScript scripts will normally not need to directly deal with events, but will work through ResponseCollector objects instead.
 """
+import pylink
 
-class ESevent:
+class ESevent(object):
     """
     Wrapper class for pygame events, to allow events to be timestamped as soon as they're detected.
-    
+
     ESevents are returned by the poll method of device objects.
-    Unlike pygame events, ESevents can have arbitrary attributes defined for them (e.g. a widget attribute, for a mouse-down event)
     Pygame events are documented at www.pygame.org.  Pygame events hold the data associated with individual mouse downs, mouse ups, mouse motions, key downs, key ups,
     and potentially, user-defined events such as speech responses.
+
+    The attributes that response collectors look at (type, key, pos, button, etc.) are copied from the pygame event when the ESevent is set,
+    so that reading them in handleEvent is a plain slot lookup.  Attributes not listed in __slots__ are still looked up on the wrapped pygame event.
+    ESevent objects are normally not created directly but taken from an EventRing, which reuses them (see below).
     """
-    def __init__(self,pygameEvent,time=None):
+    __slots__ = ('type','time','key','mod','unicode','pos','rel','button','buttons','word','streamPosition','pygameEvent')
+
+    def __init__(self,pygameEvent=None,time=None):
         """
         Store the pygame event and record the time (defaults to current time when __init__ is run)
         """
+        self.pygameEvent = None
+        self.type = self.time = self.key = self.mod = self.unicode = None
+        self.pos = self.rel = self.button = self.buttons = self.word = self.streamPosition = None
+        if pygameEvent != None: self.set(pygameEvent,time)
+
+    def set(self,pygameEvent,time=None):
+        """
+        Fill in this ESevent from a pygame event, overwriting whatever it held before.
+
+        Returns the ESevent itself, so that devices can write e.g. events.append(ring.wrap(pgev,polltime))
+        """
         if time == None: self.time = pylink.currentTime()
         else: self.time = time
         self.pygameEvent = pygameEvent
+        self.type = pygameEvent.type
+        attributes = pygameEvent.dict
+        self.key = attributes.get('key')
+        self.mod = attributes.get('mod')
+        self.unicode = attributes.get('unicode')
+        self.pos = attributes.get('pos')
+        self.rel = attributes.get('rel')
+        self.button = attributes.get('button')
+        self.buttons = attributes.get('buttons')
+        self.word = attributes.get('word')
+        self.streamPosition = attributes.get('streamPosition')
+        return self
+
     def __getattr__(self,attribute):
         """
-        The esEvent will have all the attributes as the pygame event it contains.
+        Called only for attributes that aren't slots; looks them up on the pygame event.
         """
         return getattr(self.pygameEvent,attribute)
-            
+
+class EventRing(object):
+    """
+    A fixed pool of ESevent objects which the devices fill in and hand out in turn.
+
+    Each device has its own EventRing, so that in the steady state polling a device doesn't create any new event objects.
+    An ESevent handed out by the ring stays valid until the ring has wrapped around, i.e. until 'size' more events have been
+    taken from the same device.  Response collectors copy what they need (time, key, etc.) out of the events in handleEvent,
+    so the default size of the experiment's event_buffer_size parameter is plenty.
+    """
+    __slots__ = ('events','size','index')
+
+    def __init__(self,size=256):
+        self.events = [ESevent() for i in xrange(size)]
+        self.size = size
+        self.index = 0
+
+    def wrap(self,pygameEvent,time=None):
+        """
+        Return the next ESevent in the ring, set to hold the given pygame event and timestamp.
+        """
+        event = self.events[self.index]
+        self.index += 1
+        if self.index == self.size: self.index = 0
+        return event.set(pygameEvent,time)
@@ -7,10 +7,11 @@ It also contains classes and functions for data logging, as well as a few useful
 import pylink
 from pylink.EyeLinkCoreGraphics.EyeLinkCoreGraphicsVE import EyeLinkCoreGraphicsVE
 import VisionEgg.Core
-import os
+import os, sys, time, subprocess
 import pygame
 import codecs
 from UserDict import DictMixin
+from timing import LoopMonitor,FrameMonitor,clock
 
 
 class Experiment(DictMixin):
@@ -31,6 +32,11 @@ class Experiment(DictMixin):
     getExperiment()['subject']
     getExperiment()['session']
     getExperiment()['list_number']
+
+    Setting headless = True (or setting the environment variable EYESCRIPT_HEADLESS=1) runs the experiment unattended, e.g. for benchmarks
+    or automated tests on a machine without a GPU or monitor: VisionEgg renders into an ordinary window using Mesa's software OpenGL,
+    on a virtual X display (Xvfb) if no display is available, the session info is taken from the session_values parameter instead of
+    being asked for, and response collectors make up a response headless_response_delay ms after they start.
     """
     theExperiment = None
     def __init__(self,**params):
@@ -45,13 +51,22 @@ class Experiment(DictMixin):
         if unusedKeys: raise "Experiment():  Experimental parameter(s) not recognized: %s"%(", ".join(unusedKeys))
         self.params = defaultParams.copy()
         self.update(params)
+        if os.environ.get('EYESCRIPT_HEADLESS','0') not in ['','0']: self['headless'] = True
         
         #Read in the subject ID and set the data filename accordingly
         if not os.path.isdir(self['data_directory']):
             os.mkdir(self['data_directory'])
+
+        # If session_values is set (or we're running headless), don't ask the experimenter for the session info
+        sessionValues = self['session_values']
+        if sessionValues == None and self['headless']: sessionValues = {}
             
         while 1:
-            subjectString = self['subject'] = raw_input("Enter subject ID (0 for no data logging): ").decode('437')
+            if sessionValues == None:
+                self['subject'] = raw_input("Enter subject ID (0 for no data logging): ").decode('437')
+            else:
+                self['subject'] = unicode(sessionValues.get('subject',0))
+            subjectString = self['subject']
             if self['subject'].isdigit():
                 self['subject'] = int(self['subject'])
                 subjectString = "%03d"%self['subject']
@@ -65,7 +80,10 @@ class Experiment(DictMixin):
                 if attribute == "nativelang": longattr = "mother tongue"
                 if attribute == "origin": longattr = "origin (Bundesland)"
                 if attribute == "time": longattr = "time (morning/noon/afternoon/evening)"			
-                self[attribute] = raw_input("Enter %s: "%longattr).decode('437')
+                if sessionValues == None:
+                    self[attribute] = raw_input("Enter %s: "%longattr).decode('437')
+                else:
+                    self[attribute] = unicode(sessionValues.get(attribute,""))
                 if self[attribute].isdigit(): self[attribute] = int(self[attribute])
                 if self[attribute] == "": self[attribute] = "."
             
@@ -82,11 +100,15 @@ class Experiment(DictMixin):
                 self['data_file_root_name'],os.extsep
                 )
                                       )
+            self.timingdatafile=os.path.join(self['data_directory'],"%s_timing%stxt"%(
+                self['data_file_root_name'],os.extsep
+                )
+                                        )
             print "\nPlease verify the session info."
             for attribute in ['subject'] + self['session_info']: print "%s: %s"%(attribute,self[attribute])
             if self['subject'] > 0 and (os.path.isfile(self.eyedatafile) or os.path.isfile(self.textdatafile)):
                print "WARNING: data file already exists and will be overwritten unless the session info is changed."
-            if raw_input("\nKeep the session info as is? (y/n): ")!="n": break
+            if sessionValues != None or raw_input("\nKeep the session info as is? (y/n): ")!="n": break
 
         
         self.log = self.EventLog(**dict([(attribute,self[attribute]) for attribute in ['subject']+self['session_info']]))
@@ -96,9 +118,25 @@ class Experiment(DictMixin):
 
         self.trialNumber = 0
         self.recording = False
+        # If loop_timing is set, checkForResponse records the response-loop period and device poll durations (see timing.py)
+        self.loopMonitor = self['loop_timing'] and LoopMonitor() or None
+        # If gaze_monitor is set, the EyeLinkDevice keeps a live heatmap and scanpath of each trial (see gaze_monitor.py)
+        self.gazeMonitor = None
+        if self['gaze_monitor']:
+            from gaze_monitor import GazeMonitor
+            options = {'screen_size':self['screen_size'],'eye':self['eye_used']}
+            options.update(self['gaze_monitor_options'])
+            self.gazeMonitor = GazeMonitor(**options)
+        # If drift_monitor is set, gcFixation measures the drift from its targets and checkDrift corrects it (see trials.py)
+        self.driftMonitor = None
+        if self['drift_monitor']:
+            from trials import DriftMonitor
+            self.driftMonitor = DriftMonitor(self['drift_threshold'],self['recalibration_threshold'],self['drift_window'])
         
         self._vEggConfig()
         self.screen = VisionEgg.Core.get_default_screen()  
+        # Displays swap the buffers through the frame monitor, which counts frames that missed their refresh
+        self.frameMonitor = FrameMonitor(VisionEgg.Core.swap_buffers,self['refresh_rate'],self['frame_tolerance'])
         self._trackerCreate()
         pygame.event.set_allowed(None) # If/when mouse and keyboard devices are created, then mouse and keyboard events will be allowed
         self.devices = []
@@ -108,8 +146,10 @@ class Experiment(DictMixin):
         setUpDevice(devices.KeyboardDevice) #Set up the keyboard so that we can (at least) handle the abort key combo during the experiment.
         from displays import TextDisplay
         # Show a display while we're setting up the trials.
+        # getEvents alternates between these two lists rather than building a new queue on every call
         self.eventQueue = []
-        TextDisplay("Loading experiment...",duration=0,response_collectors=[]).run()
+        self.eventsOut = []
+        TextDisplay("Loading experiment...",duration=0,response_collectors=[],frame_timing=False).run()
     
     def _vEggConfig(self):
       """Helper method not directly called in EyeScript scripts in general
@@ -120,23 +160,61 @@ class Experiment(DictMixin):
       VisionEgg.start_default_logging(); VisionEgg.watch_exceptions()
 
       VisionEgg.config.VISIONEGG_GUI_INIT = 0
-      VisionEgg.config.VISIONEGG_FRAMELESS_WINDOW = 1
-      VisionEgg.config.VISIONEGG_FULLSCREEN = 1
-      VisionEgg.config.VISIONEGG_HIDE_MOUSE = True
+      if self['headless']:
+          # Render with Mesa's software rasterizer into an ordinary window, without waiting for the vertical retrace,
+          # and send audio nowhere.
+          os.environ.setdefault('LIBGL_ALWAYS_SOFTWARE','1')
+          os.environ.setdefault('SDL_AUDIODRIVER','dummy')
+          if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'): self._startVirtualDisplay()
+          VisionEgg.config.VISIONEGG_FRAMELESS_WINDOW = 0
+          VisionEgg.config.VISIONEGG_FULLSCREEN = 0
+          VisionEgg.config.VISIONEGG_HIDE_MOUSE = False
+          VisionEgg.config.VISIONEGG_SYNC_SWAP = 0
+      else:
+          VisionEgg.config.VISIONEGG_FRAMELESS_WINDOW = 1
+          VisionEgg.config.VISIONEGG_FULLSCREEN = 1
+          VisionEgg.config.VISIONEGG_HIDE_MOUSE = True
       VisionEgg.config.VISIONEGG_MONITOR_REFRESH_HZ = self['refresh_rate']
       VisionEgg.config.VISIONEGG_SCREEN_W = self['screen_size'][0]
       VisionEgg.config.VISIONEGG_SCREEN_H = self['screen_size'][1]
       VisionEgg.config.VISIONEGG_PREFERRED_BPP = self['bits_per_pixel']
 
+    def _startVirtualDisplay(self):
+      """Helper method not directly called in EyeScript scripts in general
+
+      Starts an Xvfb virtual X server (display number set by the headless_display parameter) for running headless without a display.
+      """
+      try:
+          self.virtualDisplay = subprocess.Popen(['Xvfb',self['headless_display'],'-screen','0',"%dx%dx24"%tuple(self['screen_size'])])
+      except OSError:
+          raise Error("Running headless without a DISPLAY requires Xvfb to be installed")
+      time.sleep(1) # Give the X server a moment to start accepting connections
+      os.environ['DISPLAY'] = self['headless_display']
+
     def _trackerCreate(self):
         """Helper method not directly called in EyeScript scripts in general
         
         configures the Eyelink eyetracker
         """        
-        try:
-            self.tracker = pylink.EyeLink()
-        except (RuntimeError,AttributeError):
+        if self['eyetracker'] == 'simulator':
+            from simulator import SimulatedTracker
+            options = {'screen_size':self['screen_size'],'pixels_per_degree':self['pixels_per_degree']}
+            options.update(self['simulator_options'])
+            self.tracker = SimulatedTracker(**options)
+        elif self['eyetracker'] == 'replay':
+            from replay import ReplayTracker
+            options = {'screen_size':self['screen_size']}
+            options.update(self['replay_options'])
+            self.tracker = ReplayTracker(**options)
+        elif self['eyetracker'] == 'stub':
             self.tracker = EyetrackerStub()
+        elif self['eyetracker'] == 'eyelink':
+            try:
+                self.tracker = pylink.EyeLink()
+            except (RuntimeError,AttributeError):
+                self.tracker = EyetrackerStub()
+        else:
+            raise Error("Unknown eyetracker: %s (must be 'eyelink', 'simulator', 'replay' or 'stub')"%self['eyetracker'])
 
         #This tells the tracker to use VisionEgg to display Eyelink graphics
         #including calibration points, camera images, etc.
@@ -166,9 +244,12 @@ class Experiment(DictMixin):
         """Helper method not directly called in EyeScript scripts in general
         
         Shuts down VisionEgg and writes the EventLog to a file."""
+        for device in self.devices:
+            if getattr(device,'thread',None): device.stopThread()
         self.tracker.setOfflineMode()
         if self['subject'] > 0:            
             self.log.writeLog(self.textdatafile)
+            if self.loopMonitor: self.loopMonitor.writeHistograms(self.timingdatafile)
             pylink.msecDelay(500)
             try:
                 self.tracker.closeDataFile()
@@ -177,6 +258,9 @@ class Experiment(DictMixin):
                 pass
         self.tracker.close()
         self.screen.close()
+        if getattr(self,'virtualDisplay',None):
+            self.virtualDisplay.terminate()
+            self.virtualDisplay.wait()
 
     def __getitem__(self,name):
         """Helper method not directly called in EyeScript scripts
@@ -317,17 +401,35 @@ def checkForResponse():
     return [rc for rc in getExperiment().response_collectors if rc.respond(events)]
 
 def updateEvents():
-    if getExperiment().recording:
+    experiment = getExperiment()
+    if experiment.recording:
         action = getTracker().isRecording()
         if action != pylink.TRIAL_OK:
             raise TrialAbort(action)
     pygame.event.pump()
-    for device in getExperiment().devices: getExperiment().eventQueue.extend(device.poll())
+    eventQueue = experiment.eventQueue
+    monitor = experiment.loopMonitor
+    if monitor:
+        polltime = monitor.iteration()
+        for device in experiment.devices:
+            eventQueue.extend(device.poll())
+            now = clock()
+            monitor.pollTime(device,now-polltime)
+            polltime = now
+    else:
+        for device in experiment.devices: eventQueue.extend(device.poll())
 
 def getEvents():
+    """Poll the devices and return the events received since the last call.
+
+    The returned list is reused: it is only valid until the next call to getEvents (i.e. the next checkForResponse).
+    """
     updateEvents()
-    events = getExperiment().eventQueue
-    getExperiment().eventQueue = []
+    experiment = getExperiment()
+    events = experiment.eventQueue
+    experiment.eventQueue = experiment.eventsOut
+    experiment.eventsOut = events
+    del experiment.eventQueue[:]
     return events
 
 def getDevice(device_class):
@@ -340,8 +442,14 @@ def getDevice(device_class):
 
 def setUpDevice(device_class):
     """Given a device class, adds a device of that class to the experiment's list of devices (if it's not already added).
+
+    If the class name is listed in the threaded_devices experiment parameter, the device is read by a background thread.
     """
-    if not getDevice(device_class): getExperiment().devices.append(device_class())
+    if not getDevice(device_class):
+        device = device_class()
+        getExperiment().devices.append(device)
+        if device_class.__name__ in getExperiment()['threaded_devices']:
+            device.startThread(getExperiment()['device_thread_interval'])
 
 class TrialAbort(Exception):
     """Exception raised if the experimenter aborts a trial via CTRL-ALT-A on the EyeLink PC, or if there's an error with the eyetracker.
@@ -384,6 +492,7 @@ def calibrateTracker(colors=None):
     print 'setting up tracker %s'%(getTracker() or 'Tracker is fake')
     getTracker().doTrackerSetup(getExperiment()['screen_size'][0],getExperiment()['screen_size'][1])
     pygame.mouse.set_visible(mouseVisibility)
+    if getExperiment().driftMonitor: getExperiment().driftMonitor.calibrated()
 
 def runSession(callback):
     """Calls the given function, in addition to doing some logging and final cleanup.
@@ -393,7 +502,7 @@ def runSession(callback):
     Argument: callback, the function defining what happens during a session.
     """
     from displays import TextDisplay
-    closeDisplay = TextDisplay("Saving data...",duration=0,response_collectors=[])
+    closeDisplay = TextDisplay("Saving data...",duration=0,response_collectors=[],frame_timing=False)
     try:
         result=callback()
     finally:
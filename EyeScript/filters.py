@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Smoothing filters for the gaze samples, applied in EyeScript before the gaze collectors test them against their areas.
+
+The EyeLink's heuristic_filter is applied on the tracker, with a fixed delay.  The filters here run in EyeScript itself, so they
+can be chosen per experiment or per response collector with the gaze_filter parameter:
+None:       no filtering (the default)
+'median':   moving median over the last window samples.  Removes isolated noise spikes without smearing saccades,
+            at the cost of (window-1)/2 samples of delay.
+'kalman':   Kalman filter with a random-walk model of each gaze coordinate.  process_noise (pixels^2 per ms) sets how fast the gaze
+            is expected to move, and measurement_noise (pixels^2) how noisy the samples are; the ratio sets the smoothing.
+'oneeuro':  the 1 Euro filter (Casiez, Roussel and Vogel 2012): a low-pass filter whose cutoff frequency rises with the gaze velocity,
+            so fixations are smoothed heavily and saccades hardly delayed.  min_cutoff (Hz) sets the smoothing during fixations,
+            and beta how fast the cutoff rises with velocity (in pixels per second).
+Options for the filter are given in the gaze_filter_options parameter, e.g. gaze_filter='median', gaze_filter_options={'window':5}.
+
+Each gaze collector filters its own samples, one batch at a time as they're read, with the filter's state carried over from batch
+to batch, so the filtered gaze is the same however the samples are batched (unless the collector goes back to re-read samples, in which
+case it resets the filter).  Missing samples stay missing (NaN), and reset the filter,
+so it doesn't smear the gaze position from before a blink into the samples after it.
+
+Each filter measures what it costs: cost() is the average time taken per sample, in microseconds, and latency() the average delay,
+in ms, that the filter adds to a steady movement of the gaze (for the 1 Euro filter, this is mostly the delay during fixations,
+where it's harmless; during saccades it's much shorter).  Gaze collectors log these as <name>.filter_cost and <name>.filter_latency.
+"""
+import numpy
+from math import pi
+from timing import clock
+
+class GazeFilter:
+    """Abstract class for gaze filters.
+
+    Child classes define smooth, which filters a batch of samples.
+    """
+    def __init__(self):
+        self.samples = 0
+        self.elapsed = 0.0 # seconds
+        self.delay = 0.0 # ms, summed over samples
+
+    def filter(self,times,x,y):
+        """Return numpy arrays (x, y) of the filtered gaze positions for a batch of new samples (numpy arrays times, x and y)
+        """
+        if not len(times): return x,y
+        start = clock()
+        x,y = self.smooth(times,x,y)
+        self.elapsed += clock()-start
+        self.samples += len(times)
+        return x,y
+
+    def smooth(self,times,x,y):
+        """Defined by child classes: return the filtered x and y, and add the delay for each sample to self.delay
+        """
+        return x,y
+
+    def reset(self):
+        """Defined by child classes: forget the samples filtered so far, e.g. before samples that don't follow on from them
+        """
+        pass
+
+    def cost(self):
+        """Return the average time, in microseconds, taken to filter a sample
+        """
+        return self.samples and self.elapsed*1000000.0/self.samples or 0.0
+
+    def latency(self):
+        """Return the average delay, in ms, that the filter adds to a steady movement
+        """
+        return self.samples and self.delay/self.samples or 0.0
+
+class MedianFilter(GazeFilter):
+    """Moving median of the last window samples, computed for a whole batch of samples at once
+    """
+    def __init__(self,window=3):
+        GazeFilter.__init__(self)
+        self.window = window
+        self.previous = None # The last window-1 samples of the previous batch
+
+    def reset(self):
+        self.previous = None
+
+    def smooth(self,times,x,y):
+        window = self.window
+        if window < 2: return x,y
+        if self.previous == None:
+            # Until there are enough samples, the windows are filled out with the first sample
+            self.previous = (numpy.repeat(times[:1],window-1),numpy.repeat(x[:1],window-1),numpy.repeat(y[:1],window-1))
+        previousTimes,previousX,previousY = self.previous
+        allTimes = numpy.concatenate((previousTimes,times))
+        allX = numpy.concatenate((previousX,x))
+        allY = numpy.concatenate((previousY,y))
+        self.previous = (allTimes[-(window-1):],allX[-(window-1):],allY[-(window-1):])
+        # Row i of the windows is samples i to i+window-1 of allX and allY, ending with new sample i
+        rows = numpy.arange(len(times))[:,numpy.newaxis] + numpy.arange(window)
+        windowsX = allX[rows]
+        windowsY = allY[rows]
+        missing = numpy.isnan(windowsX).any(axis=1) | numpy.isnan(windowsY).any(axis=1)
+        windowsX[missing] = windowsY[missing] = 0 # Rather than taking medians of NaNs
+        x = numpy.median(windowsX,axis=1)
+        y = numpy.median(windowsY,axis=1)
+        x[missing] = numpy.nan
+        y[missing] = numpy.nan
+        self.delay += (allTimes[rows[:,-1]]-allTimes[rows[:,0]]).sum()/2.0
+        return x,y
+
+class KalmanFilter(GazeFilter):
+    """Kalman filter for each gaze coordinate, modelling the gaze as a random walk
+    """
+    def __init__(self,process_noise=1.0,measurement_noise=4.0):
+        GazeFilter.__init__(self)
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.state = None # (time, x, y, variance) after the last sample, or None after missing data
+
+    def reset(self):
+        self.state = None
+
+    def smooth(self,times,x,y):
+        q = self.process_noise
+        r = self.measurement_noise
+        outX = numpy.empty(len(times))
+        outY = numpy.empty(len(times))
+        state = self.state
+        delay = 0.0
+        for i in xrange(len(times)):
+            time,sampleX,sampleY = times[i],x[i],y[i]
+            if sampleX != sampleX or sampleY != sampleY: # NaN
+                outX[i] = outY[i] = numpy.nan
+                state = None
+                continue
+            if state == None:
+                state = (time,sampleX,sampleY,r)
+            else:
+                lastTime,estimateX,estimateY,variance = state
+                variance += q*(time-lastTime)
+                gain = variance/(variance+r)
+                estimateX += gain*(sampleX-estimateX)
+                estimateY += gain*(sampleY-estimateY)
+                state = (time,estimateX,estimateY,(1-gain)*variance)
+                delay += (1-gain)/gain*(time-lastTime)
+            outX[i] = state[1]
+            outY[i] = state[2]
+        self.state = state
+        self.delay += delay
+        return outX,outY
+
+class OneEuroFilter(GazeFilter):
+    """1 Euro filter: exponential smoothing of each gaze coordinate with a cutoff frequency that rises with the smoothed gaze velocity
+    """
+    def __init__(self,min_cutoff=5.0,beta=0.05,d_cutoff=1.0):
+        GazeFilter.__init__(self)
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.state = None # (time, x, y, dx, dy) after the last sample, or None after missing data
+
+    def reset(self):
+        self.state = None
+
+    def smooth(self,times,x,y):
+        min_cutoff = self.min_cutoff
+        beta = self.beta
+        d_tau = 1.0/(2*pi*self.d_cutoff)
+        outX = numpy.empty(len(times))
+        outY = numpy.empty(len(times))
+        state = self.state
+        delay = 0.0
+        for i in xrange(len(times)):
+            time,sampleX,sampleY = times[i],x[i],y[i]
+            if sampleX != sampleX or sampleY != sampleY: # NaN
+                outX[i] = outY[i] = numpy.nan
+                state = None
+                continue
+            if state == None or time <= state[0]:
+                state = (time,sampleX,sampleY,0.0,0.0)
+            else:
+                lastTime,estimateX,estimateY,dx,dy = state
+                interval = (time-lastTime)/1000.0 # seconds
+                # Smoothed velocity, in pixels per second
+                alpha = 1.0/(1.0+d_tau/interval)
+                dx += alpha*((sampleX-estimateX)/interval-dx)
+                dy += alpha*((sampleY-estimateY)/interval-dy)
+                tau = 1.0/(2*pi*(min_cutoff+beta*(dx*dx+dy*dy)**0.5))
+                alpha = 1.0/(1.0+tau/interval)
+                estimateX += alpha*(sampleX-estimateX)
+                estimateY += alpha*(sampleY-estimateY)
+                state = (time,estimateX,estimateY,dx,dy)
+                delay += tau*1000.0
+            outX[i] = state[1]
+            outY[i] = state[2]
+        self.state = state
+        self.delay += delay
+        return outX,outY
+
+FILTERS = {'median':MedianFilter,'kalman':KalmanFilter,'oneeuro':OneEuroFilter}
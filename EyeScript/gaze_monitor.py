@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Live gaze heatmap and scanpath for the current trial, for showing on an experimenter's monitor.
+
+Set the experiment parameter gaze_monitor = True to have the EyeLinkDevice feed a GazeMonitor every time it's polled, e.g.
+
+Experiment(gaze_monitor=True,gaze_monitor_options={'cell_size':16,'scanpath_length':256,'shared':True})
+
+The monitor is available as getExperiment().gazeMonitor.  It keeps, for the current trial:
+heatmap: a 2D numpy array of sample counts, one cell per cell_size x cell_size block of screen pixels (indexed [row,column])
+the scanpath: the last scanpath_length fixations, with their position, start time and duration (see scanpath())
+Both are reset at the start of every trial.
+
+Updating costs one numpy histogram of the new samples per poll, and never copies the sample history.  A monitor window can read
+the arrays directly (they're updated in place), and check version() to see whether anything has changed since it last drew them.
+
+With shared = True, the arrays are allocated in shared memory (multiprocessing.RawArray), so that a monitor running in another
+process, and so not taking any time from the response loop, can read them.  Pass the monitor's buffers attribute to the other
+process when starting it, and make a GazeMonitor there with the same options and buffers=buffers, e.g.
+
+def monitorWindow(buffers,options):
+    monitor = GazeMonitor(buffers=buffers,**options)
+    ... draw monitor.heatmap and monitor.scanpath() whenever monitor.version() changes
+multiprocessing.Process(target=monitorWindow,args=(getExperiment().gazeMonitor.buffers,options)).start()
+
+The arrays aren't locked: the version number is odd while an update is in progress, so a reader wanting a consistent picture
+can read the version, copy what it needs, and try again if the version was odd or has changed.
+"""
+from __future__ import with_statement
+import numpy
+from samples import GazeReader
+from linkdata import ENDFIX,RIGHT_EYE
+
+# Positions in the status array
+TRIAL = 0
+SAMPLES = 1
+FIXATIONS = 2
+VERSION = 3
+
+class GazeMonitor:
+    """Heatmap and scanpath of the current trial's gaze data (see above)
+
+    Attributes:
+    heatmap: rows x columns numpy array of sample counts
+    fixations: scanpath_length x 4 numpy array of (x, y, start time, duration) of fixations, used as a ring buffer
+    status: numpy array of the trial number, the numbers of samples and fixations recorded so far in the trial, and the version
+    buffers: the shared memory behind the arrays, if shared = True, otherwise None
+    """
+    def __init__(self,screen_size=(1024,768),cell_size=16,scanpath_length=256,eye=RIGHT_EYE,shared=False,buffers=None):
+        """Arguments:
+        screen_size: (width,height) of the screen in pixels
+        cell_size: size in pixels of the (square) heatmap cells
+        scanpath_length: number of fixations kept
+        eye: the eye to use (0=left, 1=right) when both are recorded; otherwise the recorded eye is used
+        shared: whether to put the arrays in shared memory
+        buffers: the buffers attribute of a shared GazeMonitor in another process, to read its arrays
+        """
+        self.cell_size = cell_size
+        self.columns = (screen_size[0]+cell_size-1)//cell_size
+        self.rows = (screen_size[1]+cell_size-1)//cell_size
+        self.scanpath_length = scanpath_length
+        self.eye = eye
+        if buffers == None and shared:
+            from multiprocessing import RawArray
+            buffers = (RawArray('l',4),RawArray('l',self.rows*self.columns),RawArray('d',scanpath_length*4))
+        self.buffers = buffers
+        if buffers:
+            status,heatmap,fixations = buffers
+            self.status = numpy.frombuffer(status,dtype=numpy.int_)
+            self.heatmap = numpy.frombuffer(heatmap,dtype=numpy.int_).reshape(self.rows,self.columns)
+            self.fixations = numpy.frombuffer(fixations,dtype=float).reshape(scanpath_length,4)
+        else:
+            self.status = numpy.zeros(4,dtype=numpy.int_)
+            self.heatmap = numpy.zeros((self.rows,self.columns),dtype=numpy.int_)
+            self.fixations = numpy.zeros((scanpath_length,4))
+        self.readers = None
+
+    def attach(self,bus):
+        """Start reading the data arriving on a GazeBus (see samples.py)
+        """
+        self.readers = (GazeReader(bus.samples,self.eye,bus.events),GazeReader(bus.samples,1-self.eye))
+        self.eyeUsed = self.eye
+
+    def newTrial(self,trialNumber):
+        """Clear the heatmap and scanpath for a new trial
+        """
+        status = self.status
+        status[VERSION] += 1
+        self.heatmap.fill(0)
+        status[TRIAL] = trialNumber
+        status[SAMPLES] = status[FIXATIONS] = 0
+        if self.readers:
+            for reader in self.readers: reader.skip()
+        status[VERSION] += 1
+
+    def update(self):
+        """Add the samples and fixations that have arrived on the bus since the last update
+        """
+        reader,otherReader = self.readers
+        times,x,y = reader.samples()
+        otherTimes,otherX,otherY = otherReader.samples()
+        events = reader.events()
+        if not len(times) and not events: return
+        status = self.status
+        status[VERSION] += 1
+        if len(times):
+            # Use the other eye's samples where the eye set by the eye parameter wasn't recorded (or is missing)
+            missing = numpy.isnan(x)
+            if missing.any():
+                x = numpy.where(missing,otherX,x)
+                y = numpy.where(missing,otherY,y)
+                if missing.all() and not numpy.isnan(otherX).all(): self.eyeUsed = 1-self.eye
+            else:
+                self.eyeUsed = self.eye
+            with numpy.errstate(invalid='ignore'): # Missing data (NaN) is never on the screen
+                onscreen = (x >= 0) & (y >= 0) & (x < self.columns*self.cell_size) & (y < self.rows*self.cell_size)
+            cells = (y[onscreen]//self.cell_size).astype(int)*self.columns + (x[onscreen]//self.cell_size).astype(int)
+            if len(cells) == 1: self.heatmap.flat[cells[0]] += 1
+            elif len(cells): self.heatmap += numpy.bincount(cells,minlength=self.heatmap.size).reshape(self.heatmap.shape)
+            status[SAMPLES] += len(times)
+        for eventType,event in events:
+            if eventType == ENDFIX and event.getEye() == self.eyeUsed and event.getAverageGaze():
+                gaze = event.getAverageGaze()
+                self.fixations[status[FIXATIONS] % self.scanpath_length] = (gaze[0],gaze[1],event.getStartTime(),
+                                                                            event.getEndTime()-event.getStartTime())
+                status[FIXATIONS] += 1
+        status[VERSION] += 1
+
+    def version(self):
+        """Return the number of changes made to the heatmap and scanpath (odd while a change is being made)
+        """
+        return int(self.status[VERSION])
+
+    def trial(self):
+        return int(self.status[TRIAL])
+
+    def samples(self):
+        """Return the number of samples recorded in the current trial
+        """
+        return int(self.status[SAMPLES])
+
+    def scanpath(self):
+        """Return a numpy array of (x, y, start time, duration) of the current trial's last fixations (up to scanpath_length), oldest first
+        """
+        count = int(self.status[FIXATIONS])
+        if count <= self.scanpath_length: return self.fixations[:count].copy()
+        return numpy.roll(self.fixations,-(count % self.scanpath_length),axis=0)
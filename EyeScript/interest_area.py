@@ -1,4 +1,9 @@
 # -*- coding: utf-8 -*-
+from __future__ import with_statement
+import codecs
+import numpy
+from shapes import Rectangle,Ellipse,Polygon
+
 class InterestArea:
     """
     Represents a region of the screen, for eye data reporting purposes.
@@ -26,19 +31,258 @@ class InterestArea:
         
         Returns a string representation of the interest area coordinates for printing in a .ias file readable by the EyeLink Data Viewer
         """
-        return "%s\t%s\t%s\t%s"%(self.shape.rect.left,self.shape.rect.top,self.shape.rect.right,self.shape.rect.bottom)
+        return self.shape.coordinateString()
     
     def shapeName(self):
         """Used by display class methods that record the display's interest areas.
         
         Return the name of the shape for recording in the interest area file, so that the data viewer can handle the interest area appropriately.
         
-        Currently the data viewer recognizes the shapes RECTANGLE, ELLIPSE and FREEHAND.
+        Currently the data viewer recognizes the shapes RECTANGLE, ELLIPSE and FREEHAND (a Polygon).
         """
-        return self.shape.__class__.__name__.upper()
+        return self.shape.dataViewerName or self.shape.__class__.__name__.upper()
     
     def contains(self,point):
         """
         Return True or False depending on whether this interest area contains the given point (specified as an (x,y) tuple).
         """
         return self.shape.contains(point)
+
+    def containsArray(self,x,y):
+        """
+        Given numpy arrays of x and y coordinates, return a boolean array specifying which of the points this interest area contains.
+        """
+        return self.shape.containsArray(x,y)
+
+class InterestAreaIndex:
+    """
+    Uniform grid over the bounding rectangles of a list of areas, for finding the areas that contain a point without testing every area.
+
+    Each grid cell lists the areas whose bounding rectangle overlaps it, so finding the areas containing a point means testing
+    only the few areas listed in the point's cell.  Where areas overlap, they're returned in the order of the original list,
+    so the result is the same as for a linear search through the list.
+
+    For batches of samples, firstHit tests all the samples against all the bounding rectangles at once with numpy.
+
+    The areas may be InterestArea or Shape objects; anything else in the list (e.g. 'any') is never found.  The index reflects the areas' rectangles when it was built,
+    so it has to be rebuilt if an area is moved or expanded (getAreaIndex does this).
+    """
+    def __init__(self,areas,cell_size=None):
+        """Arguments:
+        areas: list of InterestArea or Shape objects
+        cell_size: (width,height) of the grid cells; defaults to the median width and height of the areas
+        """
+        self.areas = list(areas)
+        rects = [getattr(getattr(area,'shape',area),'rect',None) for area in self.areas]
+        if cell_size == None:
+            widths = sorted([rect.width for rect in rects if rect is not None]) or [1]
+            heights = sorted([rect.height for rect in rects if rect is not None]) or [1]
+            cell_size = (widths[len(widths)/2],heights[len(heights)/2])
+        self.cellWidth = max(1,int(cell_size[0]))
+        self.cellHeight = max(1,int(cell_size[1]))
+        cells = {}
+        for position,rect in enumerate(rects):
+            if rect is None: continue
+            for column in range(rect.left//self.cellWidth,rect.right//self.cellWidth+1):
+                for row in range(rect.top//self.cellHeight,rect.bottom//self.cellHeight+1):
+                    cells.setdefault((column,row),[]).append(position)
+        self.cells = dict([(cell,tuple(positions)) for cell,positions in cells.iteritems()])
+        # Bounding rectangles as arrays for firstHit; areas without a rectangle get an empty one at infinity
+        bounds = numpy.array([rect is not None and (rect.left,rect.top,rect.right,rect.bottom) or (numpy.inf,)*4
+                              for rect in rects],dtype=float).reshape(-1,4)
+        self.lefts,self.tops,self.rights,self.bottoms = bounds.T
+
+    def positions(self,point):
+        """Return the positions, in the original list, of all the areas containing the point (an (x,y) tuple), in increasing order
+        """
+        areas = self.areas
+        return [position for position in self.cells.get((int(point[0])//self.cellWidth,int(point[1])//self.cellHeight),())
+                if areas[position].contains(point)]
+
+    def find(self,point):
+        """Return the first area (in the original list) containing the point, or None if there is none
+        """
+        areas = self.areas
+        for position in self.cells.get((int(point[0])//self.cellWidth,int(point[1])//self.cellHeight),()):
+            if areas[position].contains(point): return areas[position]
+        return None
+
+    def firstHit(self,x,y):
+        """Given numpy arrays of x and y coordinates, return (i,area) for the first point i contained in any area, or (None,None).
+
+        If several areas contain that point, area is the first of them in the original list.
+        """
+        if not len(x) or not len(self.areas): return None,None
+        x = x[:,numpy.newaxis]
+        y = y[:,numpy.newaxis]
+        with numpy.errstate(invalid='ignore'): # NaNs (missing data) compare False without a warning
+            inside = (x >= self.lefts) & (x <= self.rights) & (y >= self.tops) & (y <= self.bottoms)
+        for row in numpy.flatnonzero(inside.any(axis=1)):
+            point = (x[row,0],y[row,0])
+            for position in numpy.flatnonzero(inside[row]):
+                if self.areas[position].contains(point): return row,self.areas[position]
+        return None,None
+
+_areaIndexes = {}
+def _rectKey(area):
+    """Return the (left,top,width,height) of the area's bounding rectangle, or None if it has none
+    """
+    rect = getattr(getattr(area,'shape',area),'rect',None)
+    return rect is not None and (rect.left,rect.top,rect.width,rect.height) or None
+
+def getAreaIndex(areas):
+    """Return an InterestAreaIndex for the list of areas.
+
+    Indexes are cached, so that an index built for a display's interest areas when the display was created
+    is reused by the response collectors monitoring those areas.  The cache is keyed on the areas' bounding rectangles as well,
+    so an area that has been moved or resized since (e.g. with expand) gets a new index.
+    """
+    # The cached index holds on to the areas, so their ids can't be reused
+    key = tuple([(id(area),_rectKey(area)) for area in areas])
+    try:
+        return _areaIndexes[key]
+    except KeyError:
+        if len(_areaIndexes) >= 100: _areaIndexes.clear()
+        index = _areaIndexes[key] = InterestAreaIndex(areas)
+        return index
+
+# Kinds of areas in an InterestAreaSet
+RECTANGLE = 0
+ELLIPSE = 1
+OTHER = 2
+
+def shapeKind(shape):
+    """Return the kind of the shape for an InterestAreaSet: RECTANGLE, ELLIPSE, or OTHER for shapes tested with their own containsArray
+    """
+    if isinstance(shape,Ellipse): return ELLIPSE
+    elif isinstance(shape,Rectangle): return RECTANGLE
+    else: return OTHER
+
+class InterestAreaSet:
+    """
+    A list of interest areas stored as numpy arrays, for finding which area contains each of a large number of points (e.g. all the samples
+    of a recording, in an offline or replay analysis) in one vectorized operation.
+
+    Rectangles and ellipses are tested together, as arrays of their boundaries, centers and radii; any other shapes (e.g. Polygons)
+    are tested with their own containsArray.  Where areas overlap, a point is assigned to the first of them in the list,
+    as with InterestAreaIndex.  The set reflects the areas as they were when it was built.
+
+    Build one from a display's interest areas with InterestAreaSet(display['interest_areas']), or from a .ias file with readInterestAreaFile.
+
+    Attributes:
+    areas -- the list of InterestArea objects
+    """
+    def __init__(self,areas):
+        """Argument: list of InterestArea or Shape objects (Shapes are wrapped in InterestAreas with no label)
+        """
+        self.areas = [hasattr(area,'shape') and area or InterestArea(area) for area in areas]
+        shapes = [area.shape for area in self.areas]
+        self.kinds = numpy.array([shapeKind(shape) for shape in shapes],dtype=int)
+        self.lefts,self.tops,self.rights,self.bottoms = numpy.array([(shape.rect.left,shape.rect.top,shape.rect.right,shape.rect.bottom)
+                                                                     for shape in shapes],dtype=float).reshape(-1,4).T
+        self.ellipses = numpy.flatnonzero(self.kinds == ELLIPSE)
+        # The ellipses' centers and radii (computed as in Ellipse.contains)
+        self.centerX,self.centerY,self.radiusX,self.radiusY = numpy.array([(shapes[i].rect.centerx,shapes[i].rect.centery,
+                                                                            shapes[i].rect.width/2,shapes[i].rect.height/2)
+                                                                           for i in self.ellipses],dtype=float).reshape(-1,4).T
+        self.others = numpy.flatnonzero(self.kinds == OTHER)
+
+    def __len__(self):
+        return len(self.areas)
+
+    def containsArray(self,x,y):
+        """Given numpy arrays of N x and y coordinates, return an N x (number of areas) boolean array specifying which areas contain each point
+        """
+        x = numpy.asarray(x,dtype=float)[:,numpy.newaxis]
+        y = numpy.asarray(y,dtype=float)[:,numpy.newaxis]
+        with numpy.errstate(invalid='ignore'): # NaNs (missing data) compare False without a warning
+            inside = (x >= self.lefts) & (x < self.rights) & (y >= self.tops) & (y < self.bottoms)
+            if len(self.ellipses):
+                inside[:,self.ellipses] = ((x-self.centerX)/self.radiusX)**2 + ((y-self.centerY)/self.radiusY)**2 <= 1
+        for position in self.others:
+            inside[:,position] = self.areas[position].containsArray(x[:,0],y[:,0])
+        return inside
+
+    def positions(self,x,y):
+        """Given numpy arrays of x and y coordinates, return an integer array of the position in areas of the area containing each point, or -1 for points in no area.
+
+        The points are sorted by x once; each area then tests only the points within its horizontal extent, found by binary search,
+        so the time taken grows with the number of points times the average fraction of the screen's width an area covers.
+        """
+        x = numpy.asarray(x,dtype=float)
+        y = numpy.asarray(y,dtype=float)
+        result = numpy.empty(len(x),dtype=int)
+        result.fill(-1)
+        if not len(x) or not len(self.areas): return result
+        order = numpy.argsort(x,kind='mergesort') # Missing data (NaN) is sorted to the end, outside every area's extent
+        sortedX = x[order]
+        sortedY = y[order]
+        positions = numpy.empty(len(x),dtype=int)
+        positions.fill(-1)
+        ellipses = dict(zip(self.ellipses,zip(self.centerX,self.centerY,self.radiusX,self.radiusY)))
+        # Go through the areas from last to first, so that points in overlapping areas end up assigned to the first of them
+        with numpy.errstate(invalid='ignore',divide='ignore'):
+            for position in xrange(len(self.areas)-1,-1,-1):
+                kind = self.kinds[position]
+                if kind == RECTANGLE:
+                    start,end = sortedX.searchsorted([self.lefts[position],self.rights[position]],'left')
+                    pointsY = sortedY[start:end]
+                    inside = (pointsY >= self.tops[position]) & (pointsY < self.bottoms[position])
+                elif kind == ELLIPSE:
+                    centerX,centerY,radiusX,radiusY = ellipses[position]
+                    start = sortedX.searchsorted(centerX-radiusX,'left')
+                    end = sortedX.searchsorted(centerX+radiusX,'right')
+                    inside = ((sortedX[start:end]-centerX)/radiusX)**2 + ((sortedY[start:end]-centerY)/radiusY)**2 <= 1
+                else:
+                    start = sortedX.searchsorted(self.lefts[position],'left')
+                    end = sortedX.searchsorted(self.rights[position],'right')
+                    inside = self.areas[position].containsArray(sortedX[start:end],sortedY[start:end])
+                positions[start:end][inside] = position
+        result[order] = positions
+        return result
+
+    def labels(self,x,y,none=None):
+        """Given numpy arrays of x and y coordinates, return a list of the labels of the areas containing the points (none for points in no area)
+        """
+        labels = [area.label or str(area.shape) for area in self.areas]
+        return [position >= 0 and labels[position] or none for position in self.positions(x,y)]
+
+    def write(self,filename):
+        """Write the areas to a .ias file readable by the EyeLink Data Viewer
+        """
+        iaFile = codecs.open(filename,'w','utf8')
+        for i,ia in enumerate(self.areas):
+            iaFile.write("%s\t%s\t%s\t%s\n"%(ia.shapeName(),i+1,ia.coordinateString(),ia.label))
+        iaFile.close()
+
+def readInterestAreaFile(filename):
+    """Read a .ias file (as written by Display.write_interest_area_file or the Data Viewer) and return its areas as an InterestAreaSet.
+
+    RECTANGLE, ELLIPSE and FREEHAND areas are read; the start and end times of dynamic interest areas, if present, are ignored.
+    """
+    areas = []
+    iaFile = codecs.open(filename,'r','utf8')
+    for line in iaFile:
+        fields = line.rstrip(u"\r\n").split(u"\t")
+        names = [field.strip().upper() for field in fields]
+        for start,name in enumerate(names):
+            if name in ["RECTANGLE","ELLIPSE","FREEHAND"]: break
+        else:
+            continue # Blank line or comment
+        fields = fields[start+2:] # Skip the times, the shape name and the area number
+        if name == "FREEHAND":
+            vertices = []
+            while fields and fields[0].count(u",") == 1:
+                try:
+                    vertices.append(tuple([float(coordinate) for coordinate in fields[0].split(u",")]))
+                except ValueError:
+                    break
+                fields = fields[1:]
+            shape = Polygon(vertices)
+        else:
+            left,top,right,bottom = [int(float(coordinate)) for coordinate in fields[:4]]
+            fields = fields[4:]
+            shape = (name == "ELLIPSE" and Ellipse or Rectangle)((left,top,right-left,bottom-top))
+        areas.append(InterestArea(shape,label=u"\t".join(fields)))
+    iaFile.close()
+    return InterestAreaSet(areas)
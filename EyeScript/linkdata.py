@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Pure-Python stand-ins for the sample and event objects that pylink returns from getNewestSample and getFloatData.
+
+These are used by the tracker simulator and the replay tracker (and by EyeScript's own online event detection),
+so that response collectors can treat their data exactly like data from an EyeLink.
+
+The event-type constants are taken from pylink where it defines them, falling back on the EyeLink API values (e.g. for the pylink stub).
+"""
+import pylink
+
+STARTBLINK = getattr(pylink,'STARTBLINK',3)
+ENDBLINK = getattr(pylink,'ENDBLINK',4)
+STARTSACC = getattr(pylink,'STARTSACC',5)
+ENDSACC = getattr(pylink,'ENDSACC',6)
+STARTFIX = getattr(pylink,'STARTFIX',7)
+ENDFIX = getattr(pylink,'ENDFIX',8)
+FIXUPDATE = getattr(pylink,'FIXUPDATE',9)
+SAMPLE_TYPE = getattr(pylink,'SAMPLE_TYPE',200)
+MISSING_DATA = getattr(pylink,'MISSING_DATA',-32768)
+
+LEFT_EYE = 0
+RIGHT_EYE = 1
+BINOCULAR = 2
+
+class EyeData(object):
+    """Gaze position and pupil size of one eye in a Sample (like pylink's SampleData)
+    """
+    __slots__ = ('gaze','pupil')
+    def __init__(self,gaze,pupil):
+        self.gaze = gaze
+        self.pupil = pupil
+    def getGaze(self):
+        return self.gaze
+    def getPupilSize(self):
+        return self.pupil
+
+class Sample(object):
+    """One sample of gaze data (like pylink's Sample); left and right are EyeData objects, or None for an eye that wasn't recorded
+    """
+    __slots__ = ('time','left','right')
+    def __init__(self,time,left=None,right=None):
+        self.time = time
+        self.left = left
+        self.right = right
+    def getType(self):
+        return SAMPLE_TYPE
+    def getTime(self):
+        return self.time
+    def isLeftSample(self):
+        return self.left != None
+    def isRightSample(self):
+        return self.right != None
+    def isBinocular(self):
+        return self.left != None and self.right != None
+    def getLeftEye(self):
+        return self.left
+    def getRightEye(self):
+        return self.right
+
+class GazeEvent(object):
+    """A fixation, saccade or blink event (like the objects pylink's getFloatData returns for link events)
+
+    For start events, endTime, endGaze and averageGaze are not yet known and are None.
+    """
+    __slots__ = ('type','eye','startTime','endTime','startGaze','endGaze','averageGaze')
+    def __init__(self,type,eye,startTime,endTime=None,startGaze=None,endGaze=None,averageGaze=None):
+        self.type = type
+        self.eye = eye
+        self.startTime = startTime
+        self.endTime = endTime
+        self.startGaze = startGaze
+        self.endGaze = endGaze
+        self.averageGaze = averageGaze
+    def getType(self):
+        return self.type
+    def getEye(self):
+        return self.eye
+    def getTime(self):
+        if self.endTime == None: return self.startTime
+        return self.endTime
+    def getStartTime(self):
+        return self.startTime
+    def getEndTime(self):
+        return self.endTime
+    def getStartGaze(self):
+        return self.startGaze
+    def getEndGaze(self):
+        return self.endGaze
+    def getAverageGaze(self):
+        return self.averageGaze
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Reading measures for the interest areas of a display, accumulated online as the fixations come in.
+
+The standard reading measures are usually reconstructed after the experiment from the EDF files.  A ReadingMeasures object
+computes them during the trial instead: each fixation is assigned to the interest area containing its average gaze position,
+and the measures of that area are updated in constant time, so they're always up to date and an adaptive design can branch on
+them as soon as the display is over (or even while it's running).
+
+Set the display parameter reading_measures=True to have a Display (typically a TextDisplay with interest_areas=True) run a
+ReadingMonitor (see response_collectors.py) with its interest areas, and log the measures when the display ends.
+Each measure is logged as <name>.IA_<n>.<measure>, where name is the display's name and n is the interest area's number
+(counting from 1, as in the .ias file), with NA_string for measures that don't apply (e.g. the gaze duration of a skipped word).
+
+The interest areas are taken to be in reading order, as the ones TextDisplay calculates are, so that a fixation on an earlier
+area is a regression.  Fixation durations are end time minus start time, as reported by the fixation source
+(the EyeLink's ENDFIX events, or online detection, see the fixation_source parameter).
+
+The measures are:
+first_fixation_duration:  duration of the first fixation in the area, if it was fixated during first pass (i.e. before any later area)
+gaze_duration:  sum of the first-pass fixations in the area, up to the first fixation outside it
+go_past_duration:  sum of the fixations from the first first-pass fixation in the area until the first fixation on a later area,
+                   including those on earlier areas after regressions (also called regression-path duration)
+total_time:  sum of all the fixations in the area
+fixation_count:  number of fixations in the area
+regression_in:  number of regressions into the area, i.e. fixations in it immediately following a fixation on a later area
+regression_out:  1 if the area's first pass ended with a regression to an earlier area, 0 if it ended otherwise
+skipped:  1 if the area wasn't fixated during first pass but a later area was, 0 if it was fixated during first pass
+"""
+from interest_area import getAreaIndex
+
+MEASURES = ['first_fixation_duration','gaze_duration','go_past_duration','total_time','fixation_count',
+            'regression_in','regression_out','skipped']
+
+class ReadingMeasures:
+    """Accumulates the reading measures (see above) for a list of interest areas, one fixation at a time.
+
+    Attributes:
+    areas: the interest areas (or Shape objects), in reading order
+    fixations: number of fixations added, including those outside all the areas
+    current: position in areas of the area the last fixation was in, or None if it was outside all the areas
+    furthest: position of the furthest area fixated so far, or None before the first fixation in an area
+    """
+    def __init__(self,areas):
+        self.areas = list(areas)
+        self.index = getAreaIndex(self.areas)
+        n = len(self.areas)
+        self.firstFixation = [None]*n
+        self.gazeDuration = [None]*n
+        self.goPast = [None]*n
+        self.totalTime = [0]*n
+        self.fixationCount = [0]*n
+        self.regressionIn = [0]*n
+        self.regressionOut = [None]*n
+        self.fixations = 0
+        self.current = None
+        self.furthest = None
+        self.firstPass = None # Area whose first pass is under way
+        self.goingPast = None # Area whose go-past period is under way
+
+    def addFixation(self,start,end,gaze):
+        """Add a fixation from time start to time end with average gaze position gaze (an (x,y) tuple, or None if unknown).
+
+        Returns the position of the area the fixation was in, or None if it wasn't in any of them.
+        """
+        self.fixations += 1
+        duration = end-start
+        positions = gaze and self.index.positions(gaze)
+        if not positions:
+            # A fixation outside all the areas ends the current first pass, but doesn't count towards any measure
+            if self.firstPass != None and self.regressionOut[self.firstPass] == None: self.regressionOut[self.firstPass] = 0
+            self.firstPass = self.current = None
+            return None
+        area = positions[0]
+        previous = self.current
+        self.current = area
+        self.totalTime[area] += duration
+        self.fixationCount[area] += 1
+        if previous != None and area < previous: self.regressionIn[area] += 1
+
+        if self.goingPast != None:
+            if area <= self.goingPast: self.goPast[self.goingPast] += duration
+            else: self.goingPast = None
+
+        if self.furthest == None or area > self.furthest:
+            # First-pass fixation on a new area
+            self.endFirstPass(area)
+            self.furthest = area
+            self.firstPass = self.goingPast = area
+            self.firstFixation[area] = self.gazeDuration[area] = self.goPast[area] = duration
+        elif area == self.firstPass:
+            self.gazeDuration[area] += duration
+        else:
+            self.endFirstPass(area)
+            self.firstPass = None
+        return area
+
+    def endFirstPass(self,area):
+        """End the first pass in the current first-pass area, if there is one, with a fixation in the given area
+        """
+        if self.firstPass != None and self.regressionOut[self.firstPass] == None:
+            self.regressionOut[self.firstPass] = int(area < self.firstPass)
+
+    def measure(self,measure,position):
+        """Return the value of the measure (one of the names in MEASURES) for the area at the given position in areas,
+        or None if it doesn't apply.
+        """
+        if measure == 'first_fixation_duration': return self.firstFixation[position]
+        if measure == 'gaze_duration': return self.gazeDuration[position]
+        if measure == 'go_past_duration': return self.goPast[position]
+        if measure == 'total_time': return self.totalTime[position]
+        if measure == 'fixation_count': return self.fixationCount[position]
+        if measure == 'regression_in': return self.regressionIn[position]
+        if measure == 'regression_out': return self.regressionOut[position]
+        if measure == 'skipped':
+            if self.firstFixation[position] != None: return 0
+            if self.furthest != None and self.furthest > position: return 1
+            return None
+        raise KeyError(measure)
+
+    def attributes(self,name,NA='.'):
+        """Return a dictionary of all the measures for all the areas, with keys of the form <name>.IA_<n>.<measure>, for logging
+        """
+        attributes = {}
+        for position in range(len(self.areas)):
+            for measure in MEASURES:
+                value = self.measure(measure,position)
+                if value == None: value = NA
+                attributes["%s.IA_%d.%s"%(name,position+1,measure)] = value
+        return attributes
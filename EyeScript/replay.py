@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""Replays recorded eyetracking data through EyeScript, for regression-testing and profiling gaze-contingent trials.
+
+Set the experiment parameter eyetracker = 'replay' and give the file in the replay_options parameter, e.g.
+
+Experiment(eyetracker='replay',replay_options={'filename':'s1.asc','speed':None})
+
+The file can be an EDF converted to ASCII with edf2asc (samples and events), or a compact binary sample file written by
+writeBinary (see below).  Each recording block in the file (from START to END in an ASC file) is replayed by one call to
+startRecording, i.e. one trial, with the timestamps shifted so that the block starts at the current time.  Samples, and the
+fixation, saccade and blink events from the file, then reach the experiment through getNewestSample and getNextData
+just like live link data, so EyeLinkDevice.poll and the gaze response collectors run exactly as they do during a real
+experiment.  Events become available parser_delay ms after the time they describe, as they would from the EyeLink's parser.
+
+With speed = 1.0 the data are replayed in real time; with speed = 4.0 four times as fast (the timestamps are not scaled,
+so durations measured within the gaze data are the same as in the recording); with speed = None the replay moves on by one sample
+(and the events preceding it) every time the experiment asks the tracker for data, so trials run as fast as the experiment can
+process them.
+
+At the end of each block the replay statistics are logged with the trial's data:
+replay.samples:  number of samples replayed
+replay.cost_per_sample:  wall-clock time taken to get through the block, divided by the number of samples, in microseconds
+                         (with speed = None, this is the experiment's processing cost per sample)
+replay.lag_mean, replay.lag_max:  time, in ms, between samples becoming available and being read by the experiment
+
+A trial is skipped (TrialAbort with SKIP_TRIAL) when its block runs out of data, and the experiment is ended (ABORT_EXPT)
+when a trial starts after the last block has been replayed.
+"""
+import pylink, struct
+from simulator import SimulatedTracker,EVENT_CATEGORIES,TRIAL_ERROR
+from experiment import getLog,Error
+from timing import Histogram,clock
+from linkdata import *
+
+MAGIC = "EyeScript replay 1\n"
+RECORD = struct.Struct("<BBddff")
+"""Binary record: type, eye, time, end time, x, y.  Type 0 marks the start of a recording block, with the recorded eyes in the eye field."""
+
+START_TYPES = {'SFIX':STARTFIX,'SSACC':STARTSACC,'SBLINK':STARTBLINK}
+END_TYPES = {'EFIX':ENDFIX,'ESACC':ENDSACC,'EBLINK':ENDBLINK}
+EYES = {'L':LEFT_EYE,'R':RIGHT_EYE}
+
+def _number(field):
+    """Convert an ASC data field to a number, with '.' (missing data) converted to MISSING_DATA
+    """
+    if field == '.': return MISSING_DATA
+    value = float(field)
+    if value == int(value): return int(value)
+    return value
+
+def readAsc(filename):
+    """Read the recording blocks of an ASC file.
+
+    Returns a list of (eye, records) pairs, where eye is LEFT_EYE, RIGHT_EYE or BINOCULAR and records is a list
+    of [type, eye, time, end time, x, y] lists in file order.  Samples have one record per eye.
+    For end events, x and y are the average (fixations) or end (saccades) position; for start events
+    they're taken from the next sample.
+    """
+    blocks = []
+    records = None
+    for line in open(filename):
+        fields = line.split()
+        if not fields: continue
+        first = fields[0]
+        if first[0].isdigit():
+            if records == None: continue
+            time = _number(first)
+            for i,eye in enumerate(eyes):
+                x,y = _number(fields[1+3*i]),_number(fields[2+3*i])
+                records.append([SAMPLE_TYPE,eye,time,0,x,y])
+                if x != MISSING_DATA:
+                    for record in waiting[eye]: record[4:6] = [x,y]
+                    waiting[eye] = []
+        elif first == 'START':
+            eyes = [eye for word,eye in [('LEFT',LEFT_EYE),('RIGHT',RIGHT_EYE)] if word in fields]
+            records = []
+            waiting = {LEFT_EYE:[],RIGHT_EYE:[]}
+            if len(eyes) == 2: blocks.append((BINOCULAR,records))
+            else: blocks.append((eyes[0],records))
+        elif first == 'END':
+            records = None
+        elif records == None:
+            continue
+        elif first in START_TYPES:
+            record = [START_TYPES[first],EYES[fields[1]],_number(fields[2]),0,MISSING_DATA,MISSING_DATA]
+            waiting[record[1]].append(record)
+            records.append(record)
+        elif first in END_TYPES:
+            type = END_TYPES[first]
+            if type == ENDFIX: x,y = fields[5:7]
+            elif type == ENDSACC: x,y = fields[7:9]
+            else: x = y = '.'
+            records.append([type,EYES[fields[1]],_number(fields[2]),_number(fields[3]),_number(x),_number(y)])
+    return blocks
+
+def readBinary(filename):
+    """Read the recording blocks of a binary sample file written by writeBinary; returns a list like readAsc's
+    """
+    datafile = open(filename,'rb')
+    if datafile.read(len(MAGIC)) != MAGIC: raise Error("%s is not an EyeScript replay file"%filename)
+    data = datafile.read()
+    datafile.close()
+    blocks = []
+    for offset in xrange(0,len(data)-RECORD.size+1,RECORD.size):
+        record = RECORD.unpack_from(data,offset)
+        if record[0] == 0:
+            records = []
+            blocks.append((record[1],records))
+        else:
+            type,eye,time,endTime,x,y = record
+            if time == int(time): time = int(time)
+            if endTime == int(endTime): endTime = int(endTime)
+            records.append([type,eye,time,endTime,x,y])
+    return blocks
+
+def writeBinary(blocks,filename):
+    """Write recording blocks (as returned by readAsc) to a binary sample file
+
+    E.g. writeBinary(readAsc("s1.asc"),"s1.esr")
+    """
+    datafile = open(filename,'wb')
+    datafile.write(MAGIC)
+    for eye,records in blocks:
+        datafile.write(RECORD.pack(0,eye,0,0,0,0))
+        for record in records: datafile.write(RECORD.pack(*record))
+    datafile.close()
+
+def readSamples(filename):
+    """Read an ASC file or binary sample file, depending on the file's extension (.asc for ASC files)
+    """
+    if filename.lower().endswith(".asc"): return readAsc(filename)
+    return readBinary(filename)
+
+class ReplayTracker(SimulatedTracker):
+    """Stands in for pylink.EyeLink, replaying the samples and events of a recorded data file.
+
+    Attributes:
+    reports: list of dictionaries with the replay statistics of each block replayed so far (see above)
+    """
+    def __init__(self,filename,speed=1.0,latency=2,parser_delay=20,queue_size=4096,screen_size=(1024,768)):
+        """Arguments:
+        filename: ASC or binary sample file to replay
+        speed: replay speed relative to real time, or None to step through the data as fast as the experiment reads it
+        latency: ms between a sample's timestamp and its availability over the link (at speed 1.0)
+        parser_delay: ms after the data it describes that an event becomes available (on top of the link latency)
+        queue_size: number of samples and events the link queue holds before the oldest are dropped
+        """
+        SimulatedTracker.__init__(self,latency=latency,parser_delay=parser_delay,queue_size=queue_size,screen_size=screen_size)
+        self.speed = speed
+        self.blocks = []
+        for eye,records in readSamples(filename):
+            # Put each block's records in the order they become available over the link, so replay is a single pass.
+            # Events describing the end of something are available once it ends.
+            records.sort(key=lambda record: (record[3] or record[2]) + (record[0] != SAMPLE_TYPE and parser_delay))
+            self.blocks.append((eye,records))
+        self.blockIndex = 0
+        self.records = None
+        self.reports = []
+
+    def startRecording(self,*args):
+        """Start replaying the next block of data
+        """
+        self.resetData()
+        self.recording = True
+        if self.blockIndex >= len(self.blocks):
+            self.records = None
+            return 0
+        self.eye,self.records = self.blocks[self.blockIndex]
+        self.blockIndex += 1
+        self.position = 0
+        self.wallStart = pylink.currentTime()
+        self.fileStart = self.records and self.records[0][2] or 0
+        self.shift = self.wallStart - self.fileStart
+        self.startGaze = {}
+        self.samples = 0
+        self.lag = Histogram()
+        self.clockStart = clock()
+        self.reported = False
+        return 0
+
+    def stopRecording(self,*args):
+        if self.recording and self.records != None: self._report()
+        self.recording = False
+
+    def isRecording(self):
+        if not self.recording: return TRIAL_ERROR
+        if self.records == None: return pylink.ABORT_EXPT
+        if self.position >= len(self.records) and not self.queue:
+            self._report()
+            return pylink.SKIP_TRIAL
+        return pylink.TRIAL_OK
+
+    def getNextData(self):
+        type = SimulatedTracker.getNextData(self)
+        if type == SAMPLE_TYPE: self._read(self.data)
+        return type
+
+    def getNewestSample(self):
+        sample = SimulatedTracker.getNewestSample(self)
+        if sample: self._read(sample)
+        return sample
+
+    def _read(self,sample):
+        """Record how long after becoming available a sample was read
+        """
+        if self.speed:
+            available = self.wallStart + (sample.time-self.shift-self.fileStart)/self.speed + self.latency
+            self.lag.add(max(0,pylink.currentTime()-available)*1000.0)
+
+    def _report(self):
+        """Log the statistics for the block being replayed
+        """
+        if self.reported: return
+        self.reported = True
+        elapsed = clock()-self.clockStart
+        report = {'replay.samples':self.samples,
+                  'replay.cost_per_sample':"%.1f"%(self.samples and elapsed*1000000.0/self.samples or 0.0),
+                  'replay.lag_mean':"%.3f"%(self.lag.mean()/1000.0),
+                  'replay.lag_max':"%.3f"%(self.lag.max/1000.0)
+                  }
+        self.reports.append(report)
+        getLog().logAttributes(report)
+
+    def _advance(self):
+        """Make available all the records whose time has come
+        """
+        if not self.recording or not self.records: return
+        records = self.records
+        if self.speed: horizon = self.fileStart + (pylink.currentTime()-self.wallStart-self.latency)*self.speed
+        else: horizon = float('inf')
+        position = self.position
+        end = len(records)
+        shift = self.shift
+        parser_delay = self.parser_delay
+        while position < end:
+            record = records[position]
+            type,eye,time,endTime,x,y = record
+            if type == SAMPLE_TYPE:
+                if time > horizon: break
+                position += 1
+                data = EyeData((x,y),x == MISSING_DATA and 0 or 1000.0)
+                if eye == LEFT_EYE:
+                    sample = Sample(time+shift,data,None)
+                    # The right eye's record of a binocular sample follows the left eye's
+                    if position < end and records[position][0] == SAMPLE_TYPE and records[position][2] == time:
+                        other = records[position]
+                        sample.right = EyeData((other[4],other[5]),other[4] == MISSING_DATA and 0 or 1000.0)
+                        position += 1
+                else:
+                    sample = Sample(time+shift,None,data)
+                self.samples += 1
+                if self.linkSamples: self.queue.append((SAMPLE_TYPE,sample))
+                self.newest = sample
+                self.newestIsNew = True
+                if not self.speed: break
+            else:
+                if (endTime or time) + parser_delay > horizon: break
+                position += 1
+                if EVENT_CATEGORIES[type] not in self.linkEvents or ('LEFT','RIGHT')[eye] not in self.linkEvents: continue
+                if type in (STARTFIX,STARTSACC,STARTBLINK):
+                    gaze = x != MISSING_DATA and (x,y) or None
+                    self.startGaze[eye] = gaze
+                    event = GazeEvent(type,eye,time+shift,startGaze=gaze)
+                else:
+                    gaze = x != MISSING_DATA and (x,y) or None
+                    if type == ENDFIX: event = GazeEvent(type,eye,time+shift,endTime+shift,self.startGaze.get(eye),gaze,gaze)
+                    else: event = GazeEvent(type,eye,time+shift,endTime+shift,self.startGaze.get(eye),gaze)
+                self.queue.append((type,event))
+        self.position = position
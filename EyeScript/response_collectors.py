@@ -35,10 +35,17 @@
 """
 import pygame
 import pylink
-from experiment import getExperiment,getTracker,getLog,setUpDevice,getDevice
+from experiment import getExperiment,getTracker,getLog,setUpDevice,getDevice,Error
 from trials import TrialAbort
 from UserDict import DictMixin
 import devices
+import numpy
+from interest_area import getAreaIndex
+from shapes import Rectangle
+from samples import sampleTime
+from reading_measures import ReadingMeasures
+from filters import FILTERS
+from detection import VALID,LOST
 from constants import *
 try:
     import pythoncom
@@ -50,6 +57,7 @@ except ImportError:
 class ResponseCollector(DictMixin):
     """Abstract class for collecting responses from the subject, from which modality-specific response collector classes will inherit
     """
+    autoRespond = True # Whether to make up responses when the experiment is running headless
 
     def __init__(self,logging = None,**params):
         """Set parameters for the ResponseCollector, and initialize the input device if it hasn't already been initialized.
@@ -81,6 +89,7 @@ class ResponseCollector(DictMixin):
         else:
             self.logging = logging
         self['rt'] = self['resp'] = self['acc'] = None
+        self.running = False
         defaultDeviceName = self.__class__.__name__+"Device"
         if hasattr(devices,defaultDeviceName): setUpDevice(getattr(devices,defaultDeviceName))        
         
@@ -104,6 +113,9 @@ class ResponseCollector(DictMixin):
         if self['duration'] not in ['infinite','stimulus'] and pylink.currentTime() >= self['onset_time'] + self['duration']: # timed out
             self.stop()
             return True
+        if self.autoRespond and self['headless'] and pylink.currentTime() >= self['onset_time'] + self['headless_response_delay']:
+            self.fakeResponse(self['headless_response_delay'])
+            return True
         if pylink.currentTime() >= self['min_rt'] + self['onset_time'] and True in [self.handleEvent(event) for event in events]:
             if self.params.get('cresp',False) != False: #There is a correct response, so log accuracy
                 self.params['acc'] = int(self.params['resp']==self.params['cresp'])
@@ -111,6 +123,19 @@ class ResponseCollector(DictMixin):
             return True
         else: return False
     
+    def fakeResponse(self,rt):
+        """Register a made-up response, rt milliseconds after onset, when running headless (see Experiment).
+
+        The response is the correct response if there is one, otherwise the first of the possible responses.
+        """
+        if self.params.get('cresp',False) not in [False,None]: self['resp'] = self['cresp']
+        else: self['resp'] = self['possible_resp'] and self['possible_resp'][0]
+        self['rt'] = rt
+        self['rt_time'] = self['onset_time'] + rt
+        if self.params.get('cresp',False) != False: self.params['acc'] = int(self.params['resp']==self.params['cresp'])
+        else: self.params['acc'] = None
+        self.stop()
+
     def handleEvent(self,event):
         """Defined by child classes to specify how to read input from the device and how to record the data from a response.
         
@@ -208,12 +233,17 @@ class MouseWidgetClick(ResponseCollector):
     def __init__(self,**params):
         ResponseCollector.__init__(self,**params)
         setUpDevice(devices.MouseDevice)
+    def start(self):
+        ResponseCollector.start(self)
+        self.areaIndex = None
     def handleEvent(self,event):
         if event.type == MOUSEBUTTONDOWN:
+            if not self.areaIndex: self.areaIndex = getAreaIndex([shape for button,shape in self['possible_resp']])
 #            print "event.pos %s,%s"%(event.pos)
 #            print "MOUSEBUTTONNAMES[event.button] %s"%(MOUSEBUTTONNAMES[event.button])
-            for button,shape in self['possible_resp']:
-                if MOUSEBUTTONNAMES[event.button] == button and shape.contains(event.pos):
+            for position in self.areaIndex.positions(event.pos):
+                button,shape = self['possible_resp'][position]
+                if MOUSEBUTTONNAMES[event.button] == button:
                     self['resp'] = (button,shape)
                     self['rt_time'] = event.time
                     self['rt'] = self['rt_time'] - self['onset_time']
@@ -247,6 +277,7 @@ class GazeResponseCollector(ResponseCollector):
     or as soon as a sample is detected in an interest area (GazeSample).
     New subclasses could be written to handle other cases.
     """
+    autoRespond = False # Gaze collectors fake their own responses if there's no eyetracker, and respond to simulated gaze data otherwise
     def __init__(self,**params):
         ResponseCollector.__init__(self,**params)
         setUpDevice(devices.EyeLinkDevice)
@@ -256,6 +287,10 @@ class GazeResponseCollector(ResponseCollector):
         Check if the eyetracker is recording
         Check the eye being recorded from
         Initialize the fixatedArea attribute to None
+        Look up (or build) the spatial index of the areas in possible_resp
+        Get a reader for the EyeLinkDevice's gaze data, so that only samples arriving from now on are read
+        Set up the filter for the samples, if the gaze_filter parameter is set (see filters.py)
+        Look up the track-loss state of the eye used (see TrackLossMonitor in detection.py)
         """
         ResponseCollector.start(self)
         if not getExperiment().recording:
@@ -267,12 +302,19 @@ class GazeResponseCollector(ResponseCollector):
             raise TrialAbort(pylink.TRIAL_ERROR)
 ##            getTracker().resetData()
         self.fixatedArea = None
+        self.areaIndex = getAreaIndex(self['possible_resp'])
+        self.device = getDevice(devices.EyeLinkDevice)
+        self.reader = self.device.bus.reader(self.eyeUsed)
+        self.trackLoss = self.device.trackLoss[self.eyeUsed]
+        if self['gaze_filter'] == None: self.filter = None
+        elif FILTERS.has_key(self['gaze_filter']): self.filter = FILTERS[self['gaze_filter']](**self['gaze_filter_options'])
+        else: raise Error("%s: gaze_filter must be None or one of %s, not %r"%(self['name'],", ".join(sorted(FILTERS)),self['gaze_filter']))
 
     def respond(self,events):
         """Ensure that handleEvent is always called once whether or not any events have been detected.
 
         This is necessary because the EyeLinkDevice doesn't post events to EyeScript's event queue, but
-        rather, the ContinuousGaze object reads events directly from the EyeLink buffer.
+        rather, the gaze collectors read samples and link events from the EyeLinkDevice's buffers.
 
         Maybe someone who is in less of a hurry than I am in right now can replace this with a more elegant solution.
         """
@@ -303,33 +345,71 @@ class GazeResponseCollector(ResponseCollector):
         """
         pass
 
+    def newSamples(self):
+        """Return numpy arrays (time, x, y) of the samples of the eye used that have arrived since the last call, leaving out any from before onset_time
+
+        Samples in gaps in the data, or just after them, are missing (NaN), and if there is a gaze filter, the gaze positions are filtered.
+        """
+        times,x,y = self.reader.samples()
+        if len(times):
+            invalid = self.trackLoss.classify(times) != VALID
+            x[invalid] = y[invalid] = numpy.nan
+        if self.filter: x,y = self.filter.filter(times,x,y)
+        if len(times) and times[0] < self['onset_time']:
+            start = times.searchsorted(self['onset_time'])
+            times,x,y = times[start:],x[start:],y[start:]
+        return times,x,y
+
+    def log(self):
+        """Record the subject's response in the log files, and if there is a gaze filter, its cost per sample (in microseconds)
+        and the delay it added (in ms), as <name>.filter_cost and <name>.filter_latency
+        """
+        ResponseCollector.log(self)
+        if getattr(self,'filter',None):
+            getLog().logAttributes({'%s.filter_cost'%self['name']:"%.1f"%self.filter.cost(),
+                                    '%s.filter_latency'%self['name']:"%.2f"%self.filter.latency()})
+
 class GazeSample(GazeResponseCollector):
     """Monitor subject's gaze and check if it falls in a given area.
     
     Return a response as soon as a sample in an interest area is detected (don't wait for a fixation to be detected).
+
+    If the saccade_trigger parameter is set to 'onset' or 'peak', also return a response, with the time of the sample the prediction
+    was made on, as soon as a saccade is under way whose predicted landing position is in an interest area (see SaccadePredictor in detection.py).
+    The predicted and actual landing positions are then logged once the saccade ends (see EyeLinkDevice.reportLanding in devices.py).
     """
+    def start(self):
+        GazeResponseCollector.start(self)
+        if self['saccade_trigger'] not in [None,'onset','peak']:
+            raise Error("%s: saccade_trigger must be None, 'onset' or 'peak', not %r"%(self['name'],self['saccade_trigger']))
+        if self['saccade_trigger']: self.predictor = self.device.predictSaccades(self.eyeUsed)
+
     def checkEyeLink(self):
-        sample = getTracker().getNewestSample()
-        sampledata = sample and (
-                (self.eyeUsed == 1 and sample.isRightSample() and sample.getRightEye()) or
-                (self.eyeUsed == 0 and sample.isLeftSample() and sample.getLeftEye())
-                )
-        if sampledata:
-            for area in self['possible_resp']:
-                if area.contains(sampledata.getGaze()):
-                    self.params['rt_time'] = sample.getTime()
-                    self.params['rt'] = sample.getTime() - self.params['onset_time']
-                    self.params['resp'] = area
-                    # TODO: Test the following code:
-                    # In particular: is the number specifying the offset
-                    # between here and the eye tracker meaningful and
-                    # correct?  What's the meaning of this number anyway?
-                    # And what's it used for?
-                    getTracker().sendMessage("%s.END_RT"%(self['name']))
-                    #getTracker().sendMessage("%d %s.END_RT"%(self['rt_time']-pylink.currentTime(),
-                    #                                         self['name']))
-                    self.stop()
-                    return True
+        times,x,y = self.newSamples()
+        i,area = self.areaIndex.firstHit(x,y)
+        # Respond with the time of the first sample in the area, even if later samples have arrived since
+        if area: rt_time = sampleTime(times[i])
+        if self['saccade_trigger']:
+            saccade = self.predictor.prediction(self['saccade_trigger'])
+            if saccade and saccade.predictionTime >= self['onset_time'] and not (area and rt_time <= saccade.predictionTime):
+                predictedArea = self.areaIndex.find(saccade.predicted)
+                if predictedArea:
+                    area,rt_time = predictedArea,saccade.predictionTime
+                    self.device.reportLanding(saccade,self['name'],saccade.predicted)
+        if area:
+            self.params['rt_time'] = rt_time
+            self.params['rt'] = self.params['rt_time'] - self.params['onset_time']
+            self.params['resp'] = area
+            # TODO: Test the following code:
+            # In particular: is the number specifying the offset
+            # between here and the eye tracker meaningful and
+            # correct?  What's the meaning of this number anyway?
+            # And what's it used for?
+            getTracker().sendMessage("%s.END_RT"%(self['name']))
+            #getTracker().sendMessage("%d %s.END_RT"%(self['rt_time']-pylink.currentTime(),
+            #                                         self['name']))
+            self.stop()
+            return True
         return False
                     
                 
@@ -346,62 +426,151 @@ class ContinuousGaze(GazeResponseCollector):
     possible_resp:  a list of Shape or InterestArea object specifying areas of the screen to monitor
     min_fixation:  time the subject has to remain fixated in an interest area before it counts as a response
                    (0 --> register a response as soon as a fixation in an interest area is detected).
+    fixation_source:  'tracker' to use the EyeLink's fixation events, or 'ivt' or 'idt' to detect fixations in EyeScript
+                      from the raw samples, without the parser's delay (see detection.py)
+
+    Attributes:
+    fixationGaze: after a response, the average (x,y) gaze position of the samples in the fixation that counted as the response
+                  (None if there were no valid samples), e.g. to measure the tracker's drift from a known target (see DriftMonitor in trials.py)
     """
+    def start(self):
+        GazeResponseCollector.start(self)
+        if self['fixation_source'] != 'tracker':
+            self.reader = self.device.bus.reader(self.eyeUsed,self.device.detect(self.eyeUsed,self['fixation_source']))
+        self.fixationGaze = None
+        self.exitTime = None # Time the gaze last left a fixated area
+
     def checkEyeLink(self):
         """Check if the eyes have fixated in one of the areas listed in possible_resp, and have stayed there for the specified minimum time.
         If so, record rt, rt_time, and resp, and return True; otherwise return False.
         """   
             
-        if self.fixatedArea: #We've already started fixating on one of the areas in possible_resp
-            sample = getTracker().getNewestSample()
-            # Retrieve the sample data from whichever eye we care about
-            sampledata = sample and (
-                (self.eyeUsed == 1 and sample.isRightSample() and sample.getRightEye()) or
-                (self.eyeUsed == 0 and sample.isLeftSample() and sample.getLeftEye())
-                )
-            if sampledata:
-                if self.fixatedArea.contains(sampledata.getGaze()):
-                    # Check whether they've stayed in the interest area for the specified minimum time
-                    if sample.getTime() - self.fixtime > self.params['min_fixation']:
-                        self.params['rt_time'] = self.fixtime
-                        self.params['rt'] = self.params['rt_time'] - self.params['onset_time']
-                        self.params['resp'] = self.fixatedArea
-                        # TODO: Test the following code:
-                        # In particular: is the number specifying the offset
-                        # between here and the eye tracker meaningful and
-                        # correct?  What's the meaning of this number anyway?
-                        # And what's it used for?
-                        getTracker().sendMessage("%s.END_RT" % self['name'])
-                        self.stop()
-                        return True
-                else: # The eye has left the interest area.  
-                    self.fixatedArea = None
-                    
-              
-        else:
+        if not self.fixatedArea:
             # Check whether we have a fixation in one of the areas in possible_resp
-            eventType = getTracker().getNextData()
-            if eventType == pylink.STARTFIX or eventType == pylink.FIXUPDATE or eventType == pylink.ENDFIX:
-                event = getTracker().getFloatData()
-    ##                        print "event.getEye(): %d"%(event.getEye())
-    ##                        print "event.getStartGaze(): (%d,%d)"%event.getStartGaze()
-                if event.getType() == pylink.STARTFIX and event.getEye() == self.eyeUsed:
-                    for area in self.params['possible_resp']:
-                        if area.contains(event.getStartGaze()):
-                            self.fixtime=event.getStartTime()
-                            self.fixatedArea = area
-                            break
-                if (event.getType() == pylink.FIXUPDATE or event.getType() == pylink.ENDFIX) and event.getEye() == self.eyeUsed:
-                    for area in self.params['possible_resp']:
-                        if area.contains(event.getAverageGaze()):
-                            self.fixtime=event.getStartTime()
-                            self.fixatedArea = area
-                            break
+            events = self.reader.events()
+            for i,(eventType,event) in enumerate(events):
+                if eventType == pylink.STARTFIX and event.getEye() == self.eyeUsed:
+                    eventTime = event.getStartTime()
+                    area = self.areaIndex.find(event.getStartGaze())
+                elif (eventType == pylink.FIXUPDATE or eventType == pylink.ENDFIX) and event.getEye() == self.eyeUsed:
+                    eventTime = event.getEndTime()
+                    area = self.areaIndex.find(event.getAverageGaze())
+                else:
+                    continue
+                # Events from before the gaze last left an area have already been superseded by the samples
+                if area and (self.exitTime == None or eventTime >= self.exitTime):
+                    self.fixtime=event.getStartTime()
+                    self.fixatedArea = area
+                    self.gazeSum = [0,0.0,0.0] # Number of valid samples in the fixation, and the sums of their coordinates
+                    # Leave the rest of the events for after this fixation, in case the gaze leaves the area before min_fixation
+                    self.reader.unread(len(events)-i-1)
+                    # The event arrives after the parser's delay, so go back to the samples from the start of the fixation
+                    # (some of them may have been read already, up to the time the gaze left the last area)
+                    if self.reader.seek(self.fixtime) and self.filter: self.filter.reset()
+                    break
+        if not self.fixatedArea:
+            # The samples are left in the buffer until a fixation in an area turns up
+            return False
+        times,x,y = self.newSamples()
+        if len(times): #We've already started fixating on one of the areas in possible_resp
+            # Only the samples up to the first one outside the area count towards the fixation.
+            # Missing samples in gaps up to bridge_gap ms don't count as outside, but losing track for longer does.
+            outside = numpy.flatnonzero((~self.fixatedArea.containsArray(x,y) & ~numpy.isnan(x))
+                                        | (self.trackLoss.classify(times) == LOST))
+            if len(outside): inside = outside[0]
+            else: inside = len(times)
+            valid = ~numpy.isnan(x[:inside])
+            self.gazeSum[0] += valid.sum()
+            self.gazeSum[1] += x[:inside][valid].sum()
+            self.gazeSum[2] += y[:inside][valid].sum()
+            # Check whether they've stayed in the interest area for the specified minimum time
+            if inside and times[inside-1] - self.fixtime > self.params['min_fixation']:
+                self.params['rt_time'] = self.fixtime
+                self.params['rt'] = self.params['rt_time'] - self.params['onset_time']
+                self.params['resp'] = self.fixatedArea
+                count,sumX,sumY = self.gazeSum
+                if count: self.fixationGaze = (sumX/count,sumY/count)
+                # TODO: Test the following code:
+                # In particular: is the number specifying the offset
+                # between here and the eye tracker meaningful and
+                # correct?  What's the meaning of this number anyway?
+                # And what's it used for?
+                getTracker().sendMessage("%s.END_RT" % self['name'])
+                self.stop()
+                return True
+            if len(outside): # The eye has left the interest area.
+                self.fixatedArea = None
+                self.exitTime = times[outside[0]]
         return False
         
 
 
 
+class FixationTrigger(ContinuousGaze):
+    """Wait for the subject to fixate a target, e.g. a fixation point before a trial's stimulus (see gcFixation in trials.py).
+
+    A ContinuousGaze whose only possible response is a square area around the target, so the same fixation criteria apply:
+    a fixation starting in the area (from the source set by fixation_source), followed by min_fixation ms of samples in the area.
+    If the duration parameter is set, the FixationTrigger stops after that many ms, with resp None, if the subject hasn't fixated the target.
+
+    Parameters (besides those for ContinuousGaze):
+    target: the (x,y) screen coordinates of the target.  Default: the fixation_target experiment parameter, or the center of the screen
+    gcbuffer_size: half the side of the square area around the target, in pixels
+    """
+    def __init__(self,**params):
+        ContinuousGaze.__init__(self,**params)
+        screen_size = self['screen_size']
+        target = self.get('target',None) or self.get('fixation_target',None) or (screen_size[0]/2,screen_size[1]/2)
+        buffer_size = self['gcbuffer_size']
+        self['target'] = target
+        self['possible_resp'] = [Rectangle((target[0]-buffer_size,target[1]-buffer_size,2*buffer_size,2*buffer_size))]
+
+class ReadingMonitor(GazeResponseCollector):
+    """Accumulate reading measures (first fixation duration, gaze duration, etc.) for a list of interest areas
+    as the fixations come in (see reading_measures.py).
+
+    A ReadingMonitor never registers a response; it runs until it's stopped (by default, when its display ends),
+    and then logs the measures as <name>.IA_<n>.<measure>.  The measures so far can be read at any time from its measures attribute.
+    Displays create one automatically if the reading_measures parameter is set.
+    If the eyetracker isn't recording when it's started, a ReadingMonitor stays inactive and logs nothing.
+
+    Parameters (besides those for GazeResponseCollector):
+    possible_resp:  the interest areas, in reading order
+    fixation_source:  where the fixations come from, as for ContinuousGaze
+
+    Attributes:
+    measures: the ReadingMeasures object
+    """
+    def __init__(self,**params):
+        GazeResponseCollector.__init__(self,**params)
+        self.measures = ReadingMeasures(self['possible_resp'])
+
+    def start(self):
+        self.measures = ReadingMeasures(self['possible_resp'])
+        # Not an error, unlike for other gaze collectors: displays attach a ReadingMonitor wherever reading_measures is set,
+        # including displays run outside of recording (instructions, feedback)
+        if not getExperiment().recording:
+            self.running = False
+            return
+        GazeResponseCollector.start(self)
+        if self['fixation_source'] != 'tracker':
+            self.reader = self.device.bus.reader(self.eyeUsed,self.device.detect(self.eyeUsed,self['fixation_source']))
+
+    def handleEvent(self,event):
+        # Without an eyetracker there's nothing to measure, and no response to fake
+        if not getTracker(): return False
+        return GazeResponseCollector.handleEvent(self,event)
+
+    def checkEyeLink(self):
+        for eventType,event in self.reader.events():
+            if eventType == pylink.ENDFIX and event.getEye() == self.eyeUsed and event.getStartTime() >= self['onset_time']:
+                self.measures.addFixation(event.getStartTime(),event.getEndTime(),event.getAverageGaze())
+        return False
+
+    def log(self):
+        GazeResponseCollector.log(self)
+        getLog().logAttributes(self.measures.attributes(self['name'],self['NA_string']))
+
 BBOXMAPPING = {0:4,6:3,5:2,2:1,1:5,4:6,3:7,7:8}
 def byteToKey(byte):
     """Convert byte input from a Cedrus button box to the number of the button box key specified by the byte
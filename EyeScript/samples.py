@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Buffers for the gaze samples received over the link from the eyetracker.
+
+EyeScript scripts will not normally use this module directly.  Each time the EyeLinkDevice is polled it drains the link queue
+into its GazeBus, appending every sample to the bus's SampleBuffer and every link event to its EventStream, so that no data are
+lost between iterations of the response loop.  Each consumer of the data (gaze response collectors, online event detectors,
+gaze-contingent displays) reads from the bus through its own GazeReader, which keeps cursors into the buffers: each time it's called
+it returns all the samples that have arrived since, as numpy arrays, which can be tested against interest areas in a single
+vectorized operation.
+
+Gaze positions are stored in screen pixels, with missing data (e.g. during blinks) stored as NaN, so that a missing sample is
+never inside any area.
+"""
+import numpy
+from linkdata import LEFT_EYE,RIGHT_EYE,MISSING_DATA
+
+def _gaze(eyeData):
+    """Return the (x,y) gaze position of a pylink sample's eye data, with missing data as NaN
+    """
+    x,y = eyeData.getGaze()
+    if x <= MISSING_DATA or x >= 1e8 or y <= MISSING_DATA or y >= 1e8: return numpy.nan,numpy.nan
+    return x,y
+
+def sampleTime(time):
+    """Convert a timestamp read from a SampleBuffer to an int if it's a whole number of milliseconds (as at sampling rates up to 1000 Hz), otherwise a float
+    """
+    if time == int(time): return int(time)
+    return float(time)
+
+class SampleBuffer:
+    """Ring buffer of gaze samples.
+
+    Attributes:
+    size: number of samples the buffer holds; older samples are overwritten
+    count: number of samples appended since the buffer was created.  Readers use it as a cursor: read(cursor,eye) returns the
+           samples appended since count was equal to cursor.
+    time: array of the samples' timestamps
+    x, y: 2 x size arrays of gaze coordinates, indexed by eye (0=left, 1=right) and position in the ring
+    """
+    def __init__(self,size=8192):
+        self.size = size
+        self.count = 0
+        self.time = numpy.zeros(size)
+        self.x = numpy.empty((2,size))
+        self.y = numpy.empty((2,size))
+        self.x.fill(numpy.nan)
+        self.y.fill(numpy.nan)
+
+    def extend(self,samples):
+        """Append a list of pylink sample objects to the buffer
+        """
+        n = len(samples)
+        if not n: return
+        if n > self.size:
+            samples = samples[-self.size:]
+            self.count += n-self.size
+            n = self.size
+        nan = (numpy.nan,numpy.nan)
+        rows = [(sample.getTime(),)
+                + (sample.isLeftSample() and _gaze(sample.getLeftEye()) or nan)
+                + (sample.isRightSample() and _gaze(sample.getRightEye()) or nan)
+                for sample in samples]
+        data = numpy.array(rows,dtype=float)
+        positions = numpy.arange(self.count,self.count+n) % self.size
+        self.time[positions] = data[:,0]
+        self.x[LEFT_EYE,positions] = data[:,1]
+        self.y[LEFT_EYE,positions] = data[:,2]
+        self.x[RIGHT_EYE,positions] = data[:,3]
+        self.y[RIGHT_EYE,positions] = data[:,4]
+        self.count += n
+
+    def read(self,cursor,eye):
+        """Return (count, time, x, y) for the given eye's samples appended since the buffer's count was equal to cursor.
+
+        Samples that have already been overwritten are skipped.  The arrays are copies, in order of arrival;
+        the returned count is the cursor to pass to the next call.
+        """
+        start = max(cursor,self.count-self.size)
+        positions = numpy.arange(start,self.count) % self.size
+        return self.count,self.time[positions],self.x[eye,positions],self.y[eye,positions]
+
+    def find(self,time):
+        """Return the cursor of the first sample still in the buffer whose timestamp is at or after time
+        (the buffer's count if there is none), i.e. read(find(time),eye) returns the samples from that time on
+        """
+        start = max(0,self.count-self.size)
+        times = self.time[numpy.arange(start,self.count) % self.size]
+        return start+times.searchsorted(time)
+
+    def last(self,eye):
+        """Return (time, x, y) of the newest sample for the given eye (x and y are NaN if its gaze position is missing), or None if the buffer is empty
+        """
+        if not self.count: return None
+        position = (self.count-1) % self.size
+        return self.time[position],self.x[eye,position],self.y[eye,position]
+
+
+class EventStream:
+    """Bounded list of (type,event) pairs from the eyetracker link or from online event detection, read through cursors.
+
+    Attributes:
+    events: the most recent (type,event) pairs, at most 'limit' of them
+    count: number of events appended since the stream was created; read(cursor) returns the events appended since count was equal to cursor
+    """
+    def __init__(self,limit=256):
+        self.events = []
+        self.count = 0
+        self.limit = limit
+
+    def append(self,type,event):
+        self.events.append((type,event))
+        self.count += 1
+        if len(self.events) > 2*self.limit: del self.events[:-self.limit]
+
+    def read(self,cursor):
+        """Return (count, events): the events appended since count was equal to cursor, and the cursor for the next call
+        """
+        new = min(self.count-cursor,self.limit)
+        if new <= 0: return self.count,[]
+        return self.count,self.events[-new:]
+
+
+class GazeReader:
+    """One consumer's cursors into a SampleBuffer and (optionally) an EventStream.
+
+    Every consumer of gaze data (response collector, event detector, display, logger) gets its own reader, so each one sees every sample
+    and event, whatever the other consumers have already read.  A reader starts at the newest data, i.e. only data arriving
+    after its creation is read.
+
+    Attributes:
+    eye: the eye whose samples are read (0=left, 1=right)
+    dropped: number of samples that were overwritten in the buffer before this reader got to them
+    """
+    def __init__(self,samples,eye,events=None):
+        self.sampleBuffer = samples
+        self.eventStream = events
+        self.eye = eye
+        self.sampleCursor = samples.count
+        self.eventCursor = events and events.count or 0
+        self.dropped = 0
+
+    def samples(self):
+        """Return numpy arrays (time, x, y) of the samples that have arrived since the last call
+        """
+        buffer = self.sampleBuffer
+        overwritten = buffer.count-buffer.size-self.sampleCursor
+        if overwritten > 0: self.dropped += overwritten
+        self.sampleCursor,times,x,y = buffer.read(self.sampleCursor,self.eye)
+        return times,x,y
+
+    def events(self):
+        """Return the (type,event) pairs that have arrived since the last call
+        """
+        self.eventCursor,events = self.eventStream.read(self.eventCursor)
+        return events
+
+    def unread(self,count):
+        """Put back the last count events returned by events(), so that the next call returns them again
+        """
+        self.eventCursor -= count
+
+    def seek(self,time):
+        """Move the sample cursor (backwards or forwards) so that the next call to samples() starts with the first sample at or after time,
+        as far back as the buffer still holds.  Returns True if the cursor moved.
+        """
+        cursor = self.sampleBuffer.find(time)
+        moved = cursor != self.sampleCursor
+        self.sampleCursor = cursor
+        return moved
+
+    def skip(self):
+        """Skip all the data that has arrived so far
+        """
+        self.sampleCursor = self.sampleBuffer.count
+        if self.eventStream: self.eventCursor = self.eventStream.count
+
+
+class GazeBus:
+    """The samples and link events read from the eyetracker, shared by all the consumers of gaze data.
+
+    The EyeLinkDevice is the only reader of the link: each poll drains the link queue into the bus.
+    Consumers then read from the bus through their own GazeReaders, so they can run side by side without taking data from each other,
+    and without any extra link traffic.
+
+    Attributes:
+    samples: the SampleBuffer
+    events: the EventStream of link events
+    """
+    def __init__(self,sample_buffer_size=8192,event_buffer_size=256):
+        self.samples = SampleBuffer(sample_buffer_size)
+        self.events = EventStream(event_buffer_size)
+
+    def reader(self,eye,events=None):
+        """Return a new GazeReader for the given eye's samples and for the bus's link events, or for the given EventStream
+        (e.g. of events detected online, see detection.py)
+        """
+        return GazeReader(self.samples,eye,events or self.events)
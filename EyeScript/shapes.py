@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 """Contains classes defining screen regions.  Such regions may be used to define interest areas for the Data Viewer, or to trigger events in gaze-contingent paradigms.
 """
+from __future__ import with_statement
 from pygame import Rect
+import numpy
 class Shape:
     """Abstract class representing screen regions, from which shape-specific subclasses will inherit
     
     Attribute:  rect, the bounding rectangle
     """
+    dataViewerName = None # Name of the shape for the Data Viewer, if it isn't the class name in upper case
+    
     def __init__(self, coordinates, name="shape"):
         """Create a shape, given some coordinates.
         
@@ -24,6 +28,11 @@ class Shape:
 
     def shapeName(self):
         return self.name
+
+    def coordinateString(self):
+        """Return the coordinates as recorded in a .ias file readable by the EyeLink Data Viewer:  the tab-separated left, top, right and bottom boundaries
+        """
+        return "%s\t%s\t%s\t%s"%(self.rect.left,self.rect.top,self.rect.right,self.rect.bottom)
     
     def contains(self,point):
         """Returns a boolean specifying whether the interest area contains the point.
@@ -31,6 +40,13 @@ class Shape:
         Must be defined for each subclass.
         """
         return False
+
+    def containsArray(self,x,y):
+        """Given numpy arrays of x and y coordinates, return a boolean array specifying which of the points the shape contains.
+
+        Points with NaN coordinates (missing data) are never contained.  Subclasses define this to test all the points in one vectorized operation.
+        """
+        return numpy.zeros(len(x),dtype=bool)
     
     def expand(self,dim,amount):
         """
@@ -52,6 +68,13 @@ class Rectangle(Shape):
         """Return True or False depending on whether the point is contained in the interest area
         """
         return self.rect.collidepoint(point)
+
+    def containsArray(self,x,y):
+        """Return a boolean array specifying which of the points (given as numpy arrays of x and y coordinates) are contained in the interest area
+        """
+        rect = self.rect
+        with numpy.errstate(invalid='ignore'): # NaNs (missing data) compare False without a warning
+            return (x >= rect.left) & (x < rect.right) & (y >= rect.top) & (y < rect.bottom)
     
 class Ellipse(Shape):
     """Defines an elliptical interest area
@@ -60,3 +83,91 @@ class Ellipse(Shape):
         """Return True or False depending on whether the point is contained in the interest area
         """
         return ((float(point[0]) - self.rect.centerx) / (self.rect.width / 2))**2 + ((float(point[1]) - self.rect.centery)/(self.rect.height / 2))**2 <= 1
+
+    def containsArray(self,x,y):
+        """Return a boolean array specifying which of the points (given as numpy arrays of x and y coordinates) are contained in the interest area
+        """
+        with numpy.errstate(invalid='ignore'):
+            return ((x - self.rect.centerx) / (self.rect.width / 2))**2 + ((y - self.rect.centery)/(self.rect.height / 2))**2 <= 1
+
+class Polygon(Shape):
+    """Defines a polygonal interest area, given the list of its vertices (recorded as a FREEHAND interest area for the Data Viewer)
+
+    The polygon's edges are kept in a table, so that testing a point needs only a bounding-rectangle test and, for points inside the
+    bounding rectangle, one comparison per edge (even-odd rule).  The polygon needn't be convex, but its edges shouldn't cross.
+    
+    Attributes:  vertices, the list of (x,y) vertices; rect, the bounding rectangle
+    """
+    dataViewerName = "FREEHAND"
+    
+    def __init__(self, vertices, name="polygon"):
+        """Create a polygon, given a list of at least 3 (x,y) vertices in order around the polygon (the last one is joined to the first)
+        """
+        self.name = name
+        self.setVertices(vertices)
+    
+    def setVertices(self,vertices):
+        """Set the polygon's vertices and recalculate its bounding rectangle and edge table
+        """
+        self.vertices = [(float(x),float(y)) for x,y in vertices]
+        if len(self.vertices) < 3: raise ValueError("A polygon needs at least 3 vertices")
+        xs = [x for x,y in self.vertices]
+        ys = [y for x,y in self.vertices]
+        self.bounds = (min(xs),min(ys),max(xs),max(ys))
+        left,top = int(numpy.floor(self.bounds[0])),int(numpy.floor(self.bounds[1]))
+        self.rect = Rect(left,top,int(numpy.ceil(self.bounds[2]))-left,int(numpy.ceil(self.bounds[3]))-top)
+        # Edge table: (y1, y2, x1, dx/dy) for each non-horizontal edge (horizontal edges are never crossed)
+        self.edges = []
+        for (x1,y1),(x2,y2) in zip(self.vertices,self.vertices[1:]+self.vertices[:1]):
+            if y1 != y2: self.edges.append((y1,y2,x1,(x2-x1)/(y2-y1)))
+        self.edgeArrays = numpy.array(self.edges).reshape(-1,4).T
+    
+    def contains(self,point):
+        """Return True or False depending on whether the point is contained in the interest area
+        """
+        x,y = float(point[0]),float(point[1])
+        left,top,right,bottom = self.bounds
+        if not (left <= x <= right and top <= y <= bottom): return False
+        inside = False
+        for y1,y2,x1,slope in self.edges:
+            if (y1 <= y) != (y2 <= y) and x < x1 + (y-y1)*slope: inside = not inside
+        return inside
+
+    def containsArray(self,x,y):
+        """Return a boolean array specifying which of the points (given as numpy arrays of x and y coordinates) are contained in the interest area
+        """
+        left,top,right,bottom = self.bounds
+        with numpy.errstate(invalid='ignore'):
+            result = (x >= left) & (x <= right) & (y >= top) & (y <= bottom)
+        candidates = numpy.flatnonzero(result)
+        if len(candidates):
+            # Test the points inside the bounding rectangle against all the edges at once (points x edges)
+            y1,y2,x1,slope = self.edgeArrays
+            pointsX = x[candidates][:,numpy.newaxis]
+            pointsY = y[candidates][:,numpy.newaxis]
+            crossings = ((y1 <= pointsY) != (y2 <= pointsY)) & (pointsX < x1 + (pointsY-y1)*slope)
+            result[candidates] = crossings.sum(axis=1) % 2 == 1
+        return result
+
+    def coordinateString(self):
+        """Return the vertices as tab-separated x,y pairs, as in a FREEHAND interest area in a .ias file
+        """
+        return "\t".join(["%d,%d"%(round(x),round(y)) for x,y in self.vertices])
+
+    def expand(self,dim,amount):
+        """
+        Expand the shape in a given direction, stretching the polygon so that its bounding rectangle grows by amount pixels on that side.
+        
+        Arguments:
+        dim, the direction in which to expand, 'top','left','right', or 'bottom'
+        amount, the number of pixels to expand the shape by
+        """
+        left,top,right,bottom = self.bounds
+        def stretch(value,fixed,moved):
+            # Map the range from fixed to moved onto the range from fixed to moved +/- amount
+            if moved == fixed: return value
+            return fixed + (value-fixed)*(abs(moved-fixed)+amount)/abs(moved-fixed)
+        if dim == 'top': self.setVertices([(x,stretch(y,bottom,top)) for x,y in self.vertices])
+        if dim == 'bottom': self.setVertices([(x,stretch(y,top,bottom)) for x,y in self.vertices])
+        if dim == 'left': self.setVertices([(stretch(x,right,left),y) for x,y in self.vertices])
+        if dim == 'right': self.setVertices([(stretch(x,left,right),y) for x,y in self.vertices])
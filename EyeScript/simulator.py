@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""A simulated EyeLink, for developing and load-testing gaze-contingent experiments without an eyetracker.
+
+Set the experiment parameter eyetracker = 'simulator' to use it.  Keyword arguments for SimulatedTracker can be given in the
+experiment parameter simulator_options, e.g.
+
+Experiment(eyetracker='simulator',simulator_options={'rate':2000,'latency':3,'scanpath':[(512,384,300),(200,400,250)]})
+
+While recording, the simulator produces samples at the given rate along a scanpath of fixations joined by saccades,
+and parses them into fixation, saccade and blink events the way the EyeLink does (including FIXUPDATE events if
+tracker_setUpdateInterval is nonzero).  Samples become available over the link 'latency' ms after their timestamp (plus one
+sample period if the heuristic filter is on), and events a further 'parser_delay' ms later, so that the timing of
+gaze-contingent code can be tested realistically.  Samples and events are generated on demand, so no thread is needed.
+
+The link event and sample filters set by the tracker_setLinkEventFilter and tracker_setLinkSampleFilter parameters are respected.
+"""
+import pylink, random, math
+from collections import deque
+from experiment import EyetrackerStub
+from linkdata import *
+
+TRIAL_ERROR = getattr(pylink,'TRIAL_ERROR',-1)
+
+EVENT_CATEGORIES = {STARTFIX:'FIXATION',ENDFIX:'FIXATION',FIXUPDATE:'FIXUPDATE',
+                    STARTSACC:'SACCADE',ENDSACC:'SACCADE',STARTBLINK:'BLINK',ENDBLINK:'BLINK'}
+
+def readingScanpath(screen_size,random,margin=100,line_spacing=60,saccade=80,regression=0.12):
+    """Generate an endless reading-like scanpath of (x,y,duration) fixations.
+
+    Fixations move rightward along lines of text by about 'saccade' pixels, with occasional regressions,
+    and return to the left margin at the end of each line.  Durations are gamma-distributed with a mean of 225 ms.
+    """
+    width,height = screen_size
+    x,y = margin,margin
+    while 1:
+        yield (x,y,max(50.0,random.gammavariate(9,25)))
+        if random.random() < regression: x = max(margin,x-abs(random.gauss(saccade*0.75,saccade/4.0)))
+        else: x += max(10.0,random.gauss(saccade,saccade/3.0))
+        if x > width-margin:
+            x = margin + abs(random.gauss(0,saccade/2.0))
+            y += line_spacing
+            if y > height-margin: y = margin
+
+class SimulatedTracker(EyetrackerStub):
+    """Stands in for pylink.EyeLink, producing gaze samples and events from a scripted or stochastic scanpath.
+
+    EyeLink methods which the simulator doesn't model are stubbed out, as in EyetrackerStub.  Unlike an EyetrackerStub,
+    a SimulatedTracker counts as True, so the gaze response collectors read its data as they would a real tracker's.
+
+    Attributes:
+    messages: list of (time,message) for all the messages sent with sendMessage
+    """
+    def __init__(self,rate=1000,latency=2,scanpath=None,noise=0.5,eye=RIGHT_EYE,screen_size=(1024,768),
+                 pixels_per_degree=35,parser_delay=20,blink_rate=0.0,offset=(0,0),queue_size=4096,seed=None):
+        """Arguments:
+        rate: sampling rate in Hz (e.g. 250, 500, 1000 or 2000)
+        latency: ms between a sample's timestamp and its availability over the link
+        scanpath: list of (x,y,duration) fixations, repeated on each recording and ending with an indefinite fixation at the last position;
+                  or a function taking (screen_size,random) and returning an iterable of fixations;
+                  or None for an endless reading-like scanpath (see readingScanpath)
+        noise: standard deviation, in pixels, of the gaussian noise added to each sample
+        eye: eye recorded: 0=left, 1=right, 2=binocular
+        screen_size: size of the screen in pixels
+        pixels_per_degree: used to compute saccade durations from their amplitude
+        parser_delay: ms after the data it describes that an event becomes available (on top of the link latency)
+        blink_rate: mean number of blinks per second
+        offset: (x,y) systematic error, in pixels, added to all gaze positions
+        queue_size: number of samples and events the link queue holds before the oldest are dropped
+        seed: seed for the random number generator, for reproducible data
+        """
+        self.interval = 1000.0/rate
+        if self.interval == int(self.interval): self.interval = int(self.interval)
+        self.latency = latency
+        self.scanpath = scanpath
+        self.noise = noise
+        self.eye = eye
+        self.screen_size = screen_size
+        self.pixels_per_degree = pixels_per_degree
+        self.parser_delay = parser_delay
+        self.blink_rate = blink_rate
+        self.offset = offset
+        self.random = random.Random(seed)
+        self.queue = deque(maxlen=queue_size)
+        self.pending = deque()
+        self.filterDelay = 0
+        self.updateInterval = 0
+        self.linkEvents = set(['LEFT','RIGHT','FIXATION','FIXUPDATE','SACCADE','BLINK'])
+        self.linkSamples = True
+        self.recording = False
+        self.data = None
+        self.newest = None
+        self.newestIsNew = False
+        self.messages = []
+
+    def __nonzero__(self):
+        return True
+
+    def setLinkEventFilter(self,filter):
+        self.linkEvents = set([word.strip().upper() for word in filter.split(',')])
+
+    def setLinkSampleFilter(self,filter):
+        self.linkSamples = bool(filter.strip())
+
+    def setUpdateInterval(self,interval):
+        self.updateInterval = interval
+
+    def setHeuristicFilterOn(self):
+        self.filterDelay = self.interval
+
+    def setHeuristicFilterOff(self):
+        self.filterDelay = 0
+
+    def sendMessage(self,message):
+        self.messages.append((pylink.currentTime(),message))
+        return 0
+
+    def startRecording(self,*args):
+        """Start generating data from the beginning of the scanpath
+        """
+        self.resetData()
+        self.nextSample = pylink.currentTime()
+        self.segments = self._segments(self.nextSample)
+        self.segment = None
+        self.segmentEnd = self.nextSample
+        self.stats = None
+        self.recording = True
+        return 0
+
+    def stopRecording(self,*args):
+        self._advance()
+        self.recording = False
+
+    def isRecording(self):
+        if self.recording: return pylink.TRIAL_OK
+        return TRIAL_ERROR
+
+    def waitForBlockStart(self,*args):
+        return int(self.recording)
+
+    def eyeAvailable(self):
+        return self.eye
+
+    def doDriftCorrect(self,*args):
+        return 0
+
+    def resetData(self):
+        self.queue.clear()
+        self.pending.clear()
+        self.data = None
+        self.newestIsNew = False
+
+    def getNextData(self):
+        """Return the type of the next item in the link queue (0 if there is none), and make it available through getFloatData
+        """
+        self._advance()
+        if self.queue:
+            type,self.data = self.queue.popleft()
+            return type
+        return 0
+
+    def getFloatData(self):
+        return self.data
+
+    def getNewestSample(self):
+        """Return the most recent sample available over the link, or None if there is no sample newer than the one last returned
+        """
+        self._advance()
+        if self.newestIsNew:
+            self.newestIsNew = False
+            return self.newest
+        return None
+
+    def _segments(self,time):
+        """Generate (kind,start,end,data) segments of simulated eye movement, for kinds 'fixation', 'saccade' and 'blink'
+        """
+        if self.scanpath == None: fixations = readingScanpath(self.screen_size,self.random)
+        elif callable(self.scanpath): fixations = self.scanpath(self.screen_size,self.random)
+        else: fixations = self.scanpath
+        x = y = None
+        for fx,fy,duration in fixations:
+            if x != None:
+                amplitude = math.hypot(fx-x,fy-y)
+                if amplitude >= 1:
+                    duration_sacc = 21+2.2*amplitude/self.pixels_per_degree
+                    yield ('saccade',time,time+duration_sacc,(x,y,fx,fy))
+                    time += duration_sacc
+            yield ('fixation',time,time+duration,(fx,fy))
+            time += duration
+            if self.blink_rate and self.random.random() < self.blink_rate*duration/1000.0:
+                duration_blink = self.random.uniform(80,150)
+                yield ('blink',time,time+duration_blink,(fx,fy))
+                time += duration_blink
+            x,y = fx,fy
+        if x == None: x,y = self.screen_size[0]/2,self.screen_size[1]/2
+        yield ('fixation',time,float('inf'),(x,y))
+
+    def _advance(self):
+        """Generate all the samples and events which have become available over the link since the last call
+        """
+        if not self.recording: return
+        available = pylink.currentTime()
+        delay = self.latency+self.filterDelay
+        while self.nextSample + delay <= available:
+            time = self.nextSample
+            sample = self._sample(time)
+            pending = self.pending
+            while pending and pending[0][0] <= time+delay:
+                self.queue.append(pending.popleft()[1:])
+            if self.linkSamples: self.queue.append((SAMPLE_TYPE,sample))
+            self.newest = sample
+            self.newestIsNew = True
+            self.nextSample += self.interval
+        while self.pending and self.pending[0][0] <= available:
+            self.queue.append(self.pending.popleft()[1:])
+
+    def _sample(self,time):
+        """Return the sample for the given time, queueing any events that the sample completes
+        """
+        while time >= self.segmentEnd:
+            self._endSegment()
+            self.segment = self.segments.next()
+            self.segmentEnd = self.segment[2]
+            self.stats = None
+        kind,start,end,data = self.segment
+        if kind == 'blink':
+            gaze = (MISSING_DATA,MISSING_DATA)
+            pupil = 0
+        else:
+            if kind == 'fixation':
+                x,y = data
+            else:
+                # Minimum-jerk position profile between the saccade's start and end points
+                x0,y0,x1,y1 = data
+                t = (time-start)/float(end-start)
+                s = t*t*t*(10-15*t+6*t*t)
+                x,y = x0+(x1-x0)*s,y0+(y1-y0)*s
+            gaze = (x+self.offset[0]+self.random.gauss(0,self.noise),y+self.offset[1]+self.random.gauss(0,self.noise))
+            pupil = 1000.0
+        self._updateStats(kind,time,gaze)
+        eyeData = EyeData(gaze,pupil)
+        if self.eye == LEFT_EYE: return Sample(time,eyeData,None)
+        if self.eye == RIGHT_EYE: return Sample(time,None,eyeData)
+        return Sample(time,eyeData,EyeData((gaze[0]+self.random.gauss(0,self.noise),gaze[1]+self.random.gauss(0,self.noise)),pupil))
+
+    def _updateStats(self,kind,time,gaze):
+        """Accumulate the data for the events describing the current segment, queueing start and update events as they're completed
+        """
+        if self.stats == None:
+            # First sample of the segment: [start time, start gaze, last time, last gaze, sum x, sum y, n, update start, update sum x, update sum y, update n]
+            self.stats = [time,gaze,time,gaze,0.0,0.0,0,time,0.0,0.0,0]
+            if kind == 'fixation': self._queueEvent(STARTFIX,time,GazeEvent(STARTFIX,None,time,startGaze=gaze))
+            elif kind == 'saccade': self._queueEvent(STARTSACC,time,GazeEvent(STARTSACC,None,time,startGaze=gaze))
+            else: self._queueEvent(STARTBLINK,time,GazeEvent(STARTBLINK,None,time))
+        stats = self.stats
+        stats[2] = time
+        stats[3] = gaze
+        if kind == 'fixation':
+            stats[4] += gaze[0]
+            stats[5] += gaze[1]
+            stats[6] += 1
+            if self.updateInterval:
+                stats[8] += gaze[0]
+                stats[9] += gaze[1]
+                stats[10] += 1
+                if time - stats[7] >= self.updateInterval:
+                    average = (stats[8]/stats[10],stats[9]/stats[10])
+                    self._queueEvent(FIXUPDATE,time,GazeEvent(FIXUPDATE,None,stats[7],time,average,gaze,average))
+                    stats[7:] = [time,0.0,0.0,0]
+
+    def _endSegment(self):
+        """Queue the event marking the end of the current segment
+        """
+        if self.segment == None or self.stats == None: return
+        kind = self.segment[0]
+        start,startGaze,end,endGaze = self.stats[:4]
+        if kind == 'fixation':
+            n = self.stats[6]
+            self._queueEvent(ENDFIX,end,GazeEvent(ENDFIX,None,start,end,startGaze,endGaze,(self.stats[4]/n,self.stats[5]/n)))
+        elif kind == 'saccade':
+            self._queueEvent(ENDSACC,end,GazeEvent(ENDSACC,None,start,end,startGaze,endGaze))
+        else:
+            self._queueEvent(ENDBLINK,end,GazeEvent(ENDBLINK,None,start,end))
+
+    def _queueEvent(self,type,time,event):
+        """Queue an event, one copy per recorded eye, to become available parser_delay ms after the given time
+        """
+        if EVENT_CATEGORIES[type] not in self.linkEvents: return
+        available = time+self.latency+self.filterDelay+self.parser_delay
+        if self.eye == BINOCULAR: eyes = [LEFT_EYE,RIGHT_EYE]
+        else: eyes = [self.eye]
+        for eye in eyes:
+            if (eye == LEFT_EYE and 'LEFT' in self.linkEvents) or (eye == RIGHT_EYE and 'RIGHT' in self.linkEvents):
+                self.pending.append((available,type,GazeEvent(type,eye,event.startTime,event.endTime,
+                                                              event.startGaze,event.endGaze,event.averageGaze)))
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Instrumentation for measuring how often the response loop runs and how long each device takes to poll.
+
+EyeScript scripts will not normally use this module directly.  Setting the experiment parameter loop_timing = True makes
+checkForResponse record, for every trial, the period between successive response-loop iterations and the time taken by each
+device's poll method, in fixed-bucket histograms.  At the end of each trial a summary is logged with the trial's data
+(columns loop.n, loop.rate, loop.period_mean, loop.period_p99, loop.period_max, and poll.<device>.mean / poll.<device>.max),
+and the full histograms are written to a file named like the text data file with the suffix _timing.
+
+All times in the logged summaries are in milliseconds; the histograms are kept in microseconds.
+
+The FrameMonitor class times buffer swaps so that displays can report frames that missed their refresh (see displays.py).
+"""
+from timeit import default_timer as clock
+from bisect import bisect_left
+import pylink
+
+BUCKET_EDGES = (25,50,100,200,500,1000,2000,5000,10000,20000,50000,100000)
+"""Upper edges, in microseconds, of the histogram buckets.  Values above the last edge go in an overflow bucket."""
+
+class Histogram:
+    """Counts of measured durations in fixed buckets, plus running count, total and maximum.
+
+    Adding a value costs one bisection of a short tuple, so it can be done on every iteration of the response loop.
+    """
+    def __init__(self,edges=BUCKET_EDGES):
+        self.edges = edges
+        self.reset()
+
+    def reset(self):
+        self.counts = [0]*(len(self.edges)+1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self,value):
+        """Add a duration, in microseconds, to the histogram
+        """
+        self.counts[bisect_left(self.edges,value)] += 1
+        self.n += 1
+        self.total += value
+        if value > self.max: self.max = value
+
+    def mean(self):
+        return self.n and self.total/self.n or 0.0
+
+    def percentile(self,p):
+        """Return the upper edge of the bucket containing the p-th percentile (0 < p <= 100), or the maximum for the overflow bucket
+        """
+        if not self.n: return 0.0
+        threshold = self.n*p/100.0
+        cumulative = 0
+        for i,count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                if i < len(self.edges): return min(float(self.edges[i]),self.max)
+                break
+        return self.max
+
+    def headings(self):
+        """Column headings for the buckets, as written to the timing file
+        """
+        return ["<=%d"%edge for edge in self.edges] + [">%d"%self.edges[-1]]
+
+class LoopMonitor:
+    """Records the response-loop period and the per-device poll durations for the current trial.
+
+    Attributes:
+    period: Histogram of the time between successive calls to iteration()
+    polls: dictionary mapping device class names to Histograms of their poll durations
+    rows: list of (trialNumber, measure, Histogram counts) accumulated for writing to the timing file
+    """
+    def __init__(self,edges=BUCKET_EDGES):
+        self.edges = edges
+        self.period = Histogram(edges)
+        self.polls = {}
+        self.rows = []
+        self.lastIteration = None
+        self.startTime = clock()
+
+    def reset(self):
+        """Start measuring afresh, e.g. at the beginning of a trial
+        """
+        self.period.reset()
+        for histogram in self.polls.values(): histogram.reset()
+        self.lastIteration = None
+        self.startTime = clock()
+
+    def iteration(self):
+        """Record the start of an iteration of the response loop, and return the current clock value (in seconds)
+        """
+        now = clock()
+        if self.lastIteration != None: self.period.add((now-self.lastIteration)*1000000.0)
+        self.lastIteration = now
+        return now
+
+    def pollTime(self,device,seconds):
+        """Record the time, in seconds, a device took to poll
+        """
+        name = device.__class__.__name__
+        try:
+            histogram = self.polls[name]
+        except KeyError:
+            histogram = self.polls[name] = Histogram(self.edges)
+        histogram.add(seconds*1000000.0)
+
+    def summary(self):
+        """Return a dictionary summarizing the measurements so far, suitable for passing to EventLog.logAttributes
+        """
+        elapsed = clock()-self.startTime
+        summary = {'loop.n':self.period.n,
+                   'loop.rate':"%.1f"%(elapsed > 0 and self.period.n/elapsed or 0.0),
+                   'loop.period_mean':"%.3f"%(self.period.mean()/1000.0),
+                   'loop.period_p99':"%.3f"%(self.period.percentile(99)/1000.0),
+                   'loop.period_max':"%.3f"%(self.period.max/1000.0)
+                   }
+        for name,histogram in self.polls.items():
+            if histogram.n:
+                summary['poll.%s.mean'%name] = "%.3f"%(histogram.mean()/1000.0)
+                summary['poll.%s.max'%name] = "%.3f"%(histogram.max/1000.0)
+        return summary
+
+    def endTrial(self,trialNumber):
+        """Store the current histograms for the timing file, and return the summary for logging
+        """
+        summary = self.summary()
+        self.rows.append((trialNumber,'loop_period',self.period.counts[:]))
+        for name,histogram in self.polls.items():
+            if histogram.n: self.rows.append((trialNumber,'poll.%s'%name,histogram.counts[:]))
+        self.reset()
+        return summary
+
+    def writeHistograms(self,filename):
+        """Write the stored histograms to a tab-delimited text file, one row per trial and measure
+        """
+        timingfile = open(filename,'w')
+        timingfile.write("\t".join(['trialNumber','measure'] + Histogram(self.edges).headings())+"\n")
+        for trialNumber,measure,counts in self.rows:
+            timingfile.write("\t".join([str(trialNumber),measure] + [str(count) for count in counts])+"\n")
+        timingfile.close()
+
+class FrameMonitor:
+    """Times buffer swaps to detect frames that were shown late.
+
+    A swap is counted as late if the swap itself blocked for longer than one refresh period (plus tolerance),
+    or, for frames flipped as part of a continuous sequence (consecutive=True), if the interval since the previous flip
+    exceeded one refresh period (plus tolerance), i.e. at least one refresh was missed.
+
+    Attributes (reset by reset()):
+    frames: number of flips
+    lateFrames: number of late flips
+    lateTimes: pylink.currentTime() timestamps of the late flips
+    maxSwap: longest time, in ms, spent in a single swap
+    maxInterval: longest interval, in ms, between consecutive flips
+    lastSwap: time, in ms, spent in the most recent swap
+    """
+    def __init__(self,swap,refresh_rate,tolerance=0.5):
+        """Arguments:
+        swap: the function which swaps the buffers (e.g. VisionEgg.Core.swap_buffers)
+        refresh_rate: the monitor refresh rate in Hz
+        tolerance: fraction of a refresh period by which a swap or frame interval may overrun before the frame is counted as late
+        """
+        self.swap = swap
+        self.period = 1000.0/refresh_rate
+        self.limit = self.period*(1+tolerance)
+        self.lastFlip = None
+        self.lastSwap = 0.0
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.lateFrames = 0
+        self.lateTimes = []
+        self.maxSwap = 0.0
+        self.maxInterval = 0.0
+
+    def flip(self,consecutive=False):
+        """Swap the buffers, check whether the frame was late, and return True if it was.
+
+        Set consecutive to True when this frame directly follows the previous flip (e.g. in an animation loop), so that the interval
+        between the two flips is checked as well as the duration of the swap.
+        """
+        start = clock()
+        self.swap()
+        end = clock()
+        swapTime = self.lastSwap = (end-start)*1000.0
+        late = swapTime > self.limit
+        if swapTime > self.maxSwap: self.maxSwap = swapTime
+        if consecutive and self.lastFlip != None:
+            interval = (end-self.lastFlip)*1000.0
+            if interval > self.maxInterval: self.maxInterval = interval
+            if interval > self.limit: late = True
+        self.lastFlip = end
+        self.frames += 1
+        if late:
+            self.lateFrames += 1
+            self.lateTimes.append(pylink.currentTime())
+        return late
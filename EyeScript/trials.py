@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Defines the abstract Trial class from which all trial definitions inherit. Also defines functions that may be called within a trial for eyetracker communication.
 """
-from experiment import getTracker, getExperiment, getLog, calibrateTracker,checkForResponse,TrialAbort,Error
+from experiment import getTracker, getExperiment, getLog, getDevice, calibrateTracker,checkForResponse,TrialAbort,Error
 import pygame,pylink
 from math import pi, sin, cos
 from VisionEgg.FlowControl import Presentation, Controller, FunctionController
@@ -40,6 +40,9 @@ class Trial:
             Trial.trialNumber += 1
             getLog().push()
             getLog().logAttributes(trialNumber=Trial.trialNumber)
+            if getExperiment().loopMonitor: getExperiment().loopMonitor.reset()
+            if getExperiment().gazeMonitor: getExperiment().gazeMonitor.newTrial(Trial.trialNumber)
+            if self.eyeLinkDevice(): self.eyeLinkDevice().resetTrackLoss()
             getLog().logAttributes(getattr(self,'metadata',{}))
             getTracker().sendMessage('TRIALID %s'%(Trial.trialNumber))
             getTracker().drawText("Trial_%s\n"%(Trial.trialNumber),pos=(1,20))
@@ -59,6 +62,9 @@ class Trial:
                 getExperiment().recording = False
                 pylink.endRealTimeMode()
                 getLog().logAttributes(trial_abort=abort.abortAction)
+                self.logLoopTiming()
+                self.logTrackLoss()
+                self.logLandings()
                 for key,value in getLog().currentData().iteritems():
                     setTrialVar(key,value)
                     pygame.time.delay(1)
@@ -74,6 +80,9 @@ class Trial:
                     raise
             else:
                 getLog().logAttributes(trial_abort=0)
+                self.logLoopTiming()
+                self.logTrackLoss()
+                self.logLandings()
                 for key,value in getLog().currentData().iteritems():
                     setTrialVar(key,value)
                     pygame.time.delay(1)
@@ -85,6 +94,28 @@ class Trial:
         """Defines what a subject will see and do during a trial. Defined in the child classes.
         """
         pass
+
+    def logLoopTiming(self):
+        """Log the response-loop timing summary for this trial, if the loop_timing experiment parameter is set
+        """
+        if getExperiment().loopMonitor:
+            getLog().logAttributes(getExperiment().loopMonitor.endTrial(Trial.trialNumber))
+    
+    def eyeLinkDevice(self):
+        """Return the experiment's EyeLinkDevice, or None if no gaze collector has set it up
+        """
+        from devices import EyeLinkDevice
+        return getDevice(EyeLinkDevice)
+
+    def logTrackLoss(self):
+        """Log the trial's data-loss statistics (see EyeLinkDevice.logTrackLoss in devices.py), if the EyeLinkDevice has been set up
+        """
+        if self.eyeLinkDevice(): self.eyeLinkDevice().logTrackLoss()
+
+    def logLandings(self):
+        """Log the trial's pending saccade landing reports (see EyeLinkDevice.logLandings in devices.py), if the EyeLinkDevice has been set up
+        """
+        if self.eyeLinkDevice(): self.eyeLinkDevice().logLandings(final=True)
     
     def setDataViewerBG(self,display,screen_image_file = None,interest_area_file = None):
         self.dataViewerBG = display
@@ -224,12 +255,28 @@ def driftCorrect(color=None,bgcolor=None,target=None):
         except RuntimeError:
             pass
     pygame.mouse.set_visible(mouseVisibility)
+    if getExperiment().driftMonitor: getExperiment().driftMonitor.driftCorrected()
         
-def gcFixation(target=None,color=None,bgcolor=None,duration=None,buffer_size=None):
+def gcFixation(target=None,color=None,bgcolor=None,duration=None,buffer_size=None,timeout=None):
     """Displays a fixation point and waits until the subject has fixated on it for a minimum duration.
 
-    The Eyetracker
+    The waiting is done by a FixationTrigger response collector (see response_collectors.py) in the common response loop,
+    so the other devices and response collectors keep being serviced (e.g. the experimenter can still abort) while the subject fixates.
+
+    Arguments (all optional):
+    target: (x,y) screen coordinates of the fixation point.  Default: the fixation_target experiment parameter, or the center of the screen
+    color, bgcolor: colors of the fixation point and of the background.  Default: the experiment's color and bgcolor parameters
+    duration: minimum fixation duration in ms.  Default: the min_fixation experiment parameter
+    buffer_size: half the side of the square around the target within which the gaze has to stay, in pixels.  Default: the gcbuffer_size experiment parameter
+    timeout: time in ms to wait for the fixation before falling back on drift correction, or 'infinite'.  Default: the gc_timeout experiment parameter
+             After a timeout, recording is stopped, drift correction is done on the target, recording is restarted and the target is shown again.
+    The fixation criteria are those of ContinuousGaze, so the fixation_source experiment parameter applies too.
+
+    If the drift_monitor experiment parameter is set, the offset of the subject's gaze from the target is recorded, so that checkDrift can correct the drift when it's needed.
+
+    Returns the number of times it fell back on drift correction.
     """
+    from response_collectors import FixationTrigger
     if buffer_size == None:  buffer_size = getExperiment()['gcbuffer_size']
     if not getExperiment().recording:
         raise EyetrackerError("Must be recording when gcFixation is called!")
@@ -240,63 +287,32 @@ def gcFixation(target=None,color=None,bgcolor=None,duration=None,buffer_size=Non
     color = color or getExperiment().params['color']
     bgcolor = bgcolor or getExperiment().params['bgcolor']
     duration = duration or getExperiment().params.get('min_fixation',800)
-    getExperiment().eyelinkGraphics.setCalibrationColors(color,bgcolor)
-    getExperiment().eyelinkGraphics.draw_cal_target(target[0],target[1])
-    if getTracker():
-        eyeUsed = getTracker().eyeAvailable()
-        if eyeUsed == 2:    # binocular recording
-            eyeUsed = getExperiment().params.get('eye_used',1)
-        elif eyeUsed == -1: # neither eye available!
-            raise TrialAbort(pylink.TRIAL_ERROR)
-        getTracker().resetData()
-##        getTracker().sendCommand("clear_cross %d %d %d"%(target[0],target[1],15))
-        fixarea = pygame.Rect(target[0]-buffer_size,
-                              target[1]-buffer_size,
-                              2*buffer_size,
-                              2*buffer_size
-                              )
-        infixarea = False
-        while 1:
-            action = getTracker().isRecording()
-            if action != pylink.TRIAL_OK:
-                raise TrialAbort(action)
-                
-            
-            if infixarea:
-                sample = getTracker().getNewestSample()
-                sampledata = sample and (
-                    (eyeUsed == 1 and sample.isRightSample() and sample.getRightEye()) or
-                    (eyeUsed == 0 and sample.isLeftSample() and sample.getLeftEye()) or
-                    False
-                    )
-                if sampledata:
-                    if fixarea.collidepoint(sampledata.getGaze()):
-                        if sample.getTime() - fixtime > duration:
-                            break
-                    else:
-                        infixarea = False
-                        getTracker().resetData()
-                        
-                  
-            else:
-                eventType = getTracker().getNextData()
-                if eventType == pylink.STARTFIX or eventType == pylink.FIXUPDATE or eventType == pylink.ENDFIX:
-##                        print "Fixation started"
-                    event = getTracker().getFloatData()
-##                        print "event.getEye(): %d"%(event.getEye())
-##                        print "event.getStartGaze(): (%d,%d)"%event.getStartGaze()
-                    if ((event.getType() == pylink.STARTFIX and
-                         event.getEye() == eyeUsed
-                         and fixarea.collidepoint(event.getStartGaze())) or
-                        ((event.getType() == pylink.FIXUPDATE or event.getType() == pylink.ENDFIX) and
-                         event.getEye() == eyeUsed
-                         and fixarea.collidepoint(event.getAverageGaze()))):
-##                            print "Fixation in critical area!"
-                        fixtime = event.getStartTime()
-                        infixarea = True
-    else:
-        pygame.time.delay(duration)
+    if timeout == None: timeout = getExperiment()['gc_timeout']
+    corrections = 0
+    while 1:
+        getExperiment().eyelinkGraphics.setCalibrationColors(color,bgcolor)
+        getExperiment().eyelinkGraphics.draw_cal_target(target[0],target[1])
+        if not getTracker():
+            pygame.time.delay(duration)
+            break
+        trigger = FixationTrigger(target=target,gcbuffer_size=buffer_size,min_fixation=duration,duration=timeout,name="gc_fixation")
+        trigger.start()
+        while trigger.running:
+            checkForResponse()
+            pygame.time.wait(1) # Sleep till the next samples rather than spinning; the trigger doesn't need better than ms resolution
+        if trigger['resp']:
+            if getExperiment().driftMonitor: getExperiment().driftMonitor.addFixation(target,trigger.fixationGaze)
+            break
+        # No fixation within the timeout: fall back on drift correction
+        corrections += 1
+        if getExperiment().driftMonitor: getExperiment().driftMonitor.addTimeout()
+        getTracker().sendMessage("gc_fixation.TIMEOUT")
+        getExperiment().eyelinkGraphics.erase_cal_target()
+        stopRecording()
+        driftCorrect(color,bgcolor,target)
+        startRecording()
     getExperiment().eyelinkGraphics.erase_cal_target()
+    return corrections
 
 def gcFlashFixation(target=None, color=None, bgcolor=None, duration=400, delay=100,
                     buffer_size=None, nflashes=6):
@@ -307,6 +323,106 @@ def gcFlashFixation(target=None, color=None, bgcolor=None, duration=400, delay=1
      
   
 
+class DriftMonitor:
+    """Estimates the eyetracker's drift from the subject's fixations on gcFixation targets, so that drift correction or recalibration
+    can be done when the drift calls for it rather than on a fixed schedule.
+
+    Each time gcFixation registers a fixation on its target, the average gaze position during the fixation is compared with the target.
+    The drift is the median offset of the gaze from the target over the last window fixations.  Drifts larger than gcbuffer_size
+    show up as gcFixation timeouts instead (if gc_timeout is set), after which gcFixation does a drift correction on the spot.
+
+    Set the drift_monitor experiment parameter to have the experiment create one, as getExperiment().driftMonitor, and call checkDrift
+    between trials (e.g. at the start of each trial, before startRecording) where a script would otherwise recalibrate every n trials.
+
+    Attributes:
+    threshold: drift in pixels above which a drift correction is needed
+    recalibration_threshold: drift in pixels above which recalibration is needed
+    window: number of fixations the drift is estimated from, and number of gcFixation timeouts after which recalibration is needed
+    offsets: (x,y) offsets of the gaze from the target in the fixations since the last drift correction or calibration (up to window of them)
+    timeouts: number of gcFixation timeouts since the last calibration
+    """
+    def __init__(self,threshold=20,recalibration_threshold=40,window=3):
+        self.threshold = threshold
+        self.recalibration_threshold = recalibration_threshold
+        self.window = window
+        self.offsets = []
+        self.timeouts = 0
+
+    def addFixation(self,target,gaze):
+        """Record a fixation with average gaze position gaze (or None if unknown) on a target at the (x,y) screen coordinates target
+        """
+        if gaze == None: return
+        self.offsets.append((gaze[0]-target[0],gaze[1]-target[1]))
+        del self.offsets[:-self.window]
+
+    def addTimeout(self):
+        """Record that the subject didn't fixate a gcFixation target within the timeout
+        """
+        self.timeouts += 1
+
+    def drift(self):
+        """Return the estimated (x,y) drift in pixels, or None if fewer than window fixations have been recorded since the last correction
+        """
+        if len(self.offsets) < self.window: return None
+        def median(values):
+            values = sorted(values)
+            middle = len(values)/2
+            if len(values)%2: return values[middle]
+            return (values[middle-1]+values[middle])/2.0
+        return (median([x for x,y in self.offsets]),median([y for x,y in self.offsets]))
+
+    def error(self):
+        """Return the size of the estimated drift in pixels, or None if it can't be estimated yet
+        """
+        drift = self.drift()
+        if drift == None: return None
+        return (drift[0]**2 + drift[1]**2)**0.5
+
+    def action(self):
+        """Return 'calibrate' if the tracker needs recalibrating, 'drift_correct' if it needs a drift correction, or None
+        """
+        if self.timeouts >= self.window: return 'calibrate'
+        error = self.error()
+        if error == None: return None
+        if error > self.recalibration_threshold: return 'calibrate'
+        if error > self.threshold: return 'drift_correct'
+        return None
+
+    def driftCorrected(self):
+        """Start measuring the drift afresh after a drift correction
+        """
+        self.offsets = []
+
+    def calibrated(self):
+        """Start measuring the drift afresh after a calibration
+        """
+        self.offsets = []
+        self.timeouts = 0
+
+def checkDrift(color=None,bgcolor=None,target=None):
+    """Do a drift correction or recalibrate the tracker if the drift measured by the experiment's DriftMonitor calls for it (see above).
+
+    Does nothing unless the drift_monitor experiment parameter is set.  Must be called while not recording.
+    The estimated drift (in pixels) and the action taken are logged as drift_error and drift_action.
+
+    Arguments (all optional): the colors and the target for the drift correction, as for driftCorrect
+
+    Returns the action taken: 'calibrate', 'drift_correct', or None
+    """
+    monitor = getExperiment().driftMonitor
+    if not monitor or not getTracker(): return None
+    if getExperiment().recording: raise EyetrackerError("Attempt to check drift while recording in progress")
+    action = monitor.action()
+    error = monitor.error()
+    getLog().logAttributes(drift_error = error == None and getExperiment()['NA_string'] or "%.1f"%error,
+                           drift_action = action or getExperiment()['NA_string'])
+    if action: getTracker().sendMessage("DRIFT_CHECK %s"%action)
+    if action == 'calibrate':
+        calibrateTracker((color or getExperiment().params['color'],bgcolor or getExperiment().params['bgcolor']))
+    elif action == 'drift_correct':
+        driftCorrect(color,bgcolor,target)
+    return action
+
 def setTrialVar(varName,value):
     """Sets the value of a trial variable, to inform the Data Viewer about trial metadata
     """
@@ -31,8 +31,10 @@ import pygame.mixer
 import pygame.event
 import pygame.image
 import pygame.draw
-import array
-import Image
+import pygame.surfarray
+import pygame.transform
+import numpy
+import time
 import pylink
 from pygame.constants import *
 
@@ -63,9 +65,14 @@ class EyeLinkCoreGraphicsPyGame(pylink.EyeLinkCustomDisplay):
 		self.__target_beep__ = pygame.mixer.Sound("caltargetbeep.wav")
 		self.__target_beep__done__ = pygame.mixer.Sound("caltargetbeep.wav")
 		self.__target_beep__error__ = pygame.mixer.Sound("caltargetbeep.wav")
-		self.imagebuffer = array.array('l')
 		self.pal = None	
 		self.size = (0,0)
+		# Camera image: frame buffer, surfaces for the frame and its scaled-up copy, and frame rate
+		self.frame = None
+		self.title = (0,"")
+		self.camera_frames = 0
+		self.camera_fps = 0.0
+		self.camera_fps_start = time.time()
 		if(not pygame.font.get_init()):
 			pygame.font.init()
 		self.fnt = pygame.font.Font("cour.ttf",25)
@@ -173,7 +180,9 @@ class EyeLinkCoreGraphicsPyGame(pylink.EyeLinkCustomDisplay):
 		self.clear_cal_display()
 		
 	def image_title(self, threshold, text): 
+		self.title = (threshold,text)
 		text = text + " " +str(threshold)
+		if self.camera_fps: text = "%s  (%.0f fps)"%(text,self.camera_fps)
 
 		sz = self.fnt.size(text[0])
 		txt = self.fnt.render(text,len(text),(0,0,0,255), (255,255,255,255))
@@ -236,26 +245,33 @@ class EyeLinkCoreGraphicsPyGame(pylink.EyeLinkCustomDisplay):
 			    	
 		
 	def draw_image_line(self, width, line, totlines,buff):		
-		#print "draw_image_line", len(buff)
-		i =0
-		while i <width:
-			self.imagebuffer.append(self.pal[buff[i]])
-			i= i+1
-				
+		# Each line is converted through the palette (a lookup table) straight into its row of the frame buffer
+		if self.frame is None or self.frame.shape[:2] != (totlines,width):
+			self.frame = numpy.zeros((totlines,width,3),dtype=numpy.uint8)
+			self.frame_surface = pygame.Surface((width,totlines),0,24)
+			self.scaled_surface = pygame.Surface((width*3,totlines*3),0,24)
+		numpy.take(self.pal,numpy.asarray(buff[:width]),axis=0,mode='clip',out=self.frame[line-1])
 		
 		if line == totlines:
-			imgsz = (self.size[0]*3,self.size[1]*3)
-			bufferv = self.imagebuffer.tostring()
-			img =Image.new("RGBX",self.size)
-			img.fromstring(bufferv)
-			img = img.resize(imgsz)
-			
-			img = pygame.image.fromstring(img.tostring(),imgsz,"RGBX");
+			imgsz = self.scaled_surface.get_size()
+			pygame.surfarray.blit_array(self.frame_surface,self.frame.transpose(1,0,2))
+			pygame.transform.scale(self.frame_surface,imgsz,self.scaled_surface)
+			img = self.scaled_surface
 			self.draw_cross_hair(img)
 			surf = pygame.display.get_surface()
 			surf.blit(img,((surf.get_rect().w-imgsz[0])/2,(surf.get_rect().h-imgsz[1])/2))
 			pygame.display.flip()
-			self.imagebuffer = array.array('l')
+			self.count_camera_frame()
+			
+	def count_camera_frame(self):
+		"""Count a camera frame, and update the frame rate shown after the image title once a second"""
+		self.camera_frames += 1
+		now = time.time()
+		if now - self.camera_fps_start >= 1.0:
+			self.camera_fps = self.camera_frames/(now-self.camera_fps_start)
+			self.camera_frames = 0
+			self.camera_fps_start = now
+			self.image_title(*self.title)
 			
 			
 		
@@ -263,14 +279,6 @@ class EyeLinkCoreGraphicsPyGame(pylink.EyeLinkCustomDisplay):
 		
 		
 	def set_image_palette(self, r,g,b): 
-		self.imagebuffer = array.array('l')
 		self.clear_cal_display()
-		sz = len(r)
-		i =0
-		self.pal = []
-		while i < sz:
-			rf = int(b[i])
-			gf = int(g[i])
-			bf = int(r[i])
-			self.pal.append((rf<<16) | (gf<<8) | (bf))
-			i = i+1
\ No newline at end of file
+		# Lookup table from palette index to (r,g,b); draw_image_line gives indices past the end of the palette its last color
+		self.pal = numpy.array([(int(r[i]),int(g[i]),int(b[i])) for i in range(len(r))],dtype=numpy.uint8).reshape(-1,3)
\ No newline at end of file
@@ -41,10 +41,8 @@ import sys
 import pygame.mixer
 import pygame.event
 from pygame.constants import *
-import array
 import pygame.image
-import Image
-import PIL.ImageDraw
+import numpy
 import pygame.draw
 
 sys.argv="EB Session","EB Session"
@@ -93,11 +91,15 @@ class KeyInput:
 		self.__state__ =state
 		self.__type__= 0x1
 
-def vline(idraw,x,y0,y1,col):
-	idraw.line([(x,y0),(x,y1)], fill=col)
+def vline(frame,x,y0,y1,col):
+	"""Draw a vertical line into a camera frame (a height x width x 3 numpy array), clipped to the frame"""
+	h,w = frame.shape[:2]
+	if 0 <= x < w: frame[max(0,y0):max(0,min(h,y1+1)),x] = col
 	
-def hline(idraw,x0,x1,y,col):
-	idraw.line([(x0,y),(x1,y)], fill=col)
+def hline(frame,x0,x1,y,col):
+	"""Draw a horizontal line into a camera frame (a height x width x 3 numpy array), clipped to the frame"""
+	h,w = frame.shape[:2]
+	if 0 <= y < h: frame[y,max(0,x0):max(0,min(w,x1+1))] = col
 
 
 class EyeLinkCoreGraphicsVE(pylink.EyeLinkCustomDisplay):
@@ -111,8 +113,13 @@ class EyeLinkCoreGraphicsVE(pylink.EyeLinkCustomDisplay):
 		self.__target_beep__ = pygame.mixer.Sound(join(PATH,"caltargetbeep.wav"))
 		self.__target_beep__done__ = pygame.mixer.Sound(join(PATH,"caltargetbeep.wav"))
 		self.__target_beep__error__ = pygame.mixer.Sound(join(PATH,"caltargetbeep.wav"))
-		self.imagebuffer = array.array('l')
 		self.pal = None	
+		# Camera image: frame buffer and frame rate
+		self.frame = None
+		self.title = ""
+		self.camera_frames = 0
+		self.camera_fps = 0.0
+		self.camera_fps_start = time.time()
 
 		# Create viewport for calibration / DC 
 		
@@ -136,13 +143,9 @@ class EyeLinkCoreGraphicsVE(pylink.EyeLinkCustomDisplay):
             		anchor='center')
 
                      
-		img =Image.new("RGBX",(int(screen.size[0]*0.75),int(screen.size[1]*0.75)))
-		image = TextureStimulus(mipmaps_enabled=0,
-			   texture=Texture(img),
-			   size=(int(screen.size[0]*0.75),int(screen.size[1]*0.75)),
-			   texture_min_filter=gl.GL_LINEAR,
-			   position=(cal_screen.size[0]/2.0,cal_screen.size[1]/2.0),
-			   anchor='center')
+		self.image_size = (int(screen.size[0]*0.75),int(screen.size[1]*0.75))
+		self.image_position = (cal_screen.size[0]/2.0,cal_screen.size[1]/2.0)
+		image = self.make_image_stimulus(numpy.zeros((2,2,3),dtype=numpy.uint8))
 
 		#image = TextureStimulus(mipmaps_enabled=0,
 		#	   texture=None,
@@ -157,6 +160,16 @@ class EyeLinkCoreGraphicsVE(pylink.EyeLinkCustomDisplay):
 		self.height=cal_screen.size[1]
 		
 		
+	def make_image_stimulus(self, frame):
+		"""Return a stimulus showing the camera frame (in OpenGL's bottom-to-top row order) scaled up to image_size by the graphics card"""
+		return TextureStimulus(mipmaps_enabled=0,
+			   texture=Texture(frame),
+			   size=self.image_size,
+			   texture_min_filter=gl.GL_LINEAR,
+			   texture_mag_filter=gl.GL_LINEAR,
+			   position=self.image_position,
+			   anchor='center')
+		
 	def setup_cal_display (self):
 		self.cal_vp.parameters.screen.clear()
 		VisionEgg.Core.swap_buffers()
@@ -280,44 +293,51 @@ class EyeLinkCoreGraphicsVE(pylink.EyeLinkCustomDisplay):
 		#VisionEgg.Core.swap_buffers()
 		
 	def image_title(self, threshold, text): 
+		self.title = text
+		if self.camera_fps: text = "%s  (%.0f fps)"%(text,self.camera_fps)
 		self.image_vp.parameters.stimuli[0].parameters.text=text			
 		
 	def draw_image_line(self, width, line, totlines,buff):		
-		i =0
-		while i <width:
-			if buff[i]>=len(self.pal):
-				buff[i]=len(self.pal)-1
-			self.imagebuffer.append(self.pal[buff[i]&0x000000FF])
-			i= i+1
+		# Each line is converted through the palette (a lookup table) straight into its row of the frame buffer.
+		# The frame is kept in OpenGL's bottom-to-top row order, so it can be uploaded as it is; rows is a top-to-bottom view of it.
+		if self.frame is None or self.frame.shape[:2] != (totlines,width):
+			self.frame = numpy.zeros((totlines,width,3),dtype=numpy.uint8)
+			self.rows = self.frame[::-1]
+			self.image_vp.parameters.stimuli[1] = self.make_image_stimulus(self.frame)
+		numpy.take(self.pal,numpy.asarray(buff[:width]),axis=0,mode='clip',out=self.rows[line-1])
 		
 		if line == totlines:	
-			img =Image.new("RGBX",self.img_size)
-			img.fromstring(self.imagebuffer.tostring())
-			img = img.resize(self.image_vp.parameters.stimuli[1].parameters.size)
+			self.draw_cross_hair(self.rows)
 			
-			self.draw_cross_hair(img)
-			
-			self.image_vp.parameters.stimuli[1].texture_object.put_sub_image(img)			
+			# Replace the texture's contents; the graphics card scales it to the stimulus size when drawing
+			self.image_vp.parameters.stimuli[1].texture_object.put_sub_image(self.frame)			
 
 			self.image_vp.parameters.screen.clear()
 			self.image_vp.draw()
 			
 			VisionEgg.Core.swap_buffers()
-
-			self.imagebuffer = array.array('l')
+			self.count_camera_frame()
+					
+	def count_camera_frame(self):
+		"""Count a camera frame, and update the frame rate shown after the image title once a second"""
+		self.camera_frames += 1
+		now = time.time()
+		if now - self.camera_fps_start >= 1.0:
+			self.camera_fps = self.camera_frames/(now-self.camera_fps_start)
+			self.camera_frames = 0
+			self.camera_fps_start = now
+			self.image_title(0,self.title)
 					
-	def draw_cross_hair(self, img):
+	def draw_cross_hair(self, frame):
 		xdata = self.tracker.getImageCrossHairData()
 		
 		if xdata is None:
 			return
 		else:
-			idraw = PIL.ImageDraw.Draw(img)
-
 			l =0
 			t =0
-			w = img.size[0]
-			h = img.size[1]
+			w = frame.shape[1]
+			h = frame.shape[0]
 			wmax = w/6
 			wmin = wmax/3
 			thick = 1 + (w/300)
@@ -337,38 +357,28 @@ class EyeLinkCoreGraphicsVE(pylink.EyeLinkCustomDisplay):
 			if(channel == 2):                 # head camera channel: draw marker xhairs 
 				for i in range(4):
 					if(x[i] != 0x8000):
-				    		hline(idraw, (x[i]-wmax), (x[i]+wmax), y[i],        white)
-				    		vline(idraw, x[i],        (y[i]-wmax), (y[i]+wmax), white)
+				    		hline(frame, (x[i]-wmax), (x[i]+wmax), y[i],        white)
+				    		vline(frame, x[i],        (y[i]-wmax), (y[i]+wmax), white)
 				    		
 			else:
 				if(x[0] != 0x8000):     # pupil (full-size) xhair
-					hline(idraw, l,   (l+w), y[0],white)
-					vline(idraw, x[0],t,    (t+h),white)
+					hline(frame, l,   (l+w), y[0],white)
+					vline(frame, x[0],t,    (t+h),white)
 					
 				if(x[1] != 0x8000):     # CR (open) xhair
-					hline(idraw, (x[1]-wmax), (x[1]-wmin), y[1],blue);
-					hline(idraw, (x[1]+wmin), (x[1]+wmax), y[1],blue);
-					vline(idraw,  x[1],(y[1]-wmax), (y[1]-wmin),blue);
-					vline(idraw,  x[1],(y[1]+wmin), (y[1]+wmax),blue);
+					hline(frame, (x[1]-wmax), (x[1]-wmin), y[1],blue);
+					hline(frame, (x[1]+wmin), (x[1]+wmax), y[1],blue);
+					vline(frame,  x[1],(y[1]-wmax), (y[1]-wmin),blue);
+					vline(frame,  x[1],(y[1]+wmin), (y[1]+wmax),blue);
 				    	
 				if(x[2] != 0x8000):     # pupil limits box
-					hline(idraw, x[2], x[3], y[2],green);
-					hline(idraw, x[2], x[3], y[3],green);
-					vline(idraw, x[2], y[2], y[3],green);
-					vline(idraw, x[3], y[2], y[3],green);
-
-			del idraw 
+					hline(frame, x[2], x[3], y[2],green);
+					hline(frame, x[2], x[3], y[3],green);
+					vline(frame, x[2], y[2], y[3],green);
+					vline(frame, x[3], y[2], y[3],green);
 
 	def set_image_palette(self, r,g,b): 
-		self.imagebuffer = array.array('l')
 		self.clear_cal_display()
-		sz = len(r)
-		i =0
-		self.pal = []
-		while i < sz:
-			rf = int(b[i])
-			gf = int(g[i])
-			bf = int(r[i])
-			self.pal.append((rf<<16) | (gf<<8) | (bf))
-			i = i+1
+		# Lookup table from palette index to (r,g,b); draw_image_line gives indices past the end of the palette its last color
+		self.pal = numpy.array([(int(r[i]),int(g[i]),int(b[i])) for i in range(len(r))],dtype=numpy.uint8).reshape(-1,3)
 
@@ -3,6 +3,16 @@ TRIAL_OK = 0
 REPEAT_TRIAL = 1
 SKIP_TRIAL = 2
 ABORT_EXPT = 3
+TRIAL_ERROR = -1
+STARTBLINK = 3
+ENDBLINK = 4
+STARTSACC = 5
+ENDSACC = 6
+STARTFIX = 7
+ENDFIX = 8
+FIXUPDATE = 9
+SAMPLE_TYPE = 200
+MISSING_DATA = -32768
 KB_BUTTON = 65000
 KB_PRESS = 10
 KB_RELEASE = -1
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks for EyeScript's hot paths.
+
+Run from the top of the EyeScript source tree with
+
+    python -m benchmarks -o results.json
+
+The benchmarks run headless (see Experiment in EyeScript/experiment.py), so they need software OpenGL and, without a DISPLAY, Xvfb.
+If pylink isn't installed, the stub in Resources/pylink-stub is used in its place, so no eyetracker is needed either.
+Results are written as JSON; pass --compare with an earlier results file to see the ratio of each benchmark's time to the earlier one.
+"""
+import os, sys, imp, platform, time
+from timeit import default_timer as clock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+benchmarks = []
+"""List of (name, setup function) pairs registered with the benchmark decorator, in the order they were defined"""
+
+def benchmark(name):
+    """Decorator registering a benchmark.
+
+    The decorated function does any setup and returns a 2-tuple (function to time, number of calls per repetition),
+    or a list of such 2-tuples paired with a name suffix, [(suffix,(function,number)), ...], for parametrized benchmarks.
+    A case can add a setup function and a check function: (function,number,setup,check).  setup is called just before the case
+    is timed (for cases that share global state, like the experiment's list of active response collectors), and check after
+    each repetition, outside the timing (e.g. to assert that the state the case times hasn't changed).  Either can be None.
+    """
+    def register(setup):
+        benchmarks.append((name,setup))
+        return setup
+    return register
+
+def timeCalls(function,number,repeat,check=None):
+    """Time 'repeat' repetitions of 'number' calls to function; return the per-call times in seconds, one per repetition
+
+    If check is given, it's called (untimed) after each repetition.
+    """
+    times = []
+    for i in xrange(repeat):
+        start = clock()
+        for j in xrange(number): function()
+        times.append((clock()-start)/number)
+        if check: check()
+    return times
+
+def summarize(times,number):
+    ordered = sorted(times)
+    return {'min':ordered[0],
+            'median':ordered[len(ordered)/2],
+            'mean':sum(ordered)/len(ordered),
+            'max':ordered[-1],
+            'number':number,
+            'repeat':len(ordered),
+            'unit':'seconds per call'
+            }
+
+def setUpEnvironment(**params):
+    """Make EyeScript and pylink (or the pylink stub) importable, and create a headless experiment.
+
+    Keyword arguments are passed on to the Experiment as parameters, e.g. eyetracker='simulator'.
+    """
+    if ROOT not in sys.path: sys.path.insert(0,ROOT)
+    try:
+        import pylink
+    except ImportError:
+        imp.load_package('pylink',os.path.join(ROOT,'Resources','pylink-stub'))
+    import EyeScript
+    options = dict(headless=True,session_values={'subject':0},screen_size=(1024,768),
+                   data_directory=os.path.join(ROOT,'benchmarks','data'))
+    options.update(params)
+    EyeScript.Experiment(**options)
+    return EyeScript
+
+def runAll(repeat=5,selected=None):
+    """Run the registered benchmarks (those whose names start with one of the strings in 'selected', if given) and return the results
+    """
+    EyeScript = setUpEnvironment()
+    import hotpaths
+    results = {}
+    for name,setup in benchmarks:
+        if selected and not [prefix for prefix in selected if name.startswith(prefix)]: continue
+        cases = setup()
+        if isinstance(cases,tuple): cases = [("",cases)]
+        for suffix,case in cases:
+            function,number,setUp,check = case+(None,)*(4-len(case))
+            fullname = suffix and "%s[%s]"%(name,suffix) or name
+            if setUp: setUp()
+            results[fullname] = summarize(timeCalls(function,number,repeat,check),number)
+            print >>sys.stderr, "%-50s %12.3f us"%(fullname,results[fullname]['min']*1e6)
+    return {'eyescript_version':EyeScript.__version__,
+            'python':platform.python_version(),
+            'platform':platform.platform(),
+            'time':time.strftime("%Y-%m-%d %H:%M:%S"),
+            'results':results
+            }
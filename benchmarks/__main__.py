@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Command-line entry point: python -m benchmarks [-o results.json] [--compare old.json] [--repeat N] [name prefixes...]
+"""
+import sys, json
+from optparse import OptionParser
+import benchmarks
+
+parser = OptionParser(usage="python -m benchmarks [options] [benchmark name prefixes]")
+parser.add_option("-o","--output",help="write the results as JSON to this file (default: standard output)")
+parser.add_option("-c","--compare",help="JSON results file from an earlier run to compare against")
+parser.add_option("-r","--repeat",type="int",default=5,help="repetitions of each benchmark (the minimum time is reported)")
+options,args = parser.parse_args()
+
+report = benchmarks.runAll(repeat=options.repeat,selected=args)
+if options.output:
+    outfile = open(options.output,'w')
+    json.dump(report,outfile,indent=1,sort_keys=True)
+    outfile.close()
+else:
+    json.dump(report,sys.stdout,indent=1,sort_keys=True)
+
+if options.compare:
+    old = json.load(open(options.compare))['results']
+    print >>sys.stderr, "\n%-50s %10s"%("benchmark","new/old")
+    for name in sorted(report['results']):
+        if name in old:
+            print >>sys.stderr, "%-50s %10.2f"%(name,report['results'][name]['min']/old[name]['min'])
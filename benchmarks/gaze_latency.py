@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""End-to-end latency of gaze-contingent display changes, from the eye crossing a boundary to the changed display being on the screen.
+
+Run from the top of the EyeScript source tree with
+
+    python -m benchmarks.gaze_latency [--tracker simulator|eyelink] [--trials 100] [-o report.json]
+
+Each trial runs a BoundaryDisplay (see EyeScript/displays.py) showing a + to the left of the middle of the screen and an X to the right
+of it, with the boundary in the middle; when the gaze crosses it, the X changes to an O.
+
+With --tracker simulator (the default) the experiment runs headless with the tracker simulator, whose subject fixates the + for
+200-400 ms and then makes a saccade to the X.  The simulator is seeded, so the numbers are comparable from run to run (e.g. in CI),
+though they still depend on the machine.  With --tracker eyelink the experiment runs on the lab's display and eyetracker; after
+calibration, the subject looks at the + and then at the X on every trial.
+
+For every display change, BoundaryDisplay records the timestamp of the sample past the boundary and the times at which the crossing
+was detected, at which the swap to the changed display was started and at which it completed.  The report gives the distribution
+(n, mean, median, 95th and 99th percentiles and maximum, in ms) of:
+read:   detect_time - boundary_time, the link latency plus the time until the response loop read the sample
+draw:   draw_time - detect_time, the time until the changed display was ready and the swap was started
+flip:   flip_duration, the time spent in the swap (e.g. waiting for the vertical retrace)
+total:  change_time - boundary_time, the whole latency
+"""
+import sys, json
+from optparse import OptionParser
+import benchmarks
+
+STAGES = ['read','draw','flip','total']
+PARAMS = ['boundary_time','detect_time','draw_time','change_time','flip_duration']
+
+def simulatedScanpath(screen_size,random):
+    """Fixate the + for 200-400 ms, then make a saccade to the X and stay there
+    """
+    width,height = screen_size
+    yield (width/4,height/2,random.uniform(200,400))
+    yield (3*width/4,height/2,1000)
+
+def stages(change):
+    """Return a dictionary of the durations of the stages of a display change, given the BoundaryDisplay's data
+    """
+    return {'read':change['detect_time']-change['boundary_time'],
+            'draw':change['draw_time']-change['detect_time'],
+            'flip':change['flip_duration'],
+            'total':change['change_time']-change['boundary_time']}
+
+def distribution(values):
+    ordered = sorted(values)
+    if not ordered: return {'n':0}
+    def percentile(p): return ordered[min(len(ordered)-1,int(len(ordered)*p/100.0))]
+    return {'n':len(ordered),
+            'mean':sum(ordered)/float(len(ordered)),
+            'p50':percentile(50),
+            'p95':percentile(95),
+            'p99':percentile(99),
+            'max':ordered[-1]
+            }
+
+def measure(trials,duration=1000):
+    """Run the trials with the current experiment, and return the list of the display changes' data (a dictionary per change)
+    """
+    from EyeScript import TextDisplay,BoundaryDisplay,startRecording,stopRecording,getExperiment
+    width = getExperiment()['screen_size'][0]
+    text = u"+%sX"%(u" "*40)
+    display = BoundaryDisplay([TextDisplay(text,align=('center','center'),response_collectors=[]),
+                               TextDisplay(text.replace(u"X",u"O"),align=('center','center'),response_collectors=[])],
+                              boundary=width/2,duration=duration,response_collectors=[],name="latency")
+    changes = []
+    for trial in xrange(trials):
+        startRecording()
+        try:
+            display.run()
+        finally:
+            stopRecording()
+        if display['change_time'] != None: changes.append(dict([(param,display[param]) for param in PARAMS]))
+    return changes
+
+def report(changes,tracker,trials):
+    durations = [stages(change) for change in changes]
+    return {'tracker':tracker,
+            'trials':trials,
+            'changes':len(changes),
+            'stages':dict([(stage,distribution([duration[stage] for duration in durations])) for stage in STAGES]),
+            'data':changes
+            }
+
+def main():
+    parser = OptionParser(usage="python -m benchmarks.gaze_latency [options]")
+    parser.add_option("-t","--tracker",default="simulator",choices=["simulator","eyelink"],help="'simulator' (default) or 'eyelink'")
+    parser.add_option("-n","--trials",type="int",default=100,help="number of display changes to measure (default 100)")
+    parser.add_option("-s","--seed",type="int",default=1,help="seed for the simulator (default 1)")
+    parser.add_option("-o","--output",help="write the report as JSON to this file (default: standard output)")
+    options,args = parser.parse_args()
+
+    if options.tracker == 'simulator':
+        benchmarks.setUpEnvironment(eyetracker='simulator',simulator_options={'scanpath':simulatedScanpath,'seed':options.seed})
+        duration = 1000
+    else:
+        EyeScript = benchmarks.setUpEnvironment(eyetracker='eyelink',headless=False)
+        EyeScript.calibrateTracker()
+        duration = 3000 # Give the subject time to find the X
+    results = report(measure(options.trials,duration),options.tracker,options.trials)
+
+    if options.output:
+        outfile = open(options.output,'w')
+        json.dump(results,outfile,indent=1,sort_keys=True)
+        outfile.close()
+    else:
+        json.dump(results,sys.stdout,indent=1,sort_keys=True)
+    print >>sys.stderr, "\n%d display changes in %d trials (%s)"%(results['changes'],options.trials,options.tracker)
+    print >>sys.stderr, "%-8s %8s %8s %8s %8s %8s"%("ms","mean","median","p95","p99","max")
+    for stage in STAGES:
+        summary = results['stages'][stage]
+        if summary['n']:
+            print >>sys.stderr, "%-8s %8.2f %8.2f %8.2f %8.2f %8.2f"%(stage,summary['mean'],summary['p50'],summary['p95'],summary['p99'],summary['max'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the code that runs during trials or while setting up an experiment.
+"""
+import os, random, tempfile
+from benchmarks import benchmark
+
+SENTENCE = (u"The light that the kid turned on was bright, and the cat that the dog chased across the garden "
+            u"ran up the tall tree behind the old house before anybody noticed.")
+
+@benchmark("TextDisplay")
+def textDisplay():
+    from EyeScript import TextDisplay
+    return [("plain",(lambda: TextDisplay(SENTENCE,response_collectors=[]),5)),
+            ("interest_areas",(lambda: TextDisplay(SENTENCE,response_collectors=[],interest_areas=True),5))
+            ]
+
+@benchmark("checkForResponse")
+def checkForResponse():
+    from EyeScript import Keyboard,checkForResponse,getExperiment
+    cases = []
+    for n in [0,1,10,50]:
+        def setUpCollectors(n=n):
+            for rc in getExperiment().response_collectors[:]: rc.stop()
+            # Headless collectors make up a response after headless_response_delay, which would leave none running after the first repetitions
+            for i in range(n): Keyboard(possible_resp=['q'],duration='infinite',logging=[],headless_response_delay=10**9).start()
+        def checkCollectors(n=n):
+            running = len(getExperiment().response_collectors)
+            assert running == n, "%d of %d response collectors still running"%(running,n)
+        cases.append(("%d collectors"%n,(checkForResponse,1000,setUpCollectors,checkCollectors)))
+    return cases
+
+@benchmark("EventLog.writeLog")
+def writeLog():
+    from EyeScript.experiment import Experiment
+    cases = []
+    for rows in [10000,100000]:
+        log = Experiment.EventLog(subject=0)
+        for trial in xrange(rows/10):
+            log.push(trialNumber=trial,condition=random.choice("abcd"))
+            for event in xrange(10): log.logEvent(event=event,rt=random.randint(200,2000),resp=random.choice("xy"))
+            log.pop()
+        filename = os.path.join(tempfile.gettempdir(),"eyescript_benchmark_log.txt")
+        cases.append(("%d rows"%rows,(lambda log=log,filename=filename: log.writeLog(filename),1)))
+    return cases
+
+@benchmark("LatinSquareList")
+def latinSquareList():
+    from EyeScript import LatinSquareList
+    stimuli = [['experiment','itemnumber','condition','sentence']]
+    for experiment in ['e1','e2','e3','filler']:
+        for item in range(40):
+            for condition in 'abcd':
+                stimuli.append([experiment,str(item),condition,SENTENCE])
+    return (lambda: LatinSquareList(stimuli,list_number=3),20)
+
+@benchmark("Shape.contains")
+def shapeContains():
+    from EyeScript import Rectangle,Ellipse
+    points = [(random.randint(0,1023),random.randint(0,767)) for i in xrange(10000)]
+    cases = []
+    for shape in [Rectangle((100,100,300,200)),Ellipse((100,100,300,200))]:
+        def containsAll(shape=shape):
+            for point in points: shape.contains(point)
+        cases.append(("%s x10000"%shape.__class__.__name__,(containsAll,5)))
+    return cases
+
+def wordAreas():
+    """Return 200 distinct word-sized interest areas, 20 to a line on 10 lines, as for a full-text reading display
+    """
+    from EyeScript import Rectangle,InterestArea
+    return [InterestArea(Rectangle((50+45*(i%20),50+60*(i/20),45,60))) for i in xrange(200)]
+
+@benchmark("InterestAreaIndex.find")
+def areaIndexFind():
+    from EyeScript.interest_area import InterestAreaIndex
+    areas = wordAreas()
+    points = [(random.randint(0,1023),random.randint(0,767)) for i in xrange(10000)]
+    index = InterestAreaIndex(areas)
+    def linear():
+        for point in points:
+            for area in areas:
+                if area.contains(point): break
+    def indexed():
+        for point in points: index.find(point)
+    return [("linear 200 areas x10000",(linear,1)),("indexed 200 areas x10000",(indexed,5))]
+
+@benchmark("InterestAreaSet.positions")
+def areaSetPositions():
+    import numpy
+    from EyeScript import Ellipse,Polygon,InterestArea,InterestAreaSet
+    from EyeScript.interest_area import RECTANGLE,ELLIPSE,OTHER
+    # The words of a reading display, plus an ellipse and a polygon
+    areas = wordAreas()
+    areas += [InterestArea(Ellipse((400,650,200,100))),InterestArea(Polygon([(0,700),(200,700),(100,760)]))]
+    areaSet = InterestAreaSet(areas)
+    assert list(areaSet.kinds) == [RECTANGLE]*200+[ELLIPSE,OTHER], "InterestAreaSet misclassified its areas"
+    x = numpy.random.uniform(0,1024,100000)
+    y = numpy.random.uniform(0,768,100000)
+    # The vectorized lookup has to agree with testing the areas one at a time
+    inside = numpy.array([area.containsArray(x,y) for area in areas]).T
+    assert (areaSet.positions(x,y) == numpy.where(inside.any(axis=1),inside.argmax(axis=1),-1)).all(), "InterestAreaSet.positions is wrong"
+    def linear():
+        for area in areas: area.containsArray(x,y)
+    return [("linear 202 areas x100000",(linear,1)),("vectorized 202 areas x100000",(lambda: areaSet.positions(x,y),3))]